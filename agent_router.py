@@ -0,0 +1,262 @@
+"""
+Local, zero-LLM routing stage for the AI Agency for Solopreneurs.
+
+A small TF-IDF classifier picks the specialist agent for a message without a
+network round-trip. It starts from a seed vocabulary per agent and learns from
+the decisions the LLM router logs, so it improves as traffic flows through.
+agent_service falls back to the LLM router whenever the local confidence is low.
+
+The routing log keeps only what the router trains on: a decision's word
+tokens, sorted, without numbers, e-mail addresses or links, never the message
+itself. It is rotated to a single backup once it reaches
+Config.ROUTING_LOG_MAX_BYTES, and each process retrains its router from the
+log in the background at most every Config.ROUTER_RETRAIN_INTERVAL seconds.
+"""
+
+import os
+import re
+import json
+import math
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Any, Iterable, List, Optional, Tuple
+
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+AGENT_TYPES = ["strategy", "creative", "production", "media"]
+
+# Seed vocabulary per agent, taken from the specialist agents' areas of expertise
+SEED_EXAMPLES = {
+    "strategy": [
+        "business strategy plan planning growth scale scalability market competition competitors",
+        "pricing price revenue profit income model business model niche positioning target market",
+        "goals vision direction decide decision priorities pivot customers clients demand",
+        "start a business startup company register regulations tax invoice funding investors",
+    ],
+    "creative": [
+        "brand branding identity logo name naming design aesthetic visual style colours",
+        "copywriting copy writing words tagline slogan story storytelling message messaging voice",
+        "creative creativity idea ideas artistic art artist inspiration expression authentic",
+        "website look portfolio packaging tone of voice concept",
+    ],
+    "production": [
+        "product production produce build building develop development prototype manufacturing",
+        "process processes system systems workflow operations efficiency automate automation tools",
+        "supplier suppliers materials inventory delivery shipping quality craftsmanship",
+        "technical technology software app code launch execute execution implement schedule time",
+    ],
+    "media": [
+        "marketing market promote promotion audience followers reach visibility exposure",
+        "social media instagram facebook linkedin tiktok youtube content posts posting channel",
+        "publicity press pr newsletter email campaign ads advertising seo blog podcast",
+        "engagement community influencers online presence digital",
+    ],
+}
+
+TOKEN_PATTERN = re.compile(r"[^\W\d_]+", re.UNICODE)
+
+# Removed before a message's tokens are logged
+PERSONAL_PATTERN = re.compile(r"\S+@\S+|https?://\S+|www\.\S+", re.IGNORECASE)
+
+STOP_WORDS = frozenset("""
+a an and are as at be but by can do for from have how i i'm in is it my of on or so
+that the this to want what when where which who why with would you your me we our
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens with stop words and very short tokens removed."""
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower())
+        if len(token) > 2 and token not in STOP_WORDS
+    ]
+
+
+class KeywordRouter:
+    """
+    TF-IDF nearest-centroid classifier over the four specialist agents.
+
+    Each agent is represented by the TF-IDF centroid of its seed examples plus
+    every logged message routed to it. A message is scored by cosine similarity
+    against each centroid; confidence is the winning agent's share of the total,
+    scaled down when the best similarity is below FULL_EVIDENCE_SIMILARITY so a
+    single weak keyword match is not trusted.
+    """
+
+    FULL_EVIDENCE_SIMILARITY = 0.2
+
+    def __init__(self, examples: Dict[str, List[str]]):
+        documents = [(agent, tokenize(text)) for agent, texts in examples.items() for text in texts]
+        document_frequency = Counter(token for _, tokens in documents for token in set(tokens))
+        total = len(documents) or 1
+        self.idf = {token: math.log((1 + total) / (1 + count)) + 1 for token, count in document_frequency.items()}
+
+        self.centroids: Dict[str, Dict[str, float]] = {}
+        for agent in examples:
+            centroid = Counter()
+            for tokens in (tokens for doc_agent, tokens in documents if doc_agent == agent):
+                centroid.update(self.vectorize(tokens))
+            self.centroids[agent] = self.normalize(centroid)
+
+    def vectorize(self, tokens: Iterable[str]) -> Dict[str, float]:
+        counts = Counter(token for token in tokens if token in self.idf)
+        return self.normalize({token: count * self.idf[token] for token, count in counts.items()})
+
+    @staticmethod
+    def normalize(vector: Dict[str, float]) -> Dict[str, float]:
+        norm = math.sqrt(sum(value * value for value in vector.values()))
+        return {token: value / norm for token, value in vector.items()} if norm else {}
+
+    def scores(self, user_message: str) -> Dict[str, float]:
+        vector = self.vectorize(tokenize(user_message))
+        return {
+            agent: sum(weight * centroid.get(token, 0.0) for token, weight in vector.items())
+            for agent, centroid in self.centroids.items()
+        }
+
+    def predict(self, user_message: str) -> Tuple[Optional[str], float]:
+        """Return the best agent type and a confidence between 0 and 1."""
+        scores = self.scores(user_message)
+        total = sum(scores.values())
+        if not total:
+            return None, 0.0
+        agent = max(scores, key=scores.get)
+        evidence = min(1.0, scores[agent] / self.FULL_EVIDENCE_SIMILARITY)
+        return agent, scores[agent] / total * evidence
+
+    @classmethod
+    def from_log(cls, path: Optional[str] = None) -> "KeywordRouter":
+        """Build a router from the seed examples plus the logged LLM routing decisions (and their rotated backup)."""
+        path = path or Config.ROUTING_LOG_PATH
+        examples = {agent: list(texts) for agent, texts in SEED_EXAMPLES.items()}
+        for decision in load_decisions(f"{path}.1") + load_decisions(path):
+            examples[decision["agent"]].append(decision["message"])
+        return cls(examples)
+
+
+def log_tokens(user_message: str) -> List[str]:
+    """The tokens of user_message that go into the routing log, sorted so the wording can't be read back."""
+    return sorted(tokenize(PERSONAL_PATTERN.sub(" ", user_message)))
+
+
+def load_decisions(path: str) -> List[Dict[str, str]]:
+    """
+    Read single-agent routing decisions from the JSONL routing log.
+
+    Each decision's "message" is its logged tokens joined by spaces (records
+    written before tokens were logged carry the raw message instead).
+    """
+    decisions = []
+    if not os.path.exists(path):
+        return decisions
+
+    with open(path, encoding="utf-8") as log_file:
+        for line in log_file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            agents = [agent.lower() for agent in record.get("selected_agents", [])]
+            message = " ".join(record["tokens"]) if record.get("tokens") else record.get("message")
+            # Multi-agent picks don't say which single agent fits best, so skip them
+            if len(agents) == 1 and agents[0] in AGENT_TYPES and message:
+                decisions.append({"message": message, "agent": agents[0]})
+    return decisions
+
+
+_log_lock = threading.Lock()
+
+
+def record_decision(user_message: str, selection: Dict[str, Any]) -> None:
+    """Append the tokens of an LLM routing decision to the routing log for future training."""
+    path = Config.ROUTING_LOG_PATH
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        record = {
+            "tokens": log_tokens(user_message),
+            "selected_agents": selection.get("selected_agents", []),
+            "created_at": datetime.utcnow().isoformat(),
+        }
+        with _log_lock:
+            if os.path.exists(path) and os.path.getsize(path) >= Config.ROUTING_LOG_MAX_BYTES:
+                os.replace(path, f"{path}.1")
+            with open(path, "a", encoding="utf-8") as log_file:
+                log_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.error(f"Error recording routing decision: {e}")
+
+
+_router: Optional[KeywordRouter] = None
+_trained_at = 0.0
+_retrain_lock = threading.Lock()
+_retraining = False
+
+
+def _log_modified() -> float:
+    try:
+        return os.path.getmtime(Config.ROUTING_LOG_PATH)
+    except OSError:
+        return 0.0
+
+
+def _retrain() -> None:
+    global _router, _trained_at, _retraining
+    try:
+        started = time.time()
+        _router = KeywordRouter.from_log()
+        _trained_at = started
+        logger.info(f"Retrained the local router in {time.time() - started:.2f}s")
+    except Exception as e:
+        logger.error(f"Error retraining the local router: {e}")
+    finally:
+        _retraining = False
+
+
+def get_router() -> KeywordRouter:
+    """
+    Return the process-wide router, training it from the routing log on first use.
+
+    When decisions have been logged since it was trained and
+    Config.ROUTER_RETRAIN_INTERVAL has passed, a background thread retrains it
+    and swaps it in; until then the current router keeps answering.
+    """
+    global _router, _trained_at, _retraining
+    if _router is None:
+        with _retrain_lock:
+            if _router is None:
+                _trained_at = time.time()
+                _router = KeywordRouter.from_log()
+    elif time.time() - _trained_at >= Config.ROUTER_RETRAIN_INTERVAL and _log_modified() > _trained_at:
+        with _retrain_lock:
+            if _retraining:
+                return _router
+            _retraining = True
+        threading.Thread(target=_retrain, name="router-retrain", daemon=True).start()
+    return _router
+
+
+def route_locally(user_message: str) -> Optional[Dict[str, Any]]:
+    """
+    Pick an agent without calling the LLM.
+
+    Returns:
+        An agent selection in the same shape as agent_service.determine_agents(),
+        or None when local routing is disabled or not confident enough
+    """
+    if not Config.LOCAL_ROUTER_ENABLED:
+        return None
+
+    agent, confidence = get_router().predict(user_message)
+    if agent is None or confidence < Config.LOCAL_ROUTER_MIN_CONFIDENCE:
+        return None
+
+    return {
+        "reasoning": f"Routed locally to the {agent} agent (confidence {confidence:.2f}).",
+        "selected_agents": [agent],
+        "confidence": confidence,
+    }
@@ -1,15 +1,25 @@
 import os
+import asyncio
 import logging
 import json
-from openai import OpenAI
+import time
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from config import Config
+from openai_client import get_client, get_async_client
+from agent_router import route_locally, record_decision
+from history import history_manager
+from telemetry import request_trace, trace_stage
 
 # Initialize logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
+# Bounded pool used to call the selected specialists concurrently. Calls beyond its threads
+# wait in the pool's queue, which is capped: a call that finds it full is refused at once
+specialist_executor = ThreadPoolExecutor(max_workers=Config.SPECIALIST_MAX_WORKERS, thread_name_prefix="specialist")
+specialist_slots = threading.BoundedSemaphore(Config.SPECIALIST_MAX_WORKERS + Config.SPECIALIST_MAX_QUEUED)
 
 # Define specialized sub-agent prompts with Kraków focus and contradiction-resolution framework
 STRATEGY_AGENT_PROMPT = """
@@ -85,8 +95,32 @@ Your job is to analyze the query and decide which expert agent (Strategy, Creati
 Return a JSON object with your reasoning and the decision about which agent to use, or multiple agents if needed.
 """
 
+# Prompts are split into a static part, identical for every user and turn, and a variable part
+# (profile, reasoning, query) sent after it, so providers can reuse the cached static prefix
+SELECTION_PROMPT = ORCHESTRATOR_PROMPT + """
+Analyze the user query and determine which specialized agent(s) should handle it. Return a JSON object with the following structure: {"reasoning": "your step-by-step reasoning", "selected_agents": ["strategy", "creative", "production", or "media"]}"""
+
+SPECIALIST_FORMAT_INSTRUCTION = """
+    IMPORTANT FORMAT INSTRUCTION: Keep your response brief and to the point. 
+    Use short paragraphs and bullet points where appropriate.
+    Total response should be under 200 words.
+    Focus only on the most important aspects relevant to the user's query.
+    """
+
+COMBINE_PROMPT = ORCHESTRATOR_PROMPT + """
+As the Orchestrator for Kraków solopreneurs, you receive a user query and the responses specialized agents gave to it.
+
+Your task is to synthesize these responses using the contradiction-resolution framework into a CONCISE, EASY-TO-READ format:
+
+1. Start with a VERY BRIEF summary (1-2 sentences maximum)
+2. Identify 1-2 key tensions between personal authenticity and business requirements 
+3. Provide 2-3 bullet points with practical solutions that honor both sides
+4. End with 1-2 specific action steps relevant to Kraków's business context
+
+Keep your total response under 200 words, use simple language, and format with bullet points for readability."""
+
 # Main function to get agent response
-def get_agent_response(user_message, message_history=None, user_info=None):
+def get_agent_response(user_message, message_history=None, user_info=None, history_key=None, context=None, memories=""):
     """
     Get a response from the orchestrated AI agents based on the user's message and conversation history.
     
@@ -94,47 +128,189 @@ def get_agent_response(user_message, message_history=None, user_info=None):
         user_message (str): The user's message
         message_history (list, optional): Previous messages in the conversation
         user_info (dict, optional): User profile information for context
+        history_key (str, optional): Stable id of the conversation, used to cache its rolling summary
+        context (str, optional): create_context(user_info) rendered in advance (e.g. profiles.UserSnapshot.context)
+        memories (str, optional): The user's recalled memories relevant to this message (memory.memory_context())
     
     Returns:
-        str: The agent's response
+        dict: "reply", the response text, and "agent", the agents that answered (see answering_agents())
     """
-    try:
-        # Limit message length to prevent token issues
-        if user_message and len(user_message) > 500:
-            user_message = user_message[:500] + "..."
-        
-        # Create context information
-        context = create_context(user_info)
-        
-        # Step 1: Determine which agent(s) should handle this query
-        agent_selection = determine_agents(user_message, context)
-        
-        # Step 2: Get responses from the selected agents
-        agent_responses = []
-        for agent_type in agent_selection['selected_agents']:
-            agent_response = call_specialized_agent(
-                agent_type,
-                user_message,
-                message_history,
-                context,
-                agent_selection['reasoning']
+    with request_trace("agent_response", history_key=history_key):
+        try:
+            # Limit message length to prevent token issues
+            if user_message and len(user_message) > 500:
+                user_message = user_message[:500] + "..."
+            
+            # Keep the history within the token budget (older turns are summarized)
+            message_history = history_manager.window(message_history, history_key)
+            
+            # Create context information, unless the caller has it rendered already
+            if context is None:
+                context = create_context(user_info)
+            
+            # Step 1: Determine which agent(s) should handle this query
+            agent_selection = determine_agents(user_message, context)
+            
+            # Step 2: Get responses from the selected agents (concurrently)
+            agent_responses = gather_specialist_responses(agent_selection, user_message, message_history, context, memories)
+            
+            # Step 3: Have the orchestrator combine and refine the responses
+            if len(agent_responses) > 1:
+                final_response = combine_agent_responses(agent_responses, user_message, context)
+            else:
+                final_response = agent_responses[0]['response']
+            
+            return {'reply': final_response, 'agent': answering_agents(agent_responses)}
+            
+        except Exception as e:
+            logger.error(f"Error in get_agent_response: {e}")
+            return {'reply': f"I apologize, but I encountered an error while processing your request. Please try again later. (Error: {str(e)})",
+                    'agent': None}
+
+async def get_agent_response_async(user_message, message_history=None, user_info=None, history_key=None, context=None, memories=""):
+    """Async counterpart of get_agent_response() that awaits the model without holding a thread"""
+    with request_trace("agent_response", history_key=history_key):
+        try:
+            # Limit message length to prevent token issues
+            if user_message and len(user_message) > 500:
+                user_message = user_message[:500] + "..."
+            
+            message_history = await asyncio.to_thread(history_manager.window, message_history, history_key)
+            
+            if context is None:
+                context = create_context(user_info)
+            
+            agent_selection = await determine_agents_async(user_message, context)
+            
+            agent_responses = await gather_specialist_responses_async(agent_selection, user_message, message_history, context, memories)
+            
+            if len(agent_responses) > 1:
+                final_response = await combine_agent_responses_async(agent_responses, user_message, context)
+            else:
+                final_response = agent_responses[0]['response']
+            
+            return {'reply': final_response, 'agent': answering_agents(agent_responses)}
+            
+        except Exception as e:
+            logger.error(f"Error in get_agent_response_async: {e}")
+            return {'reply': f"I apologize, but I encountered an error while processing your request. Please try again later. (Error: {str(e)})",
+                    'agent': None}
+
+def collect_agent_responses(selected_agents, results):
+    """
+    Pair each selected agent with its result, dropping the ones that failed or timed out.
+    
+    Args:
+        selected_agents (list): Agent types in the order they were selected
+        results (list): The response text or the exception raised for each agent
+    
+    Returns:
+        list: Dicts with the agent type and its response
+    """
+    agent_responses = []
+    for agent_type, result in zip(selected_agents, results):
+        if isinstance(result, BaseException):
+            logger.error(f"Specialist agent {agent_type} failed: {result!r}")
+            continue
+        agent_responses.append({
+            'agent': agent_type,
+            'response': result
+        })
+    
+    if not agent_responses:
+        raise RuntimeError("None of the selected agents answered in time")
+    
+    return agent_responses
+
+def answering_agents(agent_responses):
+    """
+    Name the agents whose responses make up the reply, as stored in Message.agent.
+    
+    Args:
+        agent_responses (list): collect_agent_responses() output
+    
+    Returns:
+        str: Their agents_sdk names, comma-separated (e.g. "StrategyAgent,CreativeAgent")
+    """
+    return ",".join(f"{resp['agent'].capitalize()}Agent" for resp in agent_responses)
+
+class SpecialistCall:
+    """
+    One call_specialized_agent() on the shared specialist pool.
+    
+    Its timeout starts when a worker picks it up, so time spent queued behind
+    other requests' calls doesn't count against it; the queue wait has its own
+    limit of the same length, after which the call is dropped unstarted.
+    
+    Raises:
+        RuntimeError: The pool's queue is full
+    """
+    
+    def __init__(self, *args):
+        if not specialist_slots.acquire(blocking=False):
+            raise RuntimeError("Too many specialist calls are queued")
+        self.started = threading.Event()
+        self.started_at = None
+        # The worker runs in a copy of this context so its stage joins the request trace
+        context = contextvars.copy_context()
+        try:
+            self.future = specialist_executor.submit(self._run, context, args)
+        except BaseException:
+            specialist_slots.release()
+            raise
+        self.future.add_done_callback(lambda _: specialist_slots.release())
+    
+    def _run(self, context, args):
+        self.started_at = time.monotonic()
+        self.started.set()
+        return context.run(call_specialized_agent, *args)
+    
+    def result(self):
+        """The response text, or the exception the call raised or timed out with."""
+        if not self.started.wait(Config.SPECIALIST_TIMEOUT) and self.future.cancel():
+            return FutureTimeoutError("No specialist worker was free in time")
+        self.started.wait()  # a worker picked it up just before the cancel
+        try:
+            return self.future.result(timeout=max(0, self.started_at + Config.SPECIALIST_TIMEOUT - time.monotonic()))
+        except Exception as e:
+            return e
+
+def gather_specialist_responses(agent_selection, user_message, message_history, context, memories=""):
+    """Call the selected specialists concurrently, keeping whichever answer within the timeout"""
+    selected_agents = agent_selection['selected_agents']
+    calls = []
+    for agent_type in selected_agents:
+        try:
+            calls.append(SpecialistCall(agent_type, user_message, message_history, context,
+                                        agent_selection['reasoning'], memories))
+        except RuntimeError as e:
+            calls.append(e)
+    
+    results = [call if isinstance(call, Exception) else call.result() for call in calls]
+    return collect_agent_responses(selected_agents, results)
+
+async def gather_specialist_responses_async(agent_selection, user_message, message_history, context, memories=""):
+    """Async counterpart of gather_specialist_responses()"""
+    selected_agents = agent_selection['selected_agents']
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(
+                call_specialized_agent_async(
+                    agent_type,
+                    user_message,
+                    message_history,
+                    context,
+                    agent_selection['reasoning'],
+                    memories
+                ),
+                timeout=Config.SPECIALIST_TIMEOUT
             )
-            agent_responses.append({
-                'agent': agent_type,
-                'response': agent_response
-            })
-        
-        # Step 3: Have the orchestrator combine and refine the responses
-        if len(agent_responses) > 1:
-            final_response = combine_agent_responses(agent_responses, user_message, context)
-        else:
-            final_response = agent_responses[0]['response']
-        
-        return final_response
+            for agent_type in selected_agents
+        ),
+        return_exceptions=True
+    )
     
-    except Exception as e:
-        logger.error(f"Error in get_agent_response: {e}")
-        return f"I apologize, but I encountered an error while processing your request. Please try again later. (Error: {str(e)})"
+    return collect_agent_responses(selected_agents, results)
 
 def create_context(user_info):
     """Create a context string from user information"""
@@ -149,37 +325,94 @@ def create_context(user_info):
     Bio: {user_info.get('bio', '')}
     """
 
+def variable_context(context="", reasoning="", memories=""):
+    """The per-user and per-turn part of a prompt, sent after the static instructions"""
+    parts = [
+        part.strip() for part in (context, memories, reasoning and f"The orchestrator has selected you because: {reasoning}")
+        if part
+    ]
+    return "\n\n".join(parts)
+
+def agent_selection_request(user_message, context=""):
+    """Build the chat completion arguments for the agent selection call"""
+    messages = [{"role": "system", "content": SELECTION_PROMPT}]
+    if context:
+        messages.append({"role": "system", "content": variable_context(context)})
+    messages.append({"role": "user", "content": f"User query: {user_message}"})
+    
+    return {
+        "model": Config.DEFAULT_AGENT_MODEL,  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+        "messages": messages,
+        "response_format": {"type": "json_object"},
+        "temperature": 0.2,
+        "max_tokens": 300  # Reduced token limit for agent selection
+    }
+
+def parse_agent_selection(response):
+    """Parse the agent selection JSON returned by the model"""
+    result = json.loads(response.choices[0].message.content)
+    
+    # Ensure we have at least one agent selected
+    if not result.get('selected_agents') or len(result['selected_agents']) == 0:
+        result['selected_agents'] = ['strategy']  # Default to strategy if no clear match
+        
+    return result
+
+def default_agent_selection(error):
+    """Fallback agent selection used when the selection call fails"""
+    return {
+        "reasoning": f"Error occurred: {str(error)}. Defaulting to strategy agent.",
+        "selected_agents": ["strategy"]
+    }
+
 def determine_agents(user_message, context=""):
     """Determine which specialized agent(s) should handle the query"""
+    # Try the local router first and only pay for an LLM call when it isn't confident
+    with trace_stage("route", model="local") as span:
+        local_selection = route_locally(user_message)
+        if local_selection:
+            span.agent = ",".join(local_selection['selected_agents'])
+            return local_selection
+    
     try:
-        prompt = f"{ORCHESTRATOR_PROMPT}\n\n{context}\n\nUser query: {user_message}\n\nAnalyze this query and determine which specialized agent(s) should handle it. Return a JSON object with the following structure: {{\"reasoning\": \"your step-by-step reasoning\", \"selected_agents\": [\"strategy\", \"creative\", \"production\", or \"media\"]}}"
-        
-        response = client.chat.completions.create(
-            model=Config.DEFAULT_AGENT_MODEL,  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"},
-            temperature=0.2,
-            max_tokens=300  # Reduced token limit for agent selection
-        )
-        
-        result = json.loads(response.choices[0].message.content)
-        
-        # Ensure we have at least one agent selected
-        if not result.get('selected_agents') or len(result['selected_agents']) == 0:
-            result['selected_agents'] = ['strategy']  # Default to strategy if no clear match
-            
+        request = agent_selection_request(user_message, context)
+        with trace_stage("route", model=request['model']) as span:
+            response = get_client().chat.completions.create(**request)
+            span.record_usage(response.usage)
+            result = parse_agent_selection(response)
+            span.agent = ",".join(result['selected_agents'])
+        record_decision(user_message, result)
         return result
         
     except Exception as e:
         logger.error(f"Error in determine_agents: {e}")
         # Default to strategy agent if there's an error
-        return {
-            "reasoning": f"Error occurred: {str(e)}. Defaulting to strategy agent.",
-            "selected_agents": ["strategy"]
-        }
+        return default_agent_selection(e)
 
-def call_specialized_agent(agent_type, user_message, message_history, context, reasoning=""):
-    """Call a specialized agent to get a response"""
+async def determine_agents_async(user_message, context=""):
+    """Async counterpart of determine_agents()"""
+    with trace_stage("route", model="local") as span:
+        local_selection = route_locally(user_message)
+        if local_selection:
+            span.agent = ",".join(local_selection['selected_agents'])
+            return local_selection
+    
+    try:
+        request = agent_selection_request(user_message, context)
+        with trace_stage("route", model=request['model']) as span:
+            response = await get_async_client().chat.completions.create(**request)
+            span.record_usage(response.usage)
+            result = parse_agent_selection(response)
+            span.agent = ",".join(result['selected_agents'])
+        record_decision(user_message, result)
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error in determine_agents_async: {e}")
+        return default_agent_selection(e)
+
+def specialized_agent_request(agent_type, user_message, message_history, context, reasoning="", memories=""):
+    """Build the chat completion arguments for a specialized agent call"""
     # Select the appropriate agent prompt
     if agent_type.lower() == "strategy":
         agent_prompt = STRATEGY_AGENT_PROMPT
@@ -192,24 +425,17 @@ def call_specialized_agent(agent_type, user_message, message_history, context, r
     else:
         agent_prompt = STRATEGY_AGENT_PROMPT  # Default
     
-    # Create message list for OpenAI API with conciseness instruction
-    instruction = """
-    IMPORTANT FORMAT INSTRUCTION: Keep your response brief and to the point. 
-    Use short paragraphs and bullet points where appropriate.
-    Total response should be under 200 words.
-    Focus only on the most important aspects relevant to the user's query.
-    """
+    # The agent prompt and format instruction are the same for every user and turn, so they come
+    # first as one byte-identical system message that the provider's prompt cache can reuse
+    messages = [{"role": "system", "content": f"{agent_prompt}\n\n{SPECIALIST_FORMAT_INSTRUCTION}"}]
     
-    messages = [{"role": "system", "content": f"{agent_prompt}\n\n{instruction}\n\n{context}"}]
+    # Then the user's profile, which is stable across their conversation
+    if context:
+        messages.append({"role": "system", "content": variable_context(context)})
     
-    # Add relevant reasoning for context
-    if reasoning:
-        messages.append({"role": "system", "content": f"The orchestrator has selected you because: {reasoning}"})
-    
-    # Add message history if available (limited to last 5 exchanges for brevity)
+    # Add message history if available (already windowed to the token budget by history_manager)
     if message_history:
-        recent_history = message_history[-10:] if len(message_history) > 10 else message_history
-        for msg in recent_history:
+        for msg in message_history:
             if isinstance(msg, dict) and 'content' in msg:
                 role = msg.get('role', 'user')
                 content = msg.get('content', '')
@@ -221,53 +447,74 @@ def call_specialized_agent(agent_type, user_message, message_history, context, r
                 role = "user" if is_user else "assistant"
                 messages.append({"role": role, "content": content})
     
-    # Add current user message
+    # The recalled memories and the orchestrator's reasoning change every turn, so they go last
+    # with the current user message
+    if reasoning or memories:
+        messages.append({"role": "system", "content": variable_context(reasoning=reasoning, memories=memories)})
     messages.append({"role": "user", "content": user_message})
     
-    # Call OpenAI API with reduced token limits
-    response = client.chat.completions.create(
-        model=Config.DEFAULT_AGENT_MODEL,  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-        messages=messages,
-        temperature=0.7,
-        max_tokens=500  # Reduced token limit to prevent errors
-    )
+    return {
+        "model": Config.DEFAULT_AGENT_MODEL,  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": 500  # Reduced token limit to prevent errors
+    }
+
+def call_specialized_agent(agent_type, user_message, message_history, context, reasoning="", memories=""):
+    """Call a specialized agent to get a response"""
+    request = specialized_agent_request(agent_type, user_message, message_history, context, reasoning, memories)
+    with trace_stage("specialist", model=request['model'], agent=agent_type) as span:
+        # A call abandoned at SPECIALIST_TIMEOUT can't be cancelled, so the request itself times out then
+        response = get_client().chat.completions.create(**request, timeout=Config.SPECIALIST_TIMEOUT)
+        span.record_usage(response.usage)
     
     # Extract and return response content
     return response.choices[0].message.content
 
-def combine_agent_responses(agent_responses, user_message, context=""):
-    """Combine multiple agent responses into a cohesive response using contradiction-resolution framework"""
+async def call_specialized_agent_async(agent_type, user_message, message_history, context, reasoning="", memories=""):
+    """Async counterpart of call_specialized_agent()"""
+    request = specialized_agent_request(agent_type, user_message, message_history, context, reasoning, memories)
+    with trace_stage("specialist", model=request['model'], agent=agent_type) as span:
+        response = await get_async_client().chat.completions.create(**request)
+        span.record_usage(response.usage)
+    
+    return response.choices[0].message.content
+
+def combine_request(agent_responses, user_message, context=""):
+    """Build the chat completion arguments for combining multiple agent responses"""
     # Format all agent responses
     responses_text = ""
     for resp in agent_responses:
         responses_text += f"\n\n{resp['agent'].upper()} AGENT RESPONSE:\n{resp['response']}"
     
-    # Create the orchestrator prompt for combining responses with contradiction-resolution framework (more concise)
-    combine_prompt = f"""As the Orchestrator for Kraków solopreneurs, you've received the following responses from specialized agents to address this user query:
+    # Static synthesis instructions first, then the user's profile, then this turn's query and answers
+    messages = [{"role": "system", "content": COMBINE_PROMPT}]
+    if context:
+        messages.append({"role": "system", "content": variable_context(context)})
+    messages.append({"role": "user", "content": f"USER QUERY: {user_message}{responses_text}"})
     
-USER QUERY: {user_message}
-
-{responses_text}
+    return {
+        "model": Config.DEFAULT_AGENT_MODEL,  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+        "messages": messages,
+        "temperature": 0.7,
+        "max_tokens": 500  # Reduced token limit to prevent errors
+    }
 
-Your task is to synthesize these responses using the contradiction-resolution framework into a CONCISE, EASY-TO-READ format:
-
-1. Start with a VERY BRIEF summary (1-2 sentences maximum)
-2. Identify 1-2 key tensions between personal authenticity and business requirements 
-3. Provide 2-3 bullet points with practical solutions that honor both sides
-4. End with 1-2 specific action steps relevant to Kraków's business context
-
-Keep your total response under 200 words, use simple language, and format with bullet points for readability."""
-
-    # Call OpenAI API with reduced token limits
-    response = client.chat.completions.create(
-        model=Config.DEFAULT_AGENT_MODEL,  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-        messages=[
-            {"role": "system", "content": ORCHESTRATOR_PROMPT + "\n\n" + context},
-            {"role": "user", "content": combine_prompt}
-        ],
-        temperature=0.7,
-        max_tokens=500  # Reduced token limit to prevent errors
-    )
+def combine_agent_responses(agent_responses, user_message, context=""):
+    """Combine multiple agent responses into a cohesive response using contradiction-resolution framework"""
+    request = combine_request(agent_responses, user_message, context)
+    with trace_stage("combine", model=request['model'], agent="orchestrator") as span:
+        response = get_client().chat.completions.create(**request)
+        span.record_usage(response.usage)
     
     # Extract and return response content
     return response.choices[0].message.content
+
+async def combine_agent_responses_async(agent_responses, user_message, context=""):
+    """Async counterpart of combine_agent_responses()"""
+    request = combine_request(agent_responses, user_message, context)
+    with trace_stage("combine", model=request['model'], agent="orchestrator") as span:
+        response = await get_async_client().chat.completions.create(**request)
+        span.record_usage(response.usage)
+    
+    return response.choices[0].message.content
@@ -4,25 +4,46 @@ This module provides the agent orchestration logic using OpenAI's Agents SDK.
 """
 
 import os
+import asyncio
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
+import queue
+import threading
+from typing import List, Dict, Any, AsyncIterator, Iterator, Optional, Tuple
 import json
 
-# Import the OpenAI client
-from openai import OpenAI
-
-# Import the Agents SDK correctly
-from agents import Agent, Runner, function_tool
+# The Agents SDK (and the openai package under it) is imported when the agents are
+# first built, not here; it is the largest part of a worker's start-up time
 
 # Import project config
 from config import Config
+from cache import ResponseCache
+from condenser import ReplyCondenser
+from history import history_manager, is_memory
+from openai_client import get_async_client
+from telemetry import request_trace, trace_stage
 
 # Initialize logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
-# Initialize OpenAI client
-client = OpenAI(api_key=Config.OPENAI_API_KEY)
+_agents_loop: Optional[asyncio.AbstractEventLoop] = None
+_agents_loop_lock = threading.Lock()
+
+def agents_loop() -> asyncio.AbstractEventLoop:
+    """
+    Long-lived event loop that runs agent calls for the sync (WSGI) entry points.
+    
+    Runner.run_sync would start a fresh loop per call, and with it a fresh
+    connection pool; running everything on one loop keeps connections alive.
+    """
+    global _agents_loop
+    with _agents_loop_lock:
+        if _agents_loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="agents-loop", daemon=True).start()
+            _agents_loop = loop
+        return _agents_loop
 
 # Define agent instructions with Kraków focus and contradiction-resolution framework
 STRATEGY_INSTRUCTIONS = """
@@ -140,67 +161,182 @@ Apply the contradiction-resolution framework to identify opposing forces in the
 Respond only after following these rules.
 """
 
-# Define specialist agents with handoff descriptions
-strategy_agent = Agent(
-    name="StrategyAgent",
-    model=Config.DEFAULT_AGENT_MODEL,
-    handoff_description="Handles business strategy and planning questions",
-    instructions=STRATEGY_INSTRUCTIONS
-)
-
-creative_agent = Agent(
-    name="CreativeAgent",
-    model=Config.DEFAULT_AGENT_MODEL,
-    handoff_description="Handles branding, copywriting, and creative queries",
-    instructions=CREATIVE_INSTRUCTIONS
-)
-
-production_agent = Agent(
-    name="ProductionAgent",
-    model=Config.DEFAULT_AGENT_MODEL,
-    handoff_description="Handles product development, execution, and technical queries",
-    instructions=PRODUCTION_INSTRUCTIONS
-)
-
-media_agent = Agent(
-    name="MediaAgent",
-    model=Config.DEFAULT_AGENT_MODEL,
-    handoff_description="Handles marketing, social media, and publicity queries",
-    instructions=MEDIA_INSTRUCTIONS
-)
-
-# Define the orchestrator agent with handoffs and web search capability
-orchestrator_agent = Agent(
-    name="OrchestratorAgent",
-    model=Config.DEFAULT_AGENT_MODEL,
-    instructions=ORCHESTRATOR_INSTRUCTIONS,
-    tools=[], # We could add WebSearchTool() here if needed
-    handoffs=[
-        strategy_agent,  # Will create transfer_to_StrategyAgent
-        creative_agent,  # Will create transfer_to_CreativeAgent
-        production_agent,  # Will create transfer_to_ProductionAgent
-        media_agent  # Will create transfer_to_MediaAgent
-    ]
-)
+# Orchestrator agent and the RunConfig passed to every Runner call, built by get_agents()
+_agents: Optional[Tuple[Any, Any]] = None
+_agents_lock = threading.Lock()
+
+def build_agents() -> Tuple[Any, Any]:
+    """Create the specialist agents, the orchestrator that hands off to them and the run config."""
+    from agents import Agent, RunConfig, ModelProvider, OpenAIProvider
+    
+    class PooledModelProvider(ModelProvider):
+        """Serves the agents' models through the shared pooled client of the running event loop."""
+        
+        def get_model(self, model_name: Optional[str]):
+            return OpenAIProvider(openai_client=get_async_client()).get_model(model_name)
+    
+    # Define specialist agents with handoff descriptions
+    strategy_agent = Agent(
+        name="StrategyAgent",
+        model=Config.DEFAULT_AGENT_MODEL,
+        handoff_description="Handles business strategy and planning questions",
+        instructions=STRATEGY_INSTRUCTIONS
+    )
+    
+    creative_agent = Agent(
+        name="CreativeAgent",
+        model=Config.DEFAULT_AGENT_MODEL,
+        handoff_description="Handles branding, copywriting, and creative queries",
+        instructions=CREATIVE_INSTRUCTIONS
+    )
+    
+    production_agent = Agent(
+        name="ProductionAgent",
+        model=Config.DEFAULT_AGENT_MODEL,
+        handoff_description="Handles product development, execution, and technical queries",
+        instructions=PRODUCTION_INSTRUCTIONS
+    )
+    
+    media_agent = Agent(
+        name="MediaAgent",
+        model=Config.DEFAULT_AGENT_MODEL,
+        handoff_description="Handles marketing, social media, and publicity queries",
+        instructions=MEDIA_INSTRUCTIONS
+    )
+    
+    # Define the orchestrator agent with handoffs and web search capability
+    orchestrator_agent = Agent(
+        name="OrchestratorAgent",
+        model=Config.DEFAULT_AGENT_MODEL,
+        instructions=ORCHESTRATOR_INSTRUCTIONS,
+        tools=[], # We could add WebSearchTool() here if needed
+        handoffs=[
+            strategy_agent,  # Will create transfer_to_StrategyAgent
+            creative_agent,  # Will create transfer_to_CreativeAgent
+            production_agent,  # Will create transfer_to_ProductionAgent
+            media_agent  # Will create transfer_to_MediaAgent
+        ]
+    )
+    
+    # Passed to every Runner call so agent runs share the pooled, rate-limited client
+    run_config = RunConfig(model_provider=PooledModelProvider())
+    return orchestrator_agent, run_config
+
+def get_agents() -> Tuple[Any, Any]:
+    """Return (orchestrator agent, run config), building them on first use."""
+    global _agents
+    with _agents_lock:
+        if _agents is None:
+            _agents = build_agents()
+        return _agents
+
+class OrchestratorRun:
+    """
+    A streamed orchestrator run whose reply is condensed as it arrives.
+    
+    The reply is the text of the last agent to speak: each agent's text passes
+    through its own ReplyCondenser, started when the run hands off to it, so
+    the orchestrator's words before a handoff neither reach the reply nor use
+    up the specialist's budget. Once the answering agent's budget is spent the
+    run is cancelled, so the model stops generating text that would be cut
+    anyway. Create it on the event loop that consumes the events.
+    """
+    
+    def __init__(self, agent_input):
+        from agents import Runner
+        
+        orchestrator_agent, run_config = get_agents()
+        self.condenser = ReplyCondenser()
+        self.result = Runner.run_streamed(orchestrator_agent, agent_input, run_config=run_config)
+        self.agent_name = orchestrator_agent.name  # the agent answering, updated on handoffs
+        self.cancelled = False
+        self.usage = []  # the API's usage of each model response that completed
+    
+    async def events(self) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yield "agent" events when the active agent changes and "token" events with condensed reply text.
+        
+        The tokens after an "agent" event start that agent's reply; the text streamed before it is
+        not part of the reply.
+        """
+        from openai.types.responses import ResponseCompletedEvent, ResponseTextDeltaEvent
+        
+        yield {"type": "agent", "agent": self.agent_name}
+        async for event in self.result.stream_events():
+            if event.type == "agent_updated_stream_event" and event.new_agent.name != self.agent_name:
+                self.agent_name = event.new_agent.name
+                self.condenser = ReplyCondenser()
+                yield {"type": "agent", "agent": self.agent_name}
+            elif event.type == "raw_response_event" and isinstance(event.data, ResponseTextDeltaEvent):
+                delta = self.condenser.feed(event.data.delta)
+                if delta:
+                    yield {"type": "token", "delta": delta}
+                if self.condenser.done and not self.cancelled:
+                    self.cancelled = True
+                    self.result.cancel()
+            elif event.type == "raw_response_event" and isinstance(event.data, ResponseCompletedEvent):
+                # Taken from the API's events: the SDK's own usage totals leave out cached prompt tokens
+                if event.data.response.usage is not None:
+                    self.usage.append(event.data.response.usage)
+        tail = self.condenser.finish()
+        if tail:
+            yield {"type": "token", "delta": tail}
+    
+    async def complete(self) -> "OrchestratorRun":
+        """Run to the end without forwarding events."""
+        async for _ in self.events():
+            pass
+        return self
+    
+    @property
+    def reply(self) -> str:
+        """The condensed text of the agent that answered (the last one handed off to)."""
+        return self.condenser.text
+    
+    def handoffs(self) -> List[Dict[str, str]]:
+        """The turn's handoffs in order, as {"from": agent name, "to": agent name}."""
+        return [
+            {"from": item.source_agent.name, "to": item.target_agent.name}
+            for item in getattr(self.result, "new_items", ())
+            if item.type == "handoff_output_item"
+        ]
+    
+    def conversation_history(self) -> List[Any]:
+        history = self.result.to_input_list()
+        if self.cancelled:
+            # The cancelled message never completed, so it is not among the run's items
+            history.append({"role": "assistant", "content": self.reply})
+        return history
+
+async def run_orchestrator(agent_input) -> OrchestratorRun:
+    """Run the orchestrator on agent_input to the end, with its reply condensed."""
+    return await OrchestratorRun(agent_input).complete()
 
 # Helper function to assemble conversation history
-def assemble_conversation_history(prev_history, new_user_input):
+def assemble_conversation_history(prev_history, new_user_input, memories=""):
     """
     Combine previous conversation history with the new user input for the next agent run.
     
     Args:
         prev_history: Previous conversation history (list of message dicts or None)
         new_user_input: The new user message
+        memories: The user's recalled memories for this turn (memory.memory_context())
         
     Returns:
-        Either the raw user input (if no history) or a list of messages including the new input
+        Either the raw user input (if no history or memories) or a list of messages including the new input
     """
+    items = []
     if prev_history:
-        # prev_history is a list of message dicts (from result.to_input_list())
-        return prev_history + [{"role": "user", "content": new_user_input}]
-    else:
+        # prev_history is a list of message dicts (from result.to_input_list()), kept within
+        # the token budget; the windowed list carries its own rolling summary to the next turn.
+        # The previous turn's memories are dropped, this turn recalls its own
+        items = history_manager.window([item for item in prev_history if not is_memory(item)])
+    if memories:
+        items.append({"role": "system", "content": memories})
+    if not items:
         # If no prior history, just use the raw input string (first turn)
         return new_user_input
+    return items + [{"role": "user", "content": new_user_input}]
 
 def get_greeting() -> Dict[str, str]:
     """Get the initial greeting message from the orchestrator agent."""
@@ -210,91 +346,226 @@ def get_greeting() -> Dict[str, str]:
         "agent": "OrchestratorAgent"
     }
 
-def condense(text: str, limit: int = 120) -> str:
+# Replies to first turns (no history) don't depend on who asks, so they are shared
+response_cache = ResponseCache(max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES, ttl=Config.RESPONSE_CACHE_TTL)
+
+def agents_fingerprint() -> str:
+    """Hash of the agent setup a reply depends on; cached replies are versioned by it."""
+    orchestrator_agent, _ = get_agents()
+    digest = hashlib.sha256(Config.DEFAULT_AGENT_MODEL.encode())
+    for agent in [orchestrator_agent, *orchestrator_agent.handoffs]:
+        digest.update(f"\0{getattr(agent, 'name', agent)}\0{getattr(agent, 'model', '')}\0{getattr(agent, 'instructions', '')}".encode())
+    return digest.hexdigest()
+
+def get_cached_reply(user_message: str) -> Optional[Dict[str, Any]]:
+    """Look up a cached first-turn reply, rewritten to carry this user's exact message."""
+    if not Config.RESPONSE_CACHE_ENABLED:
+        return None
+    
+    cached = response_cache.get(agents_fingerprint(), user_message)
+    if cached is None:
+        return None
+    
+    # A normalized match may differ in wording, so put the actual message in the history
+    history = list(cached["conversation_history"])
+    if history and isinstance(history[0], dict) and history[0].get("role") == "user":
+        history[0] = {"role": "user", "content": user_message}
+    return {**cached, "conversation_history": history}
+
+def cache_reply(user_message: str, reply: Dict[str, Any]) -> None:
+    if Config.RESPONSE_CACHE_ENABLED:
+        response_cache.set(agents_fingerprint(), user_message, reply)
+
+def truncate_user_message(user_message: str) -> str:
+    """Limit message length to prevent token issues"""
+    if user_message and len(user_message) > 500:
+        return user_message[:500] + "..."
+    return user_message
+
+def build_agent_reply(run: OrchestratorRun) -> Dict[str, Any]:
     """
-    Condense text to a specified word limit, preserving key information.
+    Turn a finished orchestrator run into the reply dict returned to the routes.
     
     Args:
-        text: The text to condense
-        limit: Maximum word count (default: 120 words)
+        run: The completed OrchestratorRun
     
     Returns:
-        Condensed text that respects the word limit
+        Dict containing the agent's reply, the name of the agent that gave it, the
+        turn's handoffs and the updated conversation history
     """
-    if len(text.split()) <= limit:  # already short
-        return text
-    
-    # simple heuristic: keep first 2 sentences + final sentence
-    parts = text.split('. ')
-    short = '. '.join(parts[:2] + parts[-1:])
-    return short[:limit*6] + '…'  # rough character limit as safety
+    return {
+        "reply": run.reply,  # condensed while it streamed in
+        "agent": run.agent_name,
+        "handoffs": run.handoffs(),
+        "conversation_history": run.conversation_history()  # Save this for next turn
+    }
+
+def record_run(span, run: OrchestratorRun) -> None:
+    """Attach the answering agent and the token usage of the run's model responses to a trace span."""
+    span.agent = run.agent_name
+    for usage in run.usage:
+        span.record_usage(usage)
+
+# Start of the reply sent when an agent run fails
+ERROR_REPLY = "I apologize, but I encountered an error while processing your request. Please try again later."
+
+def build_error_reply(error: Exception, conversation_history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Build the reply dict returned when an agent run fails"""
+    return {
+        "reply": f"{ERROR_REPLY} Error: {str(error)}",
+        "agent": "OrchestratorAgent",
+        "handoffs": [],
+        "conversation_history": conversation_history  # Return original history
+    }
 
-def get_agent_response(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+def get_agent_response(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None,
+                       memories: str = "") -> Dict[str, Any]:
     """
     Process a user message through the agent orchestration system.
     
     Args:
         user_message: The message from the user
         conversation_history: List of previous messages in the conversation
+        memories: The user's recalled memories relevant to this message (memory.memory_context())
     
     Returns:
         Dict containing the agent's reply, agent name, and the updated conversation history
     """
-    try:
-        # Limit message length to prevent token issues
-        if user_message and len(user_message) > 500:
-            user_message = user_message[:500] + "..."
-        
-        # Prepare input with history for the agent
-        agent_input = assemble_conversation_history(conversation_history, user_message)
-        
-        # Run the orchestrator with the assembled input
-        logger.debug(f"Running orchestrator agent with message: {user_message}")
-        result = Runner.run_sync(orchestrator_agent, agent_input)
-        
-        # Get the final output from the result and apply condenser
-        assistant_reply = condense(result.final_output)
-        
-        # Determine which agent provided the response (could be orchestrator or a specialist)
-        # This might need adjustment based on how you track the active agent
-        agent_name = "OrchestratorAgent"  # Default fallback
-        
-        # Try to determine which agent was used based on content markers
-        # Each specialist agent should identify itself in its response with a specific prefix
-        if assistant_reply.startswith("Strategy:"):
-            agent_name = "StrategyAgent"
-        elif assistant_reply.startswith("Creative:"):
-            agent_name = "CreativeAgent"
-        elif assistant_reply.startswith("Production:"):
-            agent_name = "ProductionAgent"
-        elif assistant_reply.startswith("Media:"):
-            agent_name = "MediaAgent"
-        # Also check for the older format patterns as fallback
-        elif any(marker in assistant_reply for marker in ["**StrategyAgent**", "Strategy Agent"]):
-            agent_name = "StrategyAgent"
-        elif any(marker in assistant_reply for marker in ["**CreativeAgent**", "Creative Agent"]):
-            agent_name = "CreativeAgent"
-        elif any(marker in assistant_reply for marker in ["**ProductionAgent**", "Production Agent"]):
-            agent_name = "ProductionAgent"
-        elif any(marker in assistant_reply for marker in ["**MediaAgent**", "Media Agent"]):
-            agent_name = "MediaAgent"
-        else:
-            # Look at signature patterns as fallback
-            for agent in [strategy_agent, creative_agent, production_agent, media_agent]:
-                if agent.name in assistant_reply:
-                    agent_name = agent.name
-                    break
-        
-        return {
-            "reply": assistant_reply,
-            "agent": agent_name,
-            "conversation_history": result.to_input_list()  # Save this for next turn
-        }
+    with request_trace("agents_response"):
+        try:
+            user_message = truncate_user_message(user_message)
+            
+            # First turns have no history, so a cached reply to the same opener can be reused
+            # (unless memories make the reply this user's own)
+            shared = not conversation_history and not memories
+            if shared:
+                cached = get_cached_reply(user_message)
+                if cached:
+                    return cached
+            
+            # Prepare input with history for the agent
+            agent_input = assemble_conversation_history(conversation_history, user_message, memories)
+            
+            # Run the orchestrator with the assembled input
+            logger.debug(f"Running orchestrator agent with message: {user_message}")
+            with trace_stage("agents_run", model=Config.DEFAULT_AGENT_MODEL) as span:
+                run = asyncio.run_coroutine_threadsafe(run_orchestrator(agent_input), agents_loop()).result()
+                record_run(span, run)
+            
+            reply = build_agent_reply(run)
+            if shared:
+                cache_reply(user_message, reply)
+            return reply
+            
+        except Exception as e:
+            logger.error(f"Error in get_agent_response: {e}")
+            return build_error_reply(e, conversation_history)
+
+async def get_agent_response_async(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None,
+                                   memories: str = "") -> Dict[str, Any]:
+    """
+    Async counterpart of get_agent_response() for the ASGI entry point.
+    
+    Awaits the run on the caller's event loop, so no thread is held while
+    the model is working.
+    """
+    with request_trace("agents_response"):
+        try:
+            user_message = truncate_user_message(user_message)
+            
+            shared = not conversation_history and not memories
+            if shared:
+                cached = get_cached_reply(user_message)
+                if cached:
+                    return cached
+            
+            agent_input = await asyncio.to_thread(assemble_conversation_history, conversation_history, user_message, memories)
+            
+            logger.debug(f"Running orchestrator agent asynchronously with message: {user_message}")
+            with trace_stage("agents_run", model=Config.DEFAULT_AGENT_MODEL) as span:
+                run = await run_orchestrator(agent_input)
+                record_run(span, run)
+            
+            reply = build_agent_reply(run)
+            if shared:
+                cache_reply(user_message, reply)
+            return reply
+            
+        except Exception as e:
+            logger.error(f"Error in get_agent_response_async: {e}")
+            return build_error_reply(e, conversation_history)
+
+async def stream_agent_response_async(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None,
+                                      memories: str = "") -> AsyncIterator[Dict[str, Any]]:
+    """
+    Stream a user message through the agent orchestration system.
+    
+    Args:
+        user_message: The message from the user
+        conversation_history: List of previous messages in the conversation
+        memories: The user's recalled memories relevant to this message (memory.memory_context())
+    
+    Yields:
+        Dicts with a "type" key: "agent" when the active agent changes (e.g. on a
+        handoff), "token" for each partial piece of reply text, and a final "done"
+        event carrying the same keys as get_agent_response()
+    """
+    with request_trace("agents_stream"):
+        try:
+            user_message = truncate_user_message(user_message)
+            
+            # A cached first-turn reply is sent as a single token
+            shared = not conversation_history and not memories
+            cached = get_cached_reply(user_message) if shared else None
+            if cached:
+                yield {"type": "agent", "agent": cached["agent"]}
+                yield {"type": "token", "delta": cached["reply"]}
+                yield {"type": "done", **cached}
+                return
+            
+            agent_input = await asyncio.to_thread(assemble_conversation_history, conversation_history, user_message, memories)
+            
+            logger.debug(f"Streaming orchestrator agent with message: {user_message}")
+            with trace_stage("agents_run", model=Config.DEFAULT_AGENT_MODEL) as span:
+                run = OrchestratorRun(agent_input)
+                async for event in run.events():
+                    yield event
+                record_run(span, run)
+            
+            reply = build_agent_reply(run)
+            if shared:
+                cache_reply(user_message, reply)
+            done = {"type": "done", **reply}
+        except Exception as e:
+            logger.error(f"Error in stream_agent_response_async: {e}")
+            done = {"type": "done", **build_error_reply(e, conversation_history)}
         
-    except Exception as e:
-        logger.error(f"Error in get_agent_response: {e}")
-        return {
-            "reply": f"I apologize, but I encountered an error while processing your request. Please try again later. Error: {str(e)}",
-            "agent": "OrchestratorAgent",
-            "conversation_history": conversation_history  # Return original history
-        }
\ No newline at end of file
+        yield done
+
+# Sentinel marking the end of a streamed run
+_STREAM_END = object()
+
+def stream_agent_response(user_message: str, conversation_history: Optional[List[Dict[str, Any]]] = None,
+                          memories: str = "") -> Iterator[Dict[str, Any]]:
+    """
+    Synchronous wrapper around stream_agent_response_async() for WSGI views.
+    
+    The run executes on the shared agents loop and its events are handed over
+    as they arrive, so the caller can forward them before the run is finished.
+    """
+    events = queue.Queue()
+    
+    async def run():
+        try:
+            async for event in stream_agent_response_async(user_message, conversation_history, memories):
+                events.put(event)
+        finally:
+            events.put(_STREAM_END)
+    
+    asyncio.run_coroutine_threadsafe(run(), agents_loop())
+    
+    while True:
+        event = events.get()
+        if event is _STREAM_END:
+            return
+        yield event
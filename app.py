@@ -37,11 +37,12 @@ login_manager.login_view = 'login'
 # Set up the OpenAI API key
 os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY", "")
 
-from models import User
+from profiles import get_profile
 
 @login_manager.user_loader
 def load_user(user_id):
-    return db.session.get(User, int(user_id))
+    # A cached snapshot of the user, so authenticated requests don't re-read the row
+    return get_profile(int(user_id))
 
-with app.app_context():
-    db.create_all()
+# The schema is created and upgraded by `flask --app main upgrade-db` (see migrations.py),
+# not on import, so starting a worker doesn't touch the database
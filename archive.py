@@ -0,0 +1,193 @@
+"""
+Cold storage for old conversations in the AI Agency for Solopreneurs.
+
+Conversations nobody has touched for Config.ARCHIVE_AFTER_DAYS are archived by
+`flask --app main archive-conversations`: their messages are moved out of the
+message table, and out of its indexes, into one zstd-compressed JSON row in
+ConversationArchive, and Conversation.archived_at is set. Opening an archived
+conversation rehydrates it: the messages go back with their original ids, so
+links, cursors and the insight job's high-water mark stay valid.
+
+Neither step changes Conversation.updated_at, which orders the conversation
+list and stamps the cached chat histories.
+"""
+
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+import zstandard
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from cache import TTLCache
+from config import Config
+from models import Conversation, ConversationArchive, Message
+
+logger = logging.getLogger(__name__)
+
+# Archived message fields, stored per message as a list in this order
+FIELDS = ("id", "content", "is_user", "agent", "created_at")
+
+
+def pack(messages: List[Dict[str, Any]]) -> bytes:
+    """Messages as compact JSON (one list of FIELDS per message)."""
+    rows = [[message[field] for field in FIELDS] for message in messages]
+    for row in rows:
+        row[-1] = row[-1].isoformat() if row[-1] else None
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def unpack(raw: bytes) -> List[Dict[str, Any]]:
+    messages = [dict(zip(FIELDS, row)) for row in json.loads(raw)]
+    for message in messages:
+        if message["created_at"]:
+            message["created_at"] = datetime.fromisoformat(message["created_at"])
+    return messages
+
+
+def archived_messages(archive: ConversationArchive) -> List[Dict[str, Any]]:
+    """The archived messages of a conversation, in order."""
+    return unpack(zstandard.ZstdDecompressor().decompress(archive.data))
+
+
+def _keep_updated_at(conversation_id: int, archived_at: Optional[datetime]):
+    # Assigning updated_at to itself stops its onupdate default from firing
+    return update(Conversation).where(Conversation.id == conversation_id) \
+        .values(archived_at=archived_at, updated_at=Conversation.updated_at)
+
+
+def archive_conversation(conversation_id: int, compressor: zstandard.ZstdCompressor) -> Optional[Dict[str, int]]:
+    """
+    Move one conversation's messages into an archive row (not committed).
+
+    Returns:
+        The message count and the sizes before and after compression, or None
+        if the conversation has no messages
+    """
+    messages = [
+        row._asdict() for row in db.session.execute(
+            select(*(getattr(Message, field) for field in FIELDS))
+            .filter(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at, Message.id)
+        )
+    ]
+    if not messages:
+        return None
+
+    raw = pack(messages)
+    data = compressor.compress(raw)
+    db.session.execute(insert(ConversationArchive).values(
+        conversation_id=conversation_id, data=data, message_count=len(messages), raw_bytes=len(raw),
+        stored_bytes=len(data), archived_at=datetime.utcnow()
+    ))
+    # Only the rows read above, should a message arrive meanwhile (it would be rehydrated into)
+    db.session.execute(delete(Message).where(
+        Message.conversation_id == conversation_id, Message.id <= max(message["id"] for message in messages)
+    ))
+    db.session.execute(_keep_updated_at(conversation_id, datetime.utcnow()))
+    return {"messages": len(messages), "raw_bytes": len(raw), "stored_bytes": len(data)}
+
+
+def archive_idle_conversations(days: Optional[int] = None, limit: Optional[int] = None) -> Dict[str, int]:
+    """
+    Archive the conversations not updated for `days`, committing in batches.
+
+    Args:
+        days: Idle time before a conversation is archived (default: Config.ARCHIVE_AFTER_DAYS)
+        limit: Maximum number of conversations to archive in this run
+
+    Returns:
+        Conversations and messages archived, their size as JSON (raw_bytes),
+        the compressed size (stored_bytes) and the difference (reclaimed_bytes)
+    """
+    cutoff = datetime.utcnow() - timedelta(days=Config.ARCHIVE_AFTER_DAYS if days is None else days)
+    compressor = zstandard.ZstdCompressor(level=Config.ARCHIVE_ZSTD_LEVEL)
+    totals = {"conversations": 0, "messages": 0, "raw_bytes": 0, "stored_bytes": 0}
+    last_id = 0
+    while limit is None or totals["conversations"] < limit:
+        batch = Config.ARCHIVE_BATCH_SIZE if limit is None else min(Config.ARCHIVE_BATCH_SIZE, limit - totals["conversations"])
+        ids = db.session.execute(
+            select(Conversation.id)
+            .filter(Conversation.updated_at < cutoff, Conversation.archived_at.is_(None), Conversation.id > last_id)
+            .order_by(Conversation.id)
+            .limit(batch)
+        ).scalars().all()
+        if not ids:
+            break
+        for conversation_id in ids:
+            archived = archive_conversation(conversation_id, compressor)
+            if archived:
+                totals["conversations"] += 1
+                for key, value in archived.items():
+                    totals[key] += value
+        db.session.commit()
+        last_id = ids[-1]
+    totals["reclaimed_bytes"] = totals["raw_bytes"] - totals["stored_bytes"]
+    logger.info(f"Archived {totals['conversations']} conversation(s), reclaimed {totals['reclaimed_bytes']} bytes")
+    return totals
+
+
+def rehydrate(conversation: Conversation) -> bool:
+    """
+    Move an archived conversation's messages back into the message table.
+
+    Called before reading the messages of a conversation; does nothing (and
+    costs no query) when it isn't archived. Commits.
+
+    Returns:
+        True if the conversation was archived
+    """
+    if conversation.archived_at is None:
+        return False
+
+    archive = db.session.get(ConversationArchive, conversation.id)
+    if archive is not None:
+        messages = archived_messages(archive)
+        try:
+            for message in messages:
+                message["conversation_id"] = conversation.id
+            db.session.execute(insert(Message), messages)
+            db.session.execute(delete(ConversationArchive).where(ConversationArchive.conversation_id == conversation.id))
+            db.session.execute(_keep_updated_at(conversation.id, None))
+            db.session.commit()
+            logger.info(f"Rehydrated conversation {conversation.id} ({len(messages)} messages)")
+        except IntegrityError:
+            # Another request rehydrated it first
+            db.session.rollback()
+    db.session.refresh(conversation)
+    return True
+
+
+def archive_stats() -> Dict[str, int]:
+    """Totals over the archive: conversations, messages, raw and stored bytes, bytes reclaimed."""
+    conversations, messages, raw_bytes, stored_bytes = db.session.execute(
+        select(
+            func.count(),
+            func.coalesce(func.sum(ConversationArchive.message_count), 0),
+            func.coalesce(func.sum(ConversationArchive.raw_bytes), 0),
+            func.coalesce(func.sum(ConversationArchive.stored_bytes), 0),
+        )
+    ).one()
+    return {
+        "conversations": conversations,
+        "messages": messages,
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "reclaimed_bytes": raw_bytes - stored_bytes,
+    }
+
+
+# archive_stats() for the /metrics gauge, which would otherwise scan the archive table on every scrape
+_stats_cache = TTLCache(max_entries=1, ttl=Config.ARCHIVE_STATS_TTL)
+
+
+def cached_archive_stats() -> Dict[str, int]:
+    """archive_stats(), recomputed at most every Config.ARCHIVE_STATS_TTL seconds."""
+    stats = _stats_cache.get("totals")
+    if stats is None:
+        stats = archive_stats()
+        _stats_cache.set("totals", stats)
+    return stats
@@ -0,0 +1,186 @@
+"""
+ASGI entry point for the AI Agency for Solopreneurs.
+
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 5000 --proxy-headers
+
+The chat endpoints (/api/chat and /api/conversations/<id>/messages) are served
+natively here: their database work runs in a Flask request context on a worker
+thread, while the OpenAI round-trip is awaited on the event loop, so a single
+process can keep hundreds of conversations in flight. Every other route is
+handed to the regular Flask WSGI app.
+"""
+
+import asyncio
+import io
+import sys
+import re
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import request, session
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+from app import app as flask_app
+import routes
+import agent_service
+from agents_sdk import get_agent_response_async, stream_agent_response_async
+
+MESSAGES_PATH = re.compile(r'^/api/conversations/(\d+)/messages$')
+
+wsgi_app = WsgiToAsgi(flask_app)
+
+
+def run_in_request(environ, func, session_state=None):
+    """
+    Run func inside a Flask request context built from environ.
+
+    A turn runs in several phases on different threads; session_state carries the
+    session from one phase to the next. A dict (a turn in progress) or None is
+    returned as is; any other return value, or an error raised by func, is turned
+    into a finished Response with after_request hooks and the session cookie applied.
+
+    Returns:
+        Tuple of (func's return value or Response, session state)
+    """
+    with flask_app.request_context(environ):
+        rv = None
+        if session_state is None:
+            rv = flask_app.preprocess_request()
+        else:
+            session.clear()
+            session.update(session_state)
+
+        if rv is None:
+            try:
+                rv = func()
+            except HTTPException as e:
+                rv = e
+            except Exception as e:
+                rv = flask_app.handle_exception(e)
+
+        if rv is not None and not isinstance(rv, dict):
+            rv = flask_app.process_response(flask_app.make_response(rv))
+
+        return rv, dict(session)
+
+
+def build_environ(scope, body):
+    """Build a WSGI environ for an ASGI HTTP scope and its buffered request body"""
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('ascii'),
+        'SERVER_PROTOCOL': f"HTTP/{scope['http_version']}",
+        'SERVER_NAME': scope.get('server', ('localhost', 80))[0],
+        'SERVER_PORT': str(scope.get('server', ('localhost', 80))[1]),
+        'REMOTE_ADDR': (scope.get('client') or ('',))[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.input_terminated': True,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        environ[name] = f"{environ[name]},{value}" if name in environ else value
+    return environ
+
+
+async def read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def send_head(send, response):
+    await send({
+        'type': 'http.response.start',
+        'status': response.status_code,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in response.headers.items()]
+    })
+
+
+async def send_response(send, response):
+    await send_head(send, response)
+    await send({'type': 'http.response.body', 'body': response.get_data()})
+
+
+async def send_message(environ, send, conversation_id):
+    """Async counterpart of routes.send_message()"""
+    def begin():
+        if not current_user.is_authenticated:
+            return flask_app.login_manager.unauthorized()
+        return routes._begin_send_message(conversation_id, request.json)
+
+    turn, state = await asyncio.to_thread(run_in_request, environ, begin)
+    if not isinstance(turn, dict):
+        return await send_response(send, turn)
+
+    try:
+        result = await agent_service.get_agent_response_async(
+            turn['user_message'], turn['message_history'], turn['user_info'], f"conversation:{turn['conversation_id']}",
+            turn['context'], turn['memories']
+        )
+        finish = lambda: routes._finish_send_message(turn, result)
+    except Exception as e:
+        finish = lambda error=e: routes._send_message_failed(error)
+
+    response, _ = await asyncio.to_thread(run_in_request, environ, finish, state)
+    await send_response(send, response)
+
+
+async def public_chat(environ, send):
+    """Async counterpart of routes.public_chat()"""
+    def begin():
+        try:
+            data = request.json
+            if data.get('start'):
+                return routes._start_public_chat()
+            return routes._begin_public_chat(data)
+        except HTTPException:
+            raise
+        except Exception as e:
+            return routes._public_chat_failed(e)
+
+    turn, state = await asyncio.to_thread(run_in_request, environ, begin)
+    if not isinstance(turn, dict):
+        return await send_response(send, turn)
+
+    if turn['stream']:
+        # The session cookie goes out with the headers, before the run finishes
+        head, _ = await asyncio.to_thread(run_in_request, environ, lambda: routes._event_stream(()), state)
+        await send_head(send, head)
+
+        async for event in stream_agent_response_async(turn['user_message'], turn['conversation_history'], turn['memories']):
+            if event['type'] == 'done':
+                await asyncio.to_thread(run_in_request, environ, lambda: routes._finish_streamed_public_chat(turn, event), state)
+            await send({'type': 'http.response.body', 'body': routes._format_event(event).encode(), 'more_body': True})
+
+        return await send({'type': 'http.response.body', 'body': b''})
+
+    result = await get_agent_response_async(turn['user_message'], turn['conversation_history'], turn['memories'])
+    response, _ = await asyncio.to_thread(run_in_request, environ, lambda: routes._finish_public_chat(turn, result), state)
+    await send_response(send, response)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'http' and scope['method'] == 'POST':
+        messages_match = MESSAGES_PATH.match(scope['path'])
+        if scope['path'] == '/api/chat' or messages_match:
+            environ = build_environ(scope, await read_body(receive))
+
+            if messages_match:
+                return await send_message(environ, send, int(messages_match.group(1)))
+            return await public_chat(environ, send)
+
+    await wsgi_app(scope, receive, send)
@@ -0,0 +1,131 @@
+"""
+Load test comparing how many /api/chat turns can be in flight at once on the
+WSGI app (sync gunicorn workers) versus the ASGI entry point.
+
+The Agents SDK runner is replaced with a fake that just waits, so the numbers
+measure how the server holds requests while the model is working, not OpenAI.
+
+Usage: python benchmarks/chat_concurrency.py [--requests 200] [--workers 4] [--latency 0.5]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/benchmark.db"
+os.environ["RESPONSE_CACHE_ENABLED"] = "0"  # both servers get the same prompts; measure the runs, not the cache
+os.environ["MEMORY_ENABLED"] = "0"  # no embedding calls or recall; measured separately in memory_recall.py
+
+from agents import Runner  # noqa: E402
+from openai.types.responses import ResponseTextDeltaEvent  # noqa: E402
+
+import main  # noqa: E402
+import asgi  # noqa: E402
+from migrations import create_schema  # noqa: E402
+
+
+class FakeRunResult:
+    """Stands in for RunResultStreaming: waits, then streams the whole reply as one delta."""
+
+    def __init__(self, agent_input, latency):
+        self.final_output = "Strategy: You sound ready to test the idea. Which customer will you ask first? ▲"
+        self.agent_input = agent_input
+        self.latency = latency
+
+    async def stream_events(self):
+        await asyncio.sleep(self.latency)
+        delta = ResponseTextDeltaEvent.model_construct(type="response.output_text.delta", delta=self.final_output)
+        yield SimpleNamespace(type="raw_response_event", data=delta)
+
+    def cancel(self, mode="immediate"):
+        pass
+
+    def to_input_list(self):
+        return [{"role": "user", "content": str(self.agent_input)}, {"role": "assistant", "content": self.final_output}]
+
+
+def install_fake_runner(latency):
+    # Both entry points stream the run (the WSGI one on the shared agents loop)
+    def run_streamed(agent, agent_input, **kwargs):
+        return FakeRunResult(agent_input, latency)
+
+    Runner.run_streamed = staticmethod(run_streamed)
+
+
+def chat_body(i):
+    return json.dumps({"user_message": f"I want to start a business in Kraków #{i}"}).encode()
+
+
+def run_wsgi(requests, workers):
+    """Each sync gunicorn worker serves one request at a time"""
+    def one(i):
+        client = main.app.test_client()
+        response = client.post("/api/chat", data=chat_body(i), content_type="application/json")
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+async def call_asgi(path, body):
+    scope = {
+        "type": "http", "method": "POST", "path": path, "root_path": "", "query_string": b"",
+        "http_version": "1.1", "scheme": "http", "server": ("localhost", 5000), "client": ("127.0.0.1", 0),
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+    }
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    status = {}
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+
+    await asgi.app(scope, receive, send)
+    return status["code"]
+
+
+async def run_asgi(requests):
+    """A single ASGI process awaits every request concurrently"""
+    return await asyncio.gather(*(call_asgi("/api/chat", chat_body(i)) for i in range(requests)))
+
+
+def report(name, requests, latency, elapsed, statuses):
+    failed = sum(1 for status in statuses if status != 200)
+    print(f"{name:<28} {elapsed:8.2f}s  {requests / elapsed:8.1f} req/s  "
+          f"~{requests * latency / elapsed:6.1f} in flight  {failed} failed")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=4, help="sync gunicorn workers to simulate")
+    parser.add_argument("--latency", type=float, default=0.5, help="simulated model latency in seconds")
+    args = parser.parse_args()
+
+    with main.app.app_context():
+        create_schema()
+    install_fake_runner(args.latency)
+    print(f"{args.requests} chat turns, {args.latency}s simulated model latency")
+
+    start = time.perf_counter()
+    statuses = run_wsgi(args.requests, args.workers)
+    report(f"WSGI ({args.workers} sync workers)", args.requests, args.latency, time.perf_counter() - start, statuses)
+
+    start = time.perf_counter()
+    statuses = asyncio.run(run_asgi(args.requests))
+    report("ASGI (1 process)", args.requests, args.latency, time.perf_counter() - start, statuses)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,125 @@
+"""
+Counts the SQL statements and commits one chat turn costs.
+
+Sends turns through /api/conversations/<id>/messages and through /api/chat (as
+a logged-in user) with the agents replaced by fakes, and reports the
+statements issued per turn (including queued post-reply work) once the
+conversation already has some history. Run it on two checkouts to compare the
+write path before and after a change.
+
+Usage: python benchmarks/chat_write_path.py [--turns 20] [--history 50]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/chat_write_path.db"
+os.environ["MEMORY_ENABLED"] = "0"  # no embedding calls or recall; measured separately in memory_recall.py
+
+from sqlalchemy import event  # noqa: E402
+
+import main  # noqa: E402
+import routes  # noqa: E402
+import agent_service  # noqa: E402
+from app import app, db  # noqa: E402
+from migrations import create_schema  # noqa: E402
+from models import User, Conversation, Message  # noqa: E402
+from tasks import background_tasks  # noqa: E402
+
+REPLY = "Strategy: Here is some clarity on your pricing, and an insight worth keeping in mind as you grow the business. ▲"
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = Counter()
+        self.commits = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+        event.listen(engine, "commit", self.on_commit)
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements[statement.split(None, 1)[0].upper()] += 1
+
+    def on_commit(self, conn):
+        self.commits += 1
+
+    def reset(self):
+        self.statements.clear()
+        self.commits = 0
+
+
+def install_fake_agents():
+    agent_service.get_agent_response = lambda user_message, *args, **kwargs: {"reply": REPLY, "agent": "StrategyAgent"}
+    routes.get_agent_response = lambda user_message, conversation_history=None, *args, **kwargs: {
+        "reply": REPLY, "agent": "StrategyAgent",
+        "conversation_history": (conversation_history or []) + [{"role": "user", "content": user_message}],
+    }
+
+
+def logged_in_client(user_id):
+    client = main.app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+def seed(history):
+    with app.app_context():
+        create_schema()
+        user = User(username="write-path")
+        db.session.add(user)
+        db.session.flush()
+        conversation = Conversation(user_id=user.id)
+        db.session.add(conversation)
+        db.session.flush()
+        db.session.add_all(
+            Message(conversation_id=conversation.id, content=f"earlier message {i}", is_user=i % 2 == 0)
+            for i in range(history)
+        )
+        db.session.commit()
+        return user.id, conversation.id
+
+
+def measure(counter, name, turns, send):
+    send(-1)  # warm-up turn: creates conversations and fills per-process state
+    background_tasks.join()
+    counter.reset()
+    for i in range(turns):
+        response = send(i)
+        assert response.status_code == 200, response.data
+    background_tasks.join()  # count the post-reply writes too
+    per_turn = {kind: count / turns for kind, count in sorted(counter.statements.items())}
+    total = sum(counter.statements.values()) / turns
+    detail = ", ".join(f"{kind} {count:g}" for kind, count in per_turn.items())
+    print(f"{name:<18} {total:5.1f} statements/turn ({detail}), {counter.commits / turns:g} commits/turn")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--history", type=int, default=50, help="messages already in the conversation")
+    args = parser.parse_args()
+
+    install_fake_agents()
+    user_id, conversation_id = seed(args.history)
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    client = logged_in_client(user_id)
+    measure(counter, "send_message", args.turns, lambda i: client.post(
+        f"/api/conversations/{conversation_id}/messages", json={"content": f"How should I price this? #{i}"}
+    ))
+
+    client = logged_in_client(user_id)
+    measure(counter, "public_chat", args.turns, lambda i: client.post(
+        "/api/chat", json={"user_message": f"How should I price this? #{i}"}
+    ))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,96 @@
+"""
+Throughput and memory of bulk export and import (transfer.py).
+
+Seeds a database with --messages messages spread over conversations, then
+exports everything to gzipped JSON lines and imports the file back, reporting
+rows per second and the peak Python memory allocated during each step
+(tracemalloc). Run it at two sizes: the peaks should stay about the same while
+the row count grows. Tracing allocations slows both steps several times over,
+so compare rows/s between runs of this script only.
+
+Usage: python benchmarks/export_import.py [--messages 100000] [--per-conversation 50]
+"""
+
+import argparse
+import gzip
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/export_import.db"
+
+from sqlalchemy import insert  # noqa: E402
+
+import main  # noqa: E402,F401
+from app import app, db  # noqa: E402
+from migrations import create_schema  # noqa: E402
+from models import Conversation, Message, User  # noqa: E402
+from transfer import export_lines, gzip_chunks, import_lines  # noqa: E402
+
+REPLY = "Start with one offer you can explain in a sentence and ask three customers whether they would pay for it. " * 3
+
+
+def seed(messages, per_conversation):
+    user = User(username="export-benchmark")
+    db.session.add(user)
+    db.session.flush()
+    start = datetime.utcnow() - timedelta(days=365)
+    for first in range(0, messages, per_conversation):
+        conversation = Conversation(user_id=user.id, created_at=start, updated_at=start)
+        db.session.add(conversation)
+        db.session.flush()
+        db.session.execute(insert(Message), [
+            {"conversation_id": conversation.id, "content": REPLY, "is_user": i % 2 == 0,
+             "agent": None if i % 2 == 0 else "StrategyAgent", "created_at": start + timedelta(seconds=i)}
+            for i in range(first, min(first + per_conversation, messages))
+        ])
+    db.session.commit()
+    return user.id
+
+
+def measure(name, rows, step):
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = step()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"  {name:<8} {rows / elapsed:10.0f} rows/s  {elapsed:7.2f}s  peak {peak / 1024 / 1024:7.2f} MB")
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--per-conversation", type=int, default=50)
+    args = parser.parse_args()
+    path = os.path.join(tempfile.mkdtemp(), "export.jsonl.gz")
+
+    with app.app_context():
+        create_schema()
+        user_id = seed(args.messages, args.per_conversation)
+        rows = args.messages + args.messages // args.per_conversation
+        print(f"{args.messages} messages in {args.messages // args.per_conversation} conversations:")
+
+        def export():
+            with open(path, "wb") as out:
+                for chunk in gzip_chunks(export_lines(user_id)):
+                    out.write(chunk)
+
+        def import_():
+            with gzip.open(path, "rb") as lines:
+                return import_lines(lines, user_id)
+
+        measure("export", rows, export)
+        print(f"  file     {os.path.getsize(path) / 1024 / 1024:10.2f} MB gzipped")
+        counts = measure("import", rows, import_)
+        assert counts["message"] == args.messages, counts
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,327 @@
+"""
+Local stand-in for the OpenAI chat completions, responses and embeddings
+endpoints.
+
+Answers POST /v1/chat/completions, POST /v1/responses and POST /v1/embeddings
+(random unit vectors, the same for the same text) after a simulated
+latency, streams tokens as Server-Sent Events when the request asks for
+"stream": true, and injects errors at a configurable rate, so the app can be
+load-tested without the live API. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Latency is given as a distribution:
+    fixed:0.5             always 0.5s
+    uniform:0.2,0.8       uniformly between 0.2s and 0.8s
+    lognormal:0.5,0.4     median 0.5s, sigma 0.4 (long right tail, like the real API)
+
+Prompt caching is simulated the way OpenAI applies it: once a prompt is at
+least 1024 tokens, the longest prefix (in 128-token steps) already seen in an
+earlier request is reported as usage cached_tokens.
+
+Usage: python benchmarks/fake_openai.py [--port 8765] [--latency lognormal:0.5,0.4]
+           [--token-delay 0.02] [--error-rate 0.05] [--error-status 429]
+"""
+
+import argparse
+import array
+import base64
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional
+
+REPLY = ("Strategy: Start with one offer you can explain in a sentence, price it for the customers you "
+         "already know in Kraków, and ask three of them this week whether they would pay for it. ▲")
+SELECTION = {"reasoning": "Pricing question.", "selected_agents": ["strategy"], "conversations": []}
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Build a sampler from a "kind:args" latency spec."""
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rng.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: rng.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+def count_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class PromptCache:
+    """Prefixes of earlier prompts, to report how much of a new prompt would be a cache hit."""
+
+    MIN_TOKENS = 1024
+    STEP_TOKENS = 128
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._prefixes = set()
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt: str) -> int:
+        """Cached tokens for prompt; remembers its prefixes for later requests."""
+        step = self.STEP_TOKENS * 4  # count_tokens() is len // 4
+        ends = range(self.MIN_TOKENS * 4, len(prompt) + 1, step)
+        keys = [hash(prompt[:end]) for end in ends]
+        with self._lock:
+            hits = [key in self._prefixes for key in keys]
+            if len(self._prefixes) + len(keys) > self.max_entries:
+                self._prefixes.clear()
+            self._prefixes.update(keys)
+        cached = 0
+        for end, hit in zip(ends, hits):
+            if not hit:
+                break
+            cached = end // 4
+        return cached
+
+
+def prompt_text(body: dict) -> str:
+    """The request's prompt serialized in the order the model reads it."""
+    if "messages" in body:
+        return json.dumps(body["messages"])
+    return json.dumps([body.get("instructions"), body.get("tools"), body.get("input")])
+
+
+def split_tokens(text: str):
+    """Roughly token-sized pieces of text (words with their leading space)."""
+    words = text.split(" ")
+    return [words[0]] + [" " + word for word in words[1:]]
+
+
+class FakeOpenAI:
+    """Threaded HTTP server emulating the OpenAI endpoints the app calls."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: str = "fixed:0.5",
+                 token_delay: float = 0.0, error_rate: float = 0.0, error_status: int = 429,
+                 seed: Optional[int] = None, reply: str = REPLY):
+        self.reply = reply
+        self.random = random.Random(seed)
+        self.sample_latency = parse_latency(latency, self.random)
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.counts: Dict[str, int] = {"requests": 0, "errors": 0, "streams": 0,
+                                       "prompt_tokens": 0, "cached_tokens": 0,
+                                       "streamed_tokens": 0, "disconnects": 0, "embedded_texts": 0}
+        self.prompt_cache = PromptCache()
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeOpenAI":
+        self._thread = threading.Thread(target=self.server.serve_forever, name="fake-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counts[key] += amount
+
+    def prompt_usage(self, body: dict):
+        """(prompt tokens, cached tokens) for a request."""
+        prompt = prompt_text(body)
+        prompt_tokens, cached_tokens = count_tokens(prompt), self.prompt_cache.lookup(prompt)
+        self._count("prompt_tokens", prompt_tokens)
+        self._count("cached_tokens", cached_tokens)
+        return prompt_tokens, cached_tokens
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            return self.random.random() < self.error_rate
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real API
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                fake._count("requests")
+                time.sleep(fake.sample_latency())
+
+                if fake._should_fail():
+                    fake._count("errors")
+                    return self.send_json(fake.error_status, {"error": {"message": "Injected error", "type": "fake"}},
+                                          {"Retry-After": "0"} if fake.error_status == 429 else {})
+
+                if self.path.endswith("/chat/completions"):
+                    handle = self.stream_chat if body.get("stream") else self.chat
+                elif self.path.endswith("/responses"):
+                    handle = self.stream_response if body.get("stream") else self.response
+                elif self.path.endswith("/embeddings"):
+                    handle = self.embeddings
+                else:
+                    return self.send_json(404, {"error": {"message": f"No fake for {self.path}"}})
+                if body.get("stream"):
+                    fake._count("streams")
+                try:
+                    handle(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    fake._count("disconnects")  # the client stopped reading, e.g. cancelled a stream
+
+            def send_json(self, status, payload, headers=None):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def start_events(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def send_event(self, payload):
+                data = f"data: {payload if isinstance(payload, str) else json.dumps(payload)}\n\n".encode()
+                self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def end_events(self):
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def chat_content(self, body):
+                wants_json = (body.get("response_format") or {}).get("type") == "json_object"
+                return json.dumps(SELECTION) if wants_json else fake.reply
+
+            def chat_usage(self, body, content):
+                prompt_tokens, cached_tokens = fake.prompt_usage(body)
+                return {"prompt_tokens": prompt_tokens, "completion_tokens": count_tokens(content),
+                        "total_tokens": prompt_tokens + count_tokens(content),
+                        "prompt_tokens_details": {"cached_tokens": cached_tokens}}
+
+            def chat(self, body):
+                content = self.chat_content(body)
+                self.send_json(200, {
+                    "id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                    "model": body.get("model"),
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                 "finish_reason": "stop"}],
+                    "usage": self.chat_usage(body, content),
+                })
+
+            def stream_chat(self, body):
+                content = self.chat_content(body)
+                chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                         "model": body.get("model")}
+                self.start_events()
+                for piece in split_tokens(content):
+                    self.send_event({**chunk, "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]})
+                    fake._count("streamed_tokens")
+                    time.sleep(fake.token_delay)
+                self.send_event({**chunk, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                                 "usage": self.chat_usage(body, content)})
+                self.send_event("[DONE]")
+                self.end_events()
+
+            def response_payload(self, body, status="completed", text=None):
+                text = fake.reply if text is None else text
+                prompt_tokens, cached_tokens = fake.prompt_usage(body) if text else (0, 0)
+                message = {"type": "message", "id": "msg-fake", "status": status, "role": "assistant",
+                           "content": [{"type": "output_text", "text": text, "annotations": []}] if text else []}
+                return {
+                    "id": "resp-fake", "object": "response", "created_at": int(time.time()),
+                    "model": body.get("model"), "status": status,
+                    "output": [message] if text else [],
+                    "parallel_tool_calls": False, "tool_choice": "auto", "tools": [],
+                    "usage": {
+                        "input_tokens": prompt_tokens, "output_tokens": count_tokens(text),
+                        "total_tokens": prompt_tokens + count_tokens(text),
+                        "input_tokens_details": {"cached_tokens": cached_tokens},
+                        "output_tokens_details": {"reasoning_tokens": 0},
+                    } if text else None,
+                }
+
+            def embeddings(self, body):
+                texts = [body["input"]] if isinstance(body["input"], str) else body["input"]
+                data = []
+                for index, text in enumerate(texts):
+                    rng = random.Random(text)
+                    vector = [rng.gauss(0, 1) for _ in range(body.get("dimensions") or 1536)]
+                    norm = math.sqrt(sum(value * value for value in vector))
+                    embedding = [value / norm for value in vector]
+                    if body.get("encoding_format") == "base64":
+                        embedding = base64.b64encode(array.array("f", embedding).tobytes()).decode()
+                    data.append({"object": "embedding", "index": index, "embedding": embedding})
+                tokens = sum(count_tokens(text) for text in texts)
+                fake._count("embedded_texts", len(texts))
+                self.send_json(200, {"object": "list", "data": data, "model": body.get("model"),
+                                     "usage": {"prompt_tokens": tokens, "total_tokens": tokens}})
+
+            def response(self, body):
+                self.send_json(200, self.response_payload(body))
+
+            def stream_response(self, body):
+                sequence = iter(range(1_000_000))
+                self.start_events()
+                self.send_event({"type": "response.created", "sequence_number": next(sequence),
+                                 "response": self.response_payload(body, "in_progress", "")})
+                item = {"type": "message", "id": "msg-fake", "status": "in_progress", "role": "assistant", "content": []}
+                self.send_event({"type": "response.output_item.added", "sequence_number": next(sequence),
+                                 "output_index": 0, "item": item})
+                for piece in split_tokens(fake.reply):
+                    self.send_event({"type": "response.output_text.delta", "sequence_number": next(sequence),
+                                     "item_id": "msg-fake", "output_index": 0, "content_index": 0,
+                                     "delta": piece, "logprobs": []})
+                    fake._count("streamed_tokens")
+                    time.sleep(fake.token_delay)
+                completed = self.response_payload(body)
+                self.send_event({"type": "response.output_item.done", "sequence_number": next(sequence),
+                                 "output_index": 0, "item": completed["output"][0]})
+                self.send_event({"type": "response.completed", "sequence_number": next(sequence),
+                                 "response": completed})
+                self.end_events()
+
+        return Handler
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:0.5,0.4", help="time to first byte distribution")
+    parser.add_argument("--token-delay", type=float, default=0.02, help="seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    fake = FakeOpenAI(args.host, args.port, args.latency, args.token_delay, args.error_rate, args.error_status, args.seed)
+    print(f"Fake OpenAI listening on {fake.base_url}")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(fake.counts))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,233 @@
+"""
+Offline load test of the chat endpoints against the fake OpenAI backend.
+
+Starts benchmarks/fake_openai.py in-process, points the app's shared OpenAI
+clients at it and drives /api/chat (Agents SDK path) and
+/api/conversations/<id>/messages (multi-agent path) as a logged-in user at a
+fixed concurrency. Each scenario reports p50/p95/p99 latency, requests per
+second, SQL statements per request and the worker's resident memory. The app
+runs in this process, so the figures are for one worker serving --concurrency
+requests with threads; the real API is never called. The share of prompt
+tokens the fake backend reports as prompt-cache hits is printed at the end,
+with the prompt, cached and completion tokens the app's own metrics recorded
+per stage.
+
+Usage: python benchmarks/load_test.py [--requests 200] [--concurrency 8]
+           [--latency lognormal:0.3,0.4] [--token-delay 0.01] [--error-rate 0.0]
+           [--stream] [--seed 1]
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_openai import FakeOpenAI  # noqa: E402
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at once")
+    parser.add_argument("--latency", default="lognormal:0.3,0.4", help="fake model latency distribution")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed tokens")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of model calls that fail")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--stream", action="store_true", help="also drive /api/chat with streaming replies")
+    parser.add_argument("--seed", type=int, default=1)
+    return parser.parse_args()
+
+
+def configure(fake):
+    """Point the app at the fake backend; must run before the app (and its Config) is imported."""
+    os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+    os.environ["OPENAI_BASE_URL"] = fake.base_url
+    os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/load_test.db"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"  # every request should reach the model
+    os.environ["MEMORY_INDEX_DIR"] = tempfile.mkdtemp()  # turns are embedded by the fake and recalled
+    os.environ.setdefault("OPENAI_BACKOFF_BASE", "0.05")  # keep injected-error retries short
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def rss_mb():
+    """Current resident set size of this process (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        self._lock = threading.Lock()
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args):
+        with self._lock:
+            self.count += 1
+
+
+def is_error_reply(reply):
+    """True for the apology both chat paths send, with status 200, when the model calls fail."""
+    from agents_sdk import ERROR_REPLY
+
+    return not reply or reply.startswith(ERROR_REPLY)
+
+
+def stream_reply(chunks):
+    """The reply of the "done" event in a Server-Sent Events body."""
+    reply = None
+    for line in b"".join(chunks).decode().splitlines():
+        if line.startswith("data:"):
+            event = json.loads(line[5:])
+            if event.get("type") == "done":
+                reply = event.get("reply")
+    return reply
+
+
+def seed():
+    from app import app, db
+    from memory import index_new
+    from migrations import create_schema
+    from models import User, Conversation
+
+    with app.app_context():
+        create_schema()
+        index_new()  # the deploy's index-memory step, so the per-turn runs have an index to extend
+        user = User(username="load-test")
+        db.session.add(user)
+        db.session.flush()
+        conversation = Conversation(user_id=user.id)
+        db.session.add(conversation)
+        db.session.commit()
+        return user.id, conversation.id
+
+
+def logged_in_client(user_id):
+    from app import app
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return client
+
+
+def run_scenario(name, args, counter, send):
+    from tasks import background_tasks
+
+    local = threading.local()
+
+    def one(i):
+        started = time.perf_counter()
+        status, reply, first_byte = send(local, i, started)
+        return status == 200 and not is_error_reply(reply), time.perf_counter() - started, first_byte
+
+    one(-1)  # warm-up: the first turn imports and builds the lazily loaded SDKs
+    background_tasks.join()
+    statements = counter.count
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - started
+    background_tasks.join()  # count queued post-reply writes too
+    statements = counter.count - statements
+
+    latencies = [latency for _, latency, _ in results]
+    first_bytes = [first_byte for _, _, first_byte in results if first_byte is not None]
+    # A 200 carrying the apology reply failed as much as an error status did
+    failed = sum(1 for ok, _, _ in results if not ok)
+    line = (f"{name:<16} p50 {percentile(latencies, 0.5) * 1000:7.1f}ms  p95 {percentile(latencies, 0.95) * 1000:7.1f}ms  "
+            f"p99 {percentile(latencies, 0.99) * 1000:7.1f}ms  {args.requests / elapsed:7.1f} req/s  "
+            f"{statements / args.requests:5.1f} SQL/req  {rss_mb():6.1f} MB RSS  {failed} failed")
+    if first_bytes:
+        line += f"  first token p50 {percentile(first_bytes, 0.5) * 1000:.1f}ms"
+    print(line)
+
+
+def main_cli():
+    args = parse_args()
+    fake = FakeOpenAI(latency=args.latency, token_delay=args.token_delay, error_rate=args.error_rate,
+                      error_status=args.error_status, seed=args.seed).start()
+    configure(fake)
+
+    import main  # noqa: F401  (registers the routes)
+    from app import app, db
+    from telemetry import metrics
+
+    logging.disable(logging.WARNING)
+
+    user_id, conversation_id = seed()
+    with app.app_context():
+        counter = StatementCounter(db.engine)
+
+    def client_for(local):
+        if not hasattr(local, "client"):
+            local.client = logged_in_client(user_id)
+        return local.client
+
+    def send_message(local, i, started):
+        response = client_for(local).post(f"/api/conversations/{conversation_id}/messages",
+                                          json={"content": f"How should I price my pottery classes? #{i}"})
+        return response.status_code, (response.json or {}).get("content"), None
+
+    def public_chat(local, i, started):
+        response = client_for(local).post("/api/chat", json={"user_message": f"How should I price my pottery classes? #{i}"})
+        return response.status_code, (response.json or {}).get("reply"), None
+
+    def streamed_chat(local, i, started):
+        response = client_for(local).post("/api/chat", json={"user_message": f"How should I price this? #{i}", "stream": True},
+                                          buffered=False)
+        first_token = None
+        chunks = []
+        for chunk in response.response:
+            chunks.append(chunk)
+            if first_token is None and b'"token"' in chunk:
+                first_token = time.perf_counter() - started
+        response.close()
+        return response.status_code, stream_reply(chunks), first_token
+
+    print(f"{args.requests} requests per scenario at concurrency {args.concurrency}, "
+          f"model latency {args.latency}, error rate {args.error_rate}")
+    print(f"baseline RSS {rss_mb():.1f} MB")
+    run_scenario("send_message", args, counter, send_message)
+    run_scenario("public_chat", args, counter, public_chat)
+    if args.stream:
+        run_scenario("public_chat SSE", args, counter, streamed_chat)
+    print(f"fake backend: {json.dumps(fake.counts)}")
+    if fake.counts["prompt_tokens"]:
+        print(f"prompt cache: {fake.counts['cached_tokens'] / fake.counts['prompt_tokens']:.1%} of prompt tokens "
+              f"would be served from the provider's cache")
+    # What the app's own metrics recorded for the same calls, per stage
+    recorded = {}
+    for (stage, _, kind), count in metrics.tokens.items():
+        recorded.setdefault(stage, {})[kind] = recorded.get(stage, {}).get(kind, 0) + count
+    for stage, tokens in sorted(recorded.items()):
+        print(f"app metrics {stage:<12} {tokens.get('prompt', 0):9d} prompt  {tokens.get('cached', 0):9d} cached  "
+              f"{tokens.get('completion', 0):7d} completion tokens")
+    fake.stop()
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,175 @@
+"""
+Recall and latency of long-term memory (memory.py) on synthetic data.
+
+Two parts:
+
+index   The flat vector index alone, at each of --sizes rows for one user.
+        Rows are clustered around topics; each query gets one planted row
+        close to it (its answer) among rows of the same topic. Reports append
+        throughput, query latency and recall@k of the planted rows.
+
+recall  The whole per-turn path on a SQLite database and the stub embeddings
+        (hashed bag-of-words, OPENAI_STUB=1): --messages synthetic messages for
+        one user with planted facts, embedded by index_new(), then
+        memory_context() for questions about the facts. Reports indexing
+        throughput, recall latency (embedding call, index search and database
+        lookup), recall@k of the facts, and the prompt tokens of the recalled
+        section against replaying the user's whole history.
+
+Usage: python benchmarks/memory_recall.py [--sizes 10000,100000,300000] [--messages 20000] [--queries 200]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["OPENAI_STUB"] = "1"
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/memory_recall.db"
+os.environ["MEMORY_INDEX_DIR"] = tempfile.mkdtemp()
+os.environ["MEMORY_MIN_SCORE"] = "0"  # stub vectors score lower than real embeddings
+os.environ["BACKGROUND_WORKERS"] = "0"
+
+import numpy as np  # noqa: E402
+from sqlalchemy import insert  # noqa: E402
+
+import main  # noqa: E402,F401
+from app import app, db  # noqa: E402
+from config import Config  # noqa: E402
+from history import count_tokens  # noqa: E402
+from memory import VectorIndex, index_new, memory_context, recall  # noqa: E402
+from migrations import create_schema  # noqa: E402
+from models import Conversation, Message, User  # noqa: E402
+
+TOPICS = 50
+
+WORDS = (
+    "pricing offer customer newsletter launch workshop invoice retainer audience funnel referral discount "
+    "bundle course coaching podcast sponsor partnership budget runway margin supplier inventory shipping "
+    "website portfolio testimonial outreach schedule burnout focus brand logo story client proposal"
+).split()
+
+# Planted facts and a question that should recall each (few words in common, like a real follow-up)
+FACTS = [
+    ("My studio rent in Podgórze is 2400 zł a month and the lease ends in March",
+     "what was the studio rent and when does the lease end"),
+    ("I promised my sister I would stop working on Sundays to keep the family lunch",
+     "did I promise anything about Sundays"),
+    ("The ceramics glaze supplier from Bolesławiec raised prices by 15 percent",
+     "which glaze supplier raised prices"),
+    ("My accountant Ewa says VAT registration becomes mandatory above 200000 zł revenue",
+     "when does VAT registration become mandatory according to my accountant"),
+    ("The Instagram reel about wheel throwing got 40000 views, far more than any post",
+     "which Instagram reel got the most views"),
+]
+
+
+def percentiles(timings):
+    ordered = sorted(timings)
+    return statistics.median(ordered), ordered[int(0.95 * (len(ordered) - 1))]
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def bench_index(size, queries, k, rng):
+    dimensions = Config.MEMORY_DIMENSIONS
+    centroids = unit(rng.standard_normal((TOPICS, dimensions)))
+    topics = rng.integers(0, TOPICS, size)
+    rows = unit(centroids[topics] + 0.9 * rng.standard_normal((size, dimensions)) / np.sqrt(dimensions) * 4)
+
+    # Each query's answer replaces a random row of the query's topic
+    query_topics = rng.integers(0, TOPICS, queries)
+    query_vectors = unit(centroids[query_topics] + rng.standard_normal((queries, dimensions)) / np.sqrt(dimensions) * 4)
+    answers = rng.choice(size, queries, replace=False)
+    rows[answers] = unit(query_vectors + 0.6 * rng.standard_normal((queries, dimensions)) / np.sqrt(dimensions))
+
+    index = VectorIndex(tempfile.mkdtemp(), 1, dimensions)
+    started = time.perf_counter()
+    for first in range(0, size, Config.MEMORY_BATCH_SIZE):
+        last = min(first + Config.MEMORY_BATCH_SIZE, size)
+        index.append(list(range(first, last)), rows[first:last])
+    append_seconds = time.perf_counter() - started
+
+    timings, found = [], 0
+    for query, answer in zip(query_vectors, answers):
+        started = time.perf_counter()
+        hits = index.search(query, k)
+        timings.append((time.perf_counter() - started) * 1000)
+        found += any(doc_id == answer for doc_id, _ in hits)
+    p50, p95 = percentiles(timings)
+    print(f"{size:>9} rows  append {size / append_seconds:9.0f} rows/s  "
+          f"search p50 {p50:6.2f} ms  p95 {p95:6.2f} ms  recall@{k} {found / queries:.3f}  "
+          f"{os.path.getsize(index.vectors_path) / 1024 / 1024:7.1f} MB")
+
+
+def seed(messages, rng):
+    user = User(username="memory-benchmark")
+    db.session.add(user)
+    db.session.flush()
+    facts = {int(position): fact for position, (fact, _) in zip(rng.choice(messages, len(FACTS), replace=False), FACTS)}
+    now = datetime.utcnow()
+    for first in range(0, messages, 50):
+        conversation = Conversation(user_id=user.id, created_at=now, updated_at=now)
+        db.session.add(conversation)
+        db.session.flush()
+        db.session.execute(insert(Message), [
+            {"conversation_id": conversation.id, "is_user": i % 2 == 0, "created_at": now,
+             "content": facts.get(i) or " ".join(rng.choice(WORDS, int(rng.integers(8, 40))))}
+            for i in range(first, min(first + 50, messages))
+        ])
+    db.session.commit()
+    return user.id
+
+
+def bench_recall(messages, k, rng):
+    with app.app_context():
+        create_schema()
+        user_id = seed(messages, rng)
+
+        started = time.perf_counter()
+        summary = index_new()
+        elapsed = time.perf_counter() - started
+        print(f"indexed {summary['embedded']} of {summary['rows']} messages: {summary['embedded'] / elapsed:.0f} embedded/s "
+              f"(stub embeddings, so this is the index and database side)")
+
+        timings, found, section_tokens = [], 0, []
+        for _ in range(20):
+            for fact, question in FACTS:
+                started = time.perf_counter()
+                section = memory_context(user_id, question)
+                timings.append((time.perf_counter() - started) * 1000)
+                section_tokens.append(count_tokens(section))
+        for fact, question in FACTS:
+            found += any(memory["content"] == fact for memory in recall(user_id, question))
+        p50, p95 = percentiles(timings)
+        history_tokens = sum(count_tokens(content) for content, in db.session.query(Message.content))
+        print(f"memory_context p50 {p50:.2f} ms  p95 {p95:.2f} ms  facts recalled@{k} {found}/{len(FACTS)}")
+        print(f"prompt: {statistics.mean(section_tokens):.0f} tokens of memories vs {history_tokens} tokens of history")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000,300000")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = np.random.default_rng(args.seed)
+    random.seed(args.seed)
+
+    print(f"index ({Config.MEMORY_DIMENSIONS} dimensions, k={Config.MEMORY_TOP_K}):")
+    for size in (int(size) for size in args.sizes.split(",")):
+        bench_index(size, args.queries, Config.MEMORY_TOP_K, rng)
+    print("recall:")
+    bench_recall(args.messages, Config.MEMORY_TOP_K, rng)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,133 @@
+"""
+Microbenchmark of MetaMask sign-in.
+
+Measures three things:
+- signature recovery with a fresh Web3() per login (the old code) against
+  the shared wallet_auth.verifier
+- username allocation when the default name is already taken N times:
+  queries issued by the old probe-one-name-per-query loop against
+  wallet_auth.allocate_username()
+- end-to-end logins per second through /metamask/nonce and /metamask/login,
+  for new and returning wallets
+
+Usage: python benchmarks/metamask_login.py [--logins 200] [--collisions 50]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/metamask_login.db"
+
+from eth_account import Account  # noqa: E402
+from eth_account.messages import encode_defunct  # noqa: E402
+from sqlalchemy import event  # noqa: E402
+
+import main  # noqa: E402
+import wallet_auth  # noqa: E402
+from app import app, db  # noqa: E402
+from migrations import create_schema  # noqa: E402
+from models import User  # noqa: E402
+
+
+def sign(account, message):
+    return account.sign_message(encode_defunct(text=message)).signature.hex()
+
+
+def bench_verifier(count):
+    account = Account.create()
+    message = wallet_auth.login_message("0" * 32)
+    signature = sign(account, message)
+
+    def fresh_web3():
+        from web3 import Web3
+        return Web3().eth.account.recover_message(encode_defunct(text=message), signature=signature)
+
+    for name, recover in (("Web3() per login", fresh_web3),
+                          ("shared verifier", lambda: wallet_auth.verifier.recover(message, signature))):
+        recover()  # warm-up: imports
+        started = time.perf_counter()
+        for _ in range(count):
+            assert recover() == account.address
+        elapsed = time.perf_counter() - started
+        print(f"  {name:<22} {count / elapsed:9.0f} recoveries/s  {elapsed / count * 1e6:8.1f} µs each")
+
+
+def old_allocate_username(base):
+    username, counter = base, 1
+    while User.query.filter_by(username=username).first():
+        username = f"{base}_{counter}"
+        counter += 1
+    return username
+
+
+def bench_usernames(collisions):
+    base = "user_0xabcdef"
+    db.session.add_all([User(username=base)] + [User(username=f"{base}_{i}") for i in range(1, collisions)])
+    db.session.commit()
+
+    queries = []
+    listener = lambda *args: queries.append(1)  # noqa: E731
+    event.listen(db.engine, "before_cursor_execute", listener)
+    try:
+        for name, allocate in (("one query per probe", old_allocate_username),
+                               ("single LIKE scan", wallet_auth.allocate_username)):
+            queries.clear()
+            started = time.perf_counter()
+            username = allocate(base)
+            elapsed = time.perf_counter() - started
+            print(f"  {name:<22} {len(queries):5d} queries  {elapsed * 1000:8.2f} ms  -> {username}")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", listener)
+
+
+def login(client, account):
+    nonce = client.get(f"/metamask/nonce?address={account.address}").json["nonce"]
+    response = client.post("/metamask/login", json={
+        "address": account.address,
+        "signature": sign(account, wallet_auth.login_message(nonce)),
+        "nonce": nonce,
+    })
+    assert response.status_code == 200, response.data
+    return response
+
+
+def bench_logins(count):
+    accounts = [Account.create() for _ in range(count)]
+    for name in ("new wallets", "returning wallets"):
+        started = time.perf_counter()
+        for account in accounts:
+            login(main.app.test_client(), account)
+        elapsed = time.perf_counter() - started
+        print(f"  {name:<22} {count / elapsed:9.1f} logins/s  {elapsed / count * 1000:8.2f} ms each")
+
+    # A signature can't be used twice
+    client = main.app.test_client()
+    nonce = client.get(f"/metamask/nonce?address={accounts[0].address}").json["nonce"]
+    body = {"address": accounts[0].address, "signature": sign(accounts[0], wallet_auth.login_message(nonce)), "nonce": nonce}
+    assert client.post("/metamask/login", json=body).status_code == 200
+    assert client.post("/metamask/login", json=body).status_code == 401
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--collisions", type=int, default=50, help="existing users with the default username")
+    args = parser.parse_args()
+
+    with app.app_context():
+        create_schema()
+        print("Signature recovery:")
+        bench_verifier(args.logins)
+        print(f"Username allocation with {args.collisions} names taken:")
+        bench_usernames(args.collisions)
+    print(f"Login round trips ({args.logins} wallets, nonce + sign + verify):")
+    bench_logins(args.logins)
+
+
+if __name__ == "__main__":
+    main_cli()
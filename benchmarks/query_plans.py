@@ -0,0 +1,137 @@
+"""
+Query plan audit for the hot dashboard, chat and API queries.
+
+Runs EXPLAIN on each query routes.py issues per page view and fails (exit
+code 1) if any of them scans a whole table or sorts rows instead of walking
+an index. By default it checks a scratch SQLite database filled with sample
+rows; pass --database-url to check an existing SQLite or Postgres database.
+
+Usage: python benchmarks/query_plans.py [--database-url postgresql://...]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from flask import Flask  # noqa: E402
+
+from app import db  # noqa: E402
+from migrations import create_schema  # noqa: E402
+from models import User, Conversation, Message, UserGoal, UserInsight  # noqa: E402
+from sqlalchemy import and_, or_  # noqa: E402
+
+# Plan fragments that mean the query does not use an index for its filter or order
+SQLITE_BAD = ("SCAN ", "USE TEMP B-TREE")
+POSTGRES_BAD = ("Seq Scan", "Sort  (")
+
+
+def plan_app(database_url=None):
+    """A Flask app binding the models to database_url, by default a scratch SQLite file."""
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = database_url or f"sqlite:///{tempfile.mkdtemp()}/query_plans.db"
+    db.init_app(app)
+    return app
+
+
+def seed():
+    """Sample data, so the planner has statistics to work with."""
+    start = datetime(2025, 1, 1)
+    for u in range(20):
+        user = User(username=f"plan-user-{u}")
+        db.session.add(user)
+        db.session.flush()
+        for c in range(10):
+            conversation = Conversation(user_id=user.id, updated_at=start + timedelta(hours=c))
+            db.session.add(conversation)
+            db.session.flush()
+            db.session.add_all(
+                Message(conversation_id=conversation.id, content=f"message {m}", is_user=m % 2 == 0,
+                        created_at=start + timedelta(minutes=m))
+                for m in range(20)
+            )
+        db.session.add_all(UserGoal(user_id=user.id, title=f"goal {g}") for g in range(5))
+        db.session.add_all(UserInsight(user_id=user.id, content=f"insight {i}") for i in range(5))
+    db.session.commit()
+
+
+def hot_queries(user_id, conversation_id):
+    """The queries behind /dashboard, /chat, /goals, /insights and the conversation APIs."""
+    cursor_time = datetime(2025, 1, 1, 5)
+    return {
+        "dashboard recent conversations": Conversation.query.filter_by(user_id=user_id)
+            .order_by(Conversation.updated_at.desc()).limit(5),
+        "conversation page": Conversation.query.filter_by(user_id=user_id)
+            .order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(51),
+        "conversation page after cursor": Conversation.query.filter_by(user_id=user_id)
+            .filter(or_(Conversation.updated_at < cursor_time,
+                        and_(Conversation.updated_at == cursor_time, Conversation.id < 10)))
+            .order_by(Conversation.updated_at.desc(), Conversation.id.desc()).limit(51),
+        "conversation by id": Conversation.query.filter_by(id=conversation_id, user_id=user_id),
+        "message page": Message.query.filter_by(conversation_id=conversation_id)
+            .order_by(Message.created_at.desc(), Message.id.desc()).limit(51),
+        "message page after cursor": Message.query.filter_by(conversation_id=conversation_id)
+            .filter(or_(Message.created_at < cursor_time,
+                        and_(Message.created_at == cursor_time, Message.id < 10)))
+            .order_by(Message.created_at.desc(), Message.id.desc()).limit(51),
+        "message history": Message.query.filter_by(conversation_id=conversation_id).order_by(Message.created_at),
+        "goals": UserGoal.query.filter_by(user_id=user_id),
+        "dashboard insights": UserInsight.query.filter_by(user_id=user_id)
+            .order_by(UserInsight.created_at.desc()).limit(5),
+    }
+
+
+def explain(query):
+    connection = db.session.connection()
+    compiled = query.statement.compile(dialect=connection.dialect)
+    if connection.dialect.name == "sqlite":
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params).fetchall()
+        return [row[-1] for row in rows], SQLITE_BAD
+    rows = connection.exec_driver_sql(f"EXPLAIN {compiled}", compiled.params).fetchall()
+    return [row[0] for row in rows], POSTGRES_BAD
+
+
+def check_plans(queries):
+    """The EXPLAIN output of each query, and whether it scans a table or sorts rows."""
+    connection = db.session.connection()
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("ANALYZE")
+    else:
+        # Small tables are cheaper to scan; ask whether an index scan is possible at all
+        connection.exec_driver_sql("SET enable_seqscan = off")
+    for name, query in queries.items():
+        plan, bad = explain(query)
+        yield name, plan, any(marker in line for line in plan for marker in bad)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", help="database to check instead of a scratch SQLite file")
+    args = parser.parse_args()
+
+    with plan_app(args.database_url).app_context():
+        if not args.database_url:
+            create_schema()
+            seed()
+        conversation = Conversation.query.first()
+        if conversation is None:
+            sys.exit("No conversations to check; run without --database-url to use sample data")
+        queries = hot_queries(conversation.user_id, conversation.id)
+        failures = 0
+        for name, plan, bad in check_plans(queries):
+            failures += bad
+            print(f"{'FAIL' if bad else 'ok  '} {name}")
+            for line in plan:
+                print(f"       {line}")
+
+        print(f"{failures} of {len(queries)} hot queries without an index plan")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+"""
+Benchmarks for the reply condenser (its guarantees are checked in
+test_condenser.py).
+
+Two parts:
+- speed: the old split-and-rebuild condense() against condenser.condense() and
+  token-by-token streaming, on replies of growing size
+- early stop: a long streamed reply from benchmarks/fake_openai.py through
+  agents_sdk, with and without cancelling the run once the budget is spent,
+  counting the tokens the backend actually generated; exits non-zero if a
+  run ends in the error reply
+
+Usage: python benchmarks/reply_condenser.py [--words 1000,100000,1000000] [--reply-words 400]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from condenser import REPLY_WORD_LIMIT, ReplyCondenser, condense  # noqa: E402
+from fake_openai import FakeOpenAI, split_tokens  # noqa: E402
+
+WORDS = ("pottery", "classes", "price", "Kraków", "customers", "offer", "week", "**test**", "idea", "budget", "-")
+
+
+def old_condense(text: str, limit: int = 120) -> str:
+    """condense() as it was: whole-text split, first two and last sentences, character cut."""
+    if len(text.split()) <= limit:
+        return text
+    parts = text.split('. ')
+    short = '. '.join(parts[:2] + parts[-1:])
+    return short[:limit * 6] + '…'
+
+
+def make_reply(rng: random.Random, words: int) -> str:
+    """Markdown-ish text: sentences of 3-30 words, some bullet lines."""
+    out, count = [], 0
+    while count < words:
+        length = min(rng.randint(3, 30), words - count)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        out.append(sentence + rng.choice((". ", "! ", "? ", ".\n", "\n\n", ", ")))
+        count += length
+    return "".join(out).rstrip()
+
+
+def stream(text: str, condenser: ReplyCondenser, pieces) -> str:
+    out = []
+    for piece in pieces:
+        out.append(condenser.feed(piece))
+        if condenser.done:
+            break
+    out.append(condenser.finish())
+    return "".join(out)
+
+
+def bench_speed(rng: random.Random, sizes):
+    for words in sizes:
+        text = make_reply(rng, words)
+        pieces = split_tokens(text)
+        for name, run in (("old condense()", lambda: old_condense(text)),
+                          ("condense()", lambda: condense(text)),
+                          ("streamed tokens", lambda: stream(text, ReplyCondenser(), pieces))):
+            runs = max(1, 200_000 // words)
+            started = time.perf_counter()
+            for _ in range(runs):
+                run()
+            elapsed = (time.perf_counter() - started) / runs
+            print(f"  {words:>9,} words  {name:<16} {elapsed * 1e6:12.1f} µs")
+
+
+def bench_early_stop(reply_words: int, token_delay: float) -> int:
+    """Time a long streamed reply with and without the early stop; returns the number of failed runs."""
+    reply = make_reply(random.Random(7), reply_words)
+    fake = FakeOpenAI(latency="fixed:0.05", token_delay=token_delay, reply=reply).start()
+    os.environ["OPENAI_API_KEY"] = "sk-benchmark"
+    os.environ["OPENAI_BASE_URL"] = fake.base_url
+    os.environ["OPENAI_AGENTS_DISABLE_TRACING"] = "1"
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/condenser.db"
+    os.environ["RESPONSE_CACHE_ENABLED"] = "0"
+    os.environ["MEMORY_ENABLED"] = "0"
+
+    import agents_sdk
+
+    agents_sdk.get_agent_response("warm-up")  # imports and builds the agents
+    failures = 0
+    for name, make_condenser in (("run to the end", lambda: ReplyCondenser(10 ** 9)),
+                                 ("cancel at budget", ReplyCondenser)):
+        agents_sdk.ReplyCondenser = make_condenser
+        tokens = fake.counts["streamed_tokens"]
+        started = time.perf_counter()
+        reply_text = agents_sdk.get_agent_response(f"How should I price my classes? ({name})")["reply"]
+        elapsed = time.perf_counter() - started
+        time.sleep(0.2)  # let the backend notice the closed stream
+        if reply_text.startswith(agents_sdk.ERROR_REPLY):
+            print(f"  {name:<18} FAILED: {reply_text}")
+            failures += 1
+            continue
+        print(f"  {name:<18} {fake.counts['streamed_tokens'] - tokens:6d} tokens generated  "
+              f"{len(reply_text.split()):5d} words kept  {elapsed * 1000:8.1f} ms")
+    agents_sdk.ReplyCondenser = ReplyCondenser
+    fake.stop()
+    return failures
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--words", default="1000,100000,1000000", help="reply sizes for the speed benchmark")
+    parser.add_argument("--reply-words", type=int, default=400, help="length of the fake model's streamed reply")
+    parser.add_argument("--token-delay", type=float, default=0.002, help="seconds between streamed tokens")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    print("Condensing a whole reply / a token stream:")
+    bench_speed(rng, [int(words) for words in args.words.split(",")])
+    print(f"Early stop on a {args.reply_words}-word streamed reply (budget {REPLY_WORD_LIMIT} words):")
+    failures = bench_early_stop(args.reply_words, args.token_delay)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,117 @@
+"""
+Offline evaluation of the local agent router against the LLM router.
+
+The dataset is a JSONL file in the routing-log format written by
+agent_router.record_decision() ({"tokens": [...], "selected_agents": [...]}),
+or hand labels with {"message": ...} in place of the tokens. The labels are
+the LLM router's own past decisions or the hand labels. The routing log keeps
+only the tokens, so with --llm the LLM router is shown those, not the original
+wording; use hand-labelled messages to compare the two routers fairly. Every
+--holdout-th record is held out for evaluation and the router is trained on
+the rest, as it would be in production.
+
+Usage: python benchmarks/router_eval.py [--dataset instance/routing_decisions.jsonl] [--llm]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+from config import Config  # noqa: E402
+from agent_router import SEED_EXAMPLES, KeywordRouter, load_decisions  # noqa: E402
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+def evaluate_local(train, test, threshold):
+    examples = {agent: list(texts) for agent, texts in SEED_EXAMPLES.items()}
+    for decision in train:
+        examples[decision["agent"]].append(decision["message"])
+    router = KeywordRouter(examples)
+
+    latencies, correct, covered, covered_correct = [], 0, 0, 0
+    for decision in test:
+        start = time.perf_counter()
+        agent, confidence = router.predict(decision["message"])
+        latencies.append(time.perf_counter() - start)
+
+        correct += agent == decision["agent"]
+        if agent is not None and confidence >= threshold:
+            covered += 1
+            covered_correct += agent == decision["agent"]
+
+    return {
+        "accuracy": correct / len(test),
+        "coverage": covered / len(test),
+        "covered_accuracy": covered_correct / covered if covered else 0.0,
+        "latencies": latencies,
+    }
+
+
+def evaluate_llm(test):
+    import agent_service
+    from openai_client import get_client
+
+    latencies, correct, errors = [], 0, 0
+    for decision in test:
+        start = time.perf_counter()
+        try:
+            response = get_client().chat.completions.create(
+                **agent_service.agent_selection_request(decision["message"])
+            )
+            selected = agent_service.parse_agent_selection(response)["selected_agents"]
+        except Exception as e:
+            errors += 1
+            print(f"LLM router error: {e}", file=sys.stderr)
+            continue
+        finally:
+            latencies.append(time.perf_counter() - start)
+        correct += bool(selected) and selected[0].lower() == decision["agent"]
+
+    return {"accuracy": correct / len(test), "errors": errors, "latencies": latencies}
+
+
+def print_latency(name, latencies):
+    print(f"  {name} latency p50 {percentile(latencies, 0.5) * 1000:.3f} ms, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=Config.ROUTING_LOG_PATH)
+    parser.add_argument("--holdout", type=int, default=5, help="hold out every Nth record for evaluation")
+    parser.add_argument("--threshold", type=float, default=Config.LOCAL_ROUTER_MIN_CONFIDENCE)
+    parser.add_argument("--llm", action="store_true", help="also call the LLM router on the held-out set (costs tokens)")
+    args = parser.parse_args()
+
+    decisions = load_decisions(args.dataset)
+    test = decisions[::args.holdout]
+    train = [decision for i, decision in enumerate(decisions) if i % args.holdout]
+    if not test:
+        sys.exit(f"No single-agent routing decisions found in {args.dataset}")
+
+    print(f"{len(train)} training / {len(test)} held-out decisions from {args.dataset}")
+
+    local = evaluate_local(train, test, args.threshold)
+    print("Local router")
+    print(f"  agreement with labels {local['accuracy']:.1%}")
+    print(f"  answered locally at confidence >= {args.threshold}: {local['coverage']:.1%} "
+          f"(agreement on those {local['covered_accuracy']:.1%})")
+    print_latency("local", local["latencies"])
+
+    if args.llm:
+        llm = evaluate_llm(test)
+        print("LLM router")
+        print(f"  agreement with labels {llm['accuracy']:.1%} ({llm['errors']} errors)")
+        print_latency("LLM", llm["latencies"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Search latency (search.py) against a LIKE scan, on SQLite.
+
+Seeds --messages messages for --users users through the normal insert path,
+so the index triggers run for every row (the insert rate reported includes
+index maintenance). Word frequencies follow Zipf's law over a 20k-word
+vocabulary, and the first user is a heavy one owning a tenth of all messages.
+Then times the first page of queries from common to rare words, for the heavy
+user, with the full-text index and with the `content LIKE '%term%'` scan it
+replaces (which cannot rank, and stops early only when common words fill the
+page).
+
+Usage: python benchmarks/search_scale.py [--messages 1000000] [--users 1000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/search_scale.db"
+
+from sqlalchemy import insert, select  # noqa: E402
+
+import main  # noqa: E402,F401
+from app import db, app  # noqa: E402
+from migrations import create_schema  # noqa: E402
+from models import Conversation, Message, User  # noqa: E402
+from search import search  # noqa: E402
+
+WORDS = (
+    "pricing offer customer newsletter launch pottery workshop invoice retainer audience funnel "
+    "referral discount bundle course coaching podcast sponsor partnership budget runway margin "
+    "supplier inventory shipping website portfolio testimonial outreach schedule burnout focus"
+).split() + [f"topic{rank}" for rank in range(20_000)]
+
+# Cumulative Zipf weights: the word at rank r appears with frequency ~ 1/r
+ZIPF = []
+for rank in range(1, len(WORDS) + 1):
+    ZIPF.append((ZIPF[-1] if ZIPF else 0) + 1 / rank)
+
+QUERIES = ["pricing", "pricing offer", "newsl", "topic100", "topic100 pottery", "topic5000", "topic19000"]
+
+BATCH = 10_000
+
+
+def seed(messages, users, per_conversation=50):
+    """Seed the messages; returns the heavy user's id."""
+    rng = random.Random(7)
+    db.session.execute(insert(User), [{"username": f"search-{i}"} for i in range(users)])
+    user_ids = db.session.execute(select(User.id)).scalars().all()
+    conversation_ids = db.session.execute(
+        insert(Conversation).returning(Conversation.id, sort_by_parameter_order=True),
+        [{"user_id": user_ids[i % users], "title": "Benchmark"} for i in range(messages // per_conversation)],
+    ).scalars().all()
+    now = datetime.utcnow()
+    started = time.perf_counter()
+    heavy = [c for i, c in enumerate(conversation_ids) if i % users == 0]
+    for first in range(0, messages, BATCH):
+        db.session.execute(insert(Message), [
+            {"conversation_id": heavy[i % len(heavy)] if i % 10 == 0 else conversation_ids[i % len(conversation_ids)],
+             "content": " ".join(rng.choices(WORDS, cum_weights=ZIPF, k=rng.randint(8, 40))), "is_user": i % 2 == 0,
+             "created_at": now}
+            for i in range(first, min(first + BATCH, messages))
+        ])
+    db.session.commit()
+    elapsed = time.perf_counter() - started
+    print(f"seeded {messages} messages for {users} users: {messages / elapsed:.0f} inserts/s with indexing")
+    return user_ids[0]
+
+
+def like_scan(user_id, query, limit):
+    statement = select(Message.id).join(Conversation, Conversation.id == Message.conversation_id) \
+        .filter(Conversation.user_id == user_id)
+    for term in query.split():
+        statement = statement.filter(Message.content.like(f"%{term}%"))
+    return db.session.execute(statement.order_by(Message.id.desc()).limit(limit)).scalars().all()
+
+
+def timed(function, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    with app.app_context():
+        create_schema()
+        user_id = seed(args.messages, args.users)
+        print(f"{'query':<26} {'LIKE hits':>9} {'index ms':>9} {'LIKE ms':>9}")
+        for query in QUERIES:
+            indexed = timed(lambda: search(user_id, query, None, args.limit))
+            scanned = timed(lambda: like_scan(user_id, query, args.limit))
+            matches = len(like_scan(user_id, query, None))
+            print(f"{query:<26} {matches:9} {indexed:9.2f} {scanned:9.2f}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,79 @@
+"""
+Cold-start budget for worker processes.
+
+Imports the WSGI entry point (main) in fresh interpreters under
+`python -X importtime`, and fails (exit code 1) when the median import time
+is over the budget or when any module that should load lazily on first use
+is imported at start-up. Prints the slowest top-level imports so a
+regression points at its cause.
+
+Usage: python benchmarks/startup_time.py [--module main] [--budget-ms 1500] [--runs 5]
+"""
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies only some requests need; they must not load when a worker starts
+LAZY_MODULES = ("web3", "eth_account", "agents", "openai", "tiktoken")
+
+IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def import_times(module):
+    """Run one cold import and return {module: (cumulative µs, depth)}."""
+    env = {
+        **os.environ,
+        "OPENAI_API_KEY": "sk-benchmark",
+        "DATABASE_URL": f"sqlite:///{tempfile.mkdtemp()}/startup_time.db",
+        "PYTHONDONTWRITEBYTECODE": "1",
+    }
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if completed.returncode != 0:
+        sys.exit(f"import {module} failed:\n{completed.stderr[-2000:]}")
+
+    times = {}
+    for line in completed.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            times[match.group(4)] = (int(match.group(2)), len(match.group(3)) // 2)
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main", help="entry point a worker imports (main or asgi)")
+    parser.add_argument("--budget-ms", type=float, default=1500, help="maximum median import time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest top-level imports to show")
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.runs)]
+    median_ms = statistics.median(run[args.module][0] for run in runs) / 1000
+
+    last = runs[-1]
+    top_level = sorted(((micros, name) for name, (micros, depth) in last.items() if depth <= 1), reverse=True)
+    print(f"Slowest imports under {args.module} (cumulative, last run):")
+    for micros, name in top_level[:args.top]:
+        print(f"  {micros / 1000:8.1f} ms  {name}")
+
+    eager = sorted({name.split(".")[0] for name in last} & set(LAZY_MODULES))
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:g} ms)")
+    if eager:
+        print(f"FAIL: imported at start-up but should load lazily: {', '.join(eager)}")
+    if median_ms > args.budget_ms:
+        print("FAIL: over the import time budget")
+    sys.exit(1 if eager or median_ms > args.budget_ms else 0)
+
+
+if __name__ == "__main__":
+    main()
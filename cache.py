@@ -0,0 +1,134 @@
+"""
+In-process cache with LRU and TTL eviction.
+
+Used for state that is too big or too hot for the cookie session or the
+database, such as agent run histories and replies to repeated prompts.
+Entries live in the memory of one process, so every worker keeps its own copy.
+"""
+
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+class TTLCache:
+    """
+    Thread-safe mapping that evicts the least recently used entry past max_entries
+    and treats entries older than ttl seconds as missing.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None or entry[0] < time.monotonic() else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def purge_expired(self) -> int:
+        """Drop expired entries and return how many were removed."""
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (expires_at, _) in self._entries.items() if expires_at < now]
+            for key in expired:
+                del self._entries[key]
+            return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def normalize_text(text: str) -> str:
+    """Case-, accent-, punctuation- and whitespace-insensitive form of a message."""
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(re.sub(r"[^\w\s]", " ", stripped).split())
+
+
+class ResponseCache:
+    """
+    Cache of replies to self-contained prompts, looked up by exact text first and
+    then by normalized text.
+
+    Every key includes a version string, so changing whatever the replies depend
+    on (instructions, model) makes old entries unreachable; they age out via LRU/TTL.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.entries = TTLCache(max_entries=max_entries, ttl=ttl)
+        self.exact_hits = 0
+        self.normalized_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, version: str, prompt: str) -> Any:
+        value = self.entries.get((version, "exact", prompt))
+        if value is not None:
+            kind = "exact_hits"
+        else:
+            value = self.entries.get((version, "normalized", normalize_text(prompt)))
+            kind = "normalized_hits" if value is not None else "misses"
+
+        with self._lock:
+            setattr(self, kind, getattr(self, kind) + 1)
+        return value
+
+    def set(self, version: str, prompt: str, value: Any) -> None:
+        self.entries.set((version, "exact", prompt), value)
+        self.entries.set((version, "normalized", normalize_text(prompt)), value)
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.exact_hits + self.normalized_hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.entries.max_entries,
+            "exact_hits": self.exact_hits,
+            "normalized_hits": self.normalized_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.normalized_hits) / lookups if lookups else 0.0,
+        }
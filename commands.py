@@ -0,0 +1,90 @@
+"""
+Flask CLI commands, run as `flask --app main <command>`.
+"""
+
+import gzip
+
+import click
+
+from app import app
+from archive import archive_idle_conversations, archive_stats
+from config import Config
+from insights import extract_insights
+from memory import index_new
+from migrations import create_schema
+from models import User
+from transfer import export_lines, gzip_chunks, import_lines
+
+
+@app.cli.command('upgrade-db')
+def upgrade_db():
+    """Create missing tables and apply pending schema upgrades."""
+    applied = create_schema()
+    for change in applied:
+        click.echo(f"Applied {change}")
+    click.echo("Database is up to date" if not applied else f"{len(applied)} change(s) applied")
+
+
+@app.cli.command('extract-insights')
+@click.option('--limit', type=int, default=None, help='Maximum number of new messages to read.')
+@click.option('--dry-run', is_flag=True, help='Print the insights without storing them or moving the high-water mark.')
+def extract_insights_command(limit, dry_run):
+    """Extract user insights from the messages written since the last run."""
+    summary = extract_insights(limit=limit, dry_run=dry_run)
+    click.echo(f"Read {summary['messages']} message(s) in {summary['calls']} model call(s), "
+               f"{'found' if dry_run else 'stored'} {summary['insights']} new insight(s)")
+
+
+@app.cli.command('index-memory')
+@click.option('--limit', type=int, default=None, help='Maximum number of new messages and insights to read.')
+def index_memory(limit):
+    """Build the memory index, or embed the messages and insights written since the last run into it."""
+    if not Config.MEMORY_ENABLED:
+        click.echo("Long-term memory is disabled (MEMORY_ENABLED=0)")
+        return
+    summary = index_new(limit=limit)
+    click.echo(f"Read {summary['rows']} row(s), embedded {summary['embedded']}")
+
+
+def _user_id(username):
+    if username is None:
+        return None
+    user = User.query.filter_by(username=username).first()
+    if user is None:
+        raise click.ClickException(f"No user named {username!r}")
+    return user.id
+
+
+@app.cli.command('export-data')
+@click.argument('output', type=click.Path(dir_okay=False, allow_dash=True))
+@click.option('--user', 'username', default=None, help='Export only this user\'s data.')
+def export_data(output, username):
+    """Write conversations, messages, insights and goals to OUTPUT as gzipped JSON lines ('-' for stdout)."""
+    chunks = gzip_chunks(export_lines(_user_id(username)))
+    with click.open_file(output, 'wb') as out:
+        for chunk in chunks:
+            out.write(chunk)
+
+
+@app.cli.command('import-data')
+@click.argument('input_path', metavar='INPUT', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+@click.option('--user', 'username', default=None,
+              help='Import everything for this user instead of matching users by username.')
+def import_data(input_path, username):
+    """Import an export-data file as new rows; users are matched by username."""
+    with click.open_file(input_path, 'rb') as compressed, gzip.open(compressed, 'rb') as lines:
+        counts = import_lines(lines, _user_id(username))
+    click.echo(", ".join(f"{count} {name}" for name, count in counts.items()))
+
+
+@app.cli.command('archive-conversations')
+@click.option('--days', type=int, default=None, help='Idle days before a conversation is archived (default: ARCHIVE_AFTER_DAYS).')
+@click.option('--limit', type=int, default=None, help='Maximum number of conversations to archive.')
+def archive_conversations(days, limit):
+    """Move the messages of idle conversations into compressed archive rows."""
+    run = archive_idle_conversations(days=days, limit=limit)
+    click.echo(f"Archived {run['conversations']} conversation(s), {run['messages']} message(s): "
+               f"{run['raw_bytes']} bytes stored in {run['stored_bytes']}, {run['reclaimed_bytes']} reclaimed")
+    total = archive_stats()
+    click.echo(f"Archive holds {total['conversations']} conversation(s), {total['messages']} message(s), "
+               f"{total['reclaimed_bytes']} bytes reclaimed in total")
@@ -0,0 +1,135 @@
+"""
+Word-budget condenser for agent replies.
+
+Replies are kept to a word budget so chat answers stay short. The condenser
+reads a reply in one pass, either whole or as streamed text deltas, and
+passes words through as soon as they are complete. Once the budget is spent
+it holds back up to a small grace allowance of words to let the current
+sentence finish, then stops; if the sentence runs past the grace too, the
+held words are dropped and the reply ends at the budget with an ellipsis.
+Text is never cut mid-word, and
+`done` tells a streaming caller it can cancel the model run, so tokens past
+the budget are never generated.
+"""
+
+import re
+from typing import Optional
+
+# Word budget for agent replies
+REPLY_WORD_LIMIT = 120
+
+ELLIPSIS = "…"
+
+WORD = re.compile(r"\S+")
+
+# A word ending a sentence, allowing closing quotes, brackets and markdown emphasis after the mark
+SENTENCE_END = re.compile(r"[.!?…][\"'”’)\]*_]*$")
+
+
+class ReplyCondenser:
+    """
+    Incremental condenser for one reply.
+
+    feed() each text delta and send on what it returns; call finish() when
+    the reply ends to flush the last word. The concatenated output is the
+    condensed reply, also available as `text`.
+
+    Args:
+        limit: Word budget
+        grace: Extra words allowed to finish the sentence in progress when the
+            budget runs out (default: a quarter of the limit)
+    """
+
+    def __init__(self, limit: int = REPLY_WORD_LIMIT, grace: Optional[int] = None):
+        self.limit = limit
+        self.grace = limit // 4 if grace is None else grace
+        self.words = 0
+        self.done = False  # budget spent (or reply finished): further input is ignored
+        self._pending = ""  # whitespace and the partial word not yet passed through
+        self._held = []  # words past the budget, sent only if their sentence ends within the grace
+        self._parts = []
+
+    @property
+    def text(self) -> str:
+        return "".join(self._parts)
+
+    def feed(self, delta: str) -> str:
+        """Consume a text delta and return the text that can be sent on now."""
+        if self.done or not delta:
+            return ""
+        buffer = self._pending + delta
+        output = []
+        position = 0
+        for match in WORD.finditer(buffer):
+            end = match.end()
+            if end == len(buffer):
+                break  # the word may continue in the next delta
+            # The whitespace after the word has started; a line break also ends a sentence (lists, headings)
+            self._take(output, buffer[position:end], buffer[end] == "\n")
+            position = end
+            if self.done:
+                break
+        self._pending = "" if self.done else buffer[position:]
+        return self._emit(output)
+
+    def finish(self) -> str:
+        """End of the reply: return the remaining text, including the last word."""
+        if self.done:
+            return ""
+        output = []
+        if self._pending.strip():
+            self._take(output, self._pending, True)
+        elif self._held:
+            output += self._held  # the reply ended, and with it the sentence
+        elif self.words <= self.limit:
+            output.append(self._pending)  # trailing whitespace of a reply within budget
+        self._pending = ""
+        self.done = True
+        return self._emit(output)
+
+    def _take(self, output, chunk: str, line_end: bool) -> None:
+        """Pass through chunk (whitespace + one word) if it fits the budget."""
+        self.words += 1
+        ends_sentence = line_end or bool(SENTENCE_END.search(chunk))
+        if self.words <= self.limit:
+            output.append(chunk)
+            if self.words == self.limit and ends_sentence:
+                self.done = True
+        elif self.words <= self.limit + self.grace:
+            self._held.append(chunk)
+            if ends_sentence:
+                output += self._held
+                self.done = True
+            elif self.words == self.limit + self.grace:
+                self._cut(output)
+        else:
+            self._cut(output)
+
+    def _cut(self, output) -> None:
+        # Text passed through never ends in whitespace, so the marker can follow it directly
+        self.done = True
+        self._held = []
+        output.append(ELLIPSIS)
+
+    def _emit(self, output) -> str:
+        text = "".join(output)
+        if text:
+            self._parts.append(text)
+        return text
+
+
+def condense(text: str, limit: int = REPLY_WORD_LIMIT) -> str:
+    """
+    Condense a complete reply to the word budget.
+
+    Args:
+        text: The text to condense
+        limit: Maximum word count (default: 120 words)
+
+    Returns:
+        The text itself when it is within the limit, otherwise its first
+        `limit` words ending in an ellipsis, or a little more to end on a
+        whole sentence
+    """
+    condenser = ReplyCondenser(limit)
+    return condenser.feed(text) + condenser.finish()
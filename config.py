@@ -10,11 +10,111 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///solopreneur_agency.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Server-side agent run history for the narrative chat (the session cookie only holds its id).
+    # The store is per process, so run a single worker (or the ASGI entry point) per deployment.
+    HISTORY_STORE_MAX_ENTRIES = int(os.environ.get('HISTORY_STORE_MAX_ENTRIES', 5000))
+    HISTORY_STORE_TTL = int(os.environ.get('HISTORY_STORE_TTL', 60 * 60 * 24))  # seconds
+    
+    # Per-user profile snapshots used as current_user and as agent context (see profiles.py);
+    # dropped on profile save, other workers pick up the change within the TTL
+    PROFILE_CACHE_MAX_ENTRIES = int(os.environ.get('PROFILE_CACHE_MAX_ENTRIES', 10000))
+    PROFILE_CACHE_TTL = int(os.environ.get('PROFILE_CACHE_TTL', 300))  # seconds
+    
+    # One-time MetaMask login nonces (see wallet_auth.py), kept in the database so any instance can redeem them
+    LOGIN_NONCE_TTL = int(os.environ.get('LOGIN_NONCE_TTL', 300))  # seconds to sign in after asking for a nonce
+    
+    # Keyset pagination of conversation and message lists (see pagination.py)
+    PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT', 50))
+    PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX', 200))
+    
+    # Background queue for post-reply work (see tasks.py); 0 workers runs tasks inline
+    BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 2))
+    BACKGROUND_QUEUE_SIZE = int(os.environ.get('BACKGROUND_QUEUE_SIZE', 1000))
+    BACKGROUND_DRAIN_TIMEOUT = float(os.environ.get('BACKGROUND_DRAIN_TIMEOUT', 10))  # seconds
+    
     # OpenAI
     OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY', '')
     
+    # Shared OpenAI HTTP client (see openai_client.py): connection pool, timeouts, retries and concurrency cap
+    OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 100))
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENAI_MAX_KEEPALIVE_CONNECTIONS', 20))
+    OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 30))  # seconds
+    OPENAI_TIMEOUT = float(os.environ.get('OPENAI_TIMEOUT', 60))  # seconds
+    OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 5))  # seconds
+    OPENAI_MAX_RETRIES = int(os.environ.get('OPENAI_MAX_RETRIES', 4))
+    OPENAI_BACKOFF_BASE = float(os.environ.get('OPENAI_BACKOFF_BASE', 0.5))  # seconds
+    OPENAI_BACKOFF_MAX = float(os.environ.get('OPENAI_BACKOFF_MAX', 20))  # seconds
+    OPENAI_MAX_CONCURRENCY = int(os.environ.get('OPENAI_MAX_CONCURRENCY', 32))  # requests in flight per process
+    # Test mode: answer every OpenAI call from a local stub instead of the API (see openai_client.stub_transport)
+    OPENAI_STUB = os.environ.get('OPENAI_STUB', '0') == '1'
+    
+    # Bearer token for /metrics and /api/metrics/tasks; both answer 404 while it is unset
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
     # Agent settings
     DEFAULT_AGENT_MODEL = "gpt-4o"  # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
+    SPECIALIST_TIMEOUT = float(os.environ.get('SPECIALIST_TIMEOUT', 30))  # seconds each specialist may run, and may queue
+    SPECIALIST_MAX_WORKERS = int(os.environ.get('SPECIALIST_MAX_WORKERS', 8))  # threads shared by all fan-outs
+    SPECIALIST_MAX_QUEUED = int(os.environ.get('SPECIALIST_MAX_QUEUED', 16))  # calls waiting for a thread before new ones are refused
+    
+    # Conversation history sent to the model (see history.py): recent turns verbatim, older ones summarized
+    HISTORY_TOKEN_BUDGET = int(os.environ.get('HISTORY_TOKEN_BUDGET', 2000))
+    HISTORY_SUMMARY_TOKENS = int(os.environ.get('HISTORY_SUMMARY_TOKENS', 300))
+    HISTORY_SUMMARY_MODEL = os.environ.get('HISTORY_SUMMARY_MODEL', DEFAULT_AGENT_MODEL)
+    
+    # Shared cache of replies to first turns (no history) in agents_sdk.py
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', '1') == '1'
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1000))
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 60 * 60 * 6))  # seconds
+    
+    # Offline insight extraction (see insights.py, `flask --app main extract-insights`)
+    INSIGHT_MODEL = os.environ.get('INSIGHT_MODEL', DEFAULT_AGENT_MODEL)
+    INSIGHT_BATCH_CONVERSATIONS = int(os.environ.get('INSIGHT_BATCH_CONVERSATIONS', 8))  # conversations per LLM call
+    INSIGHT_SCAN_LIMIT = int(os.environ.get('INSIGHT_SCAN_LIMIT', 2000))  # new messages read per run
+    INSIGHT_MESSAGE_CHARS = int(os.environ.get('INSIGHT_MESSAGE_CHARS', 600))  # each message is clipped to this
+    
+    # Bulk export/import (see transfer.py, `flask --app main export-data` / `import-data`)
+    TRANSFER_BATCH_SIZE = int(os.environ.get('TRANSFER_BATCH_SIZE', 1000))  # rows per fetch and per insert
+    
+    # Conversation archive (see archive.py, `flask --app main archive-conversations`)
+    ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', 180))  # idle time before a conversation is archived
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', 100))  # conversations per commit
+    ARCHIVE_ZSTD_LEVEL = int(os.environ.get('ARCHIVE_ZSTD_LEVEL', 10))
+    ARCHIVE_STATS_TTL = int(os.environ.get('ARCHIVE_STATS_TTL', 600))  # seconds the archive totals on /metrics are reused
+    
+    # Full-text search (see search.py)
+    SEARCH_MAX_TERMS = int(os.environ.get('SEARCH_MAX_TERMS', 16))  # words of a query that are used
+    SEARCH_MAX_RESULTS = int(os.environ.get('SEARCH_MAX_RESULTS', 500))  # deepest result reachable by paging
+    SEARCH_SNIPPET_WORDS = int(os.environ.get('SEARCH_SNIPPET_WORDS', 12))
+    # Most recent matches ranked per query, bounding the cost of very common words
+    SEARCH_RANK_WINDOW = int(os.environ.get('SEARCH_RANK_WINDOW', 2000))
+    
+    # Long-term memory (see memory.py, `flask --app main index-memory`): messages and insights are embedded
+    # into a per-user vector index on local disk and the closest ones are recalled into each turn's prompt.
+    # The index is built by index-memory at deploy (or kept on a persistent volume); turns only extend it
+    MEMORY_ENABLED = os.environ.get('MEMORY_ENABLED', '1') == '1'
+    MEMORY_INDEX_DIR = os.environ.get(
+        'MEMORY_INDEX_DIR',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'memory')
+    )
+    MEMORY_EMBEDDING_MODEL = os.environ.get('MEMORY_EMBEDDING_MODEL', 'text-embedding-3-small')
+    MEMORY_DIMENSIONS = int(os.environ.get('MEMORY_DIMENSIONS', 256))  # changing model or dimensions needs a new index
+    MEMORY_TOP_K = int(os.environ.get('MEMORY_TOP_K', 5))  # memories recalled per turn
+    MEMORY_MIN_SCORE = float(os.environ.get('MEMORY_MIN_SCORE', 0.3))  # cosine similarity a memory needs to be recalled
+    MEMORY_MIN_CHARS = int(os.environ.get('MEMORY_MIN_CHARS', 40))  # shorter messages ("thanks!") are not embedded
+    MEMORY_EMBED_CHARS = int(os.environ.get('MEMORY_EMBED_CHARS', 2000))  # each text is clipped to this for embedding
+    MEMORY_SNIPPET_CHARS = int(os.environ.get('MEMORY_SNIPPET_CHARS', 400))  # each memory is clipped to this in the prompt
+    MEMORY_BATCH_SIZE = int(os.environ.get('MEMORY_BATCH_SIZE', 256))  # texts per embeddings request
+    
+    # Local routing (see agent_router.py); the LLM router is used when confidence is below the threshold
+    LOCAL_ROUTER_ENABLED = os.environ.get('LOCAL_ROUTER_ENABLED', '1') == '1'
+    LOCAL_ROUTER_MIN_CONFIDENCE = float(os.environ.get('LOCAL_ROUTER_MIN_CONFIDENCE', 0.6))
+    ROUTING_LOG_PATH = os.environ.get(
+        'ROUTING_LOG_PATH',
+        os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance', 'routing_decisions.jsonl')
+    )
+    ROUTING_LOG_MAX_BYTES = int(os.environ.get('ROUTING_LOG_MAX_BYTES', 5 * 1024 * 1024))  # then rotated to <path>.1
+    ROUTER_RETRAIN_INTERVAL = int(os.environ.get('ROUTER_RETRAIN_INTERVAL', 3600))  # seconds between retrains on new decisions
     SYSTEM_PROMPT = """You are an AI assistant for solopreneurs, designed to help them unify their personal identity with their professional growth.
 
 Your purpose is guided by this insight: "I want to build a business that expresses my whole self, but the world fragments me into disconnected roles and expectations, therefore I need an AI system that helps me unify who I am with how I show up, create, and grow."
@@ -0,0 +1,195 @@
+"""
+Token-budgeted conversation history for the agent modules.
+
+Both agent_service.py (chat-completion message lists) and agents_sdk.py
+(Runner input lists) pass their history through history_manager.window()
+before calling the model. The most recent turns are kept verbatim within a
+token budget; older turns are folded into a rolling summary that is extended
+incrementally, so the prompt stays bounded however long a conversation runs.
+"""
+
+import functools
+import json
+import logging
+from typing import Any, Callable, Hashable, List, Optional
+
+from cache import TTLCache
+from config import Config
+from openai_client import get_client
+from telemetry import trace_stage
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# Starts the memories recalled for a turn (see memory.py), which are replaced rather than carried into the next turn
+MEMORY_PREFIX = "Notes from the solopreneur's earlier conversations (use them only where relevant):\n"
+
+SUMMARY_PROMPT = """
+You maintain a running summary of a coaching conversation between a solopreneur and an AI agency.
+Update the current summary with the new conversation turns. Keep the facts that matter for future advice:
+the person's business, goals, values, tensions they described, decisions made and suggestions given.
+Write plain prose in the third person, at most 150 words.
+"""
+
+
+@functools.lru_cache(maxsize=None)
+def _load_encoder():
+    """
+    Use tiktoken for exact counts when it is installed and its encoding is available.
+
+    Loaded on the first count rather than at import, since it may fetch the encoding.
+    """
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens locally, estimating ~4 characters per token without tiktoken."""
+    if not text:
+        return 0
+    encoder = _load_encoder()
+    if encoder is not None:
+        return len(encoder.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def item_text(item: Any) -> str:
+    """Extract the text of a chat message or Runner input item."""
+    if isinstance(item, str):
+        return item
+    if not isinstance(item, dict):
+        return str(getattr(item, 'content', item))
+
+    content = item.get('content')
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return " ".join(part.get('text', '') for part in content if isinstance(part, dict))
+    # Tool calls, handoffs and other non-message items
+    return json.dumps(item, default=str)
+
+
+def item_role(item: Any) -> Optional[str]:
+    if isinstance(item, dict):
+        return item.get('role')
+    return 'user' if getattr(item, 'is_user', True) else 'assistant'
+
+
+def is_summary(item: Any) -> bool:
+    return item_role(item) == 'system' and item_text(item).startswith(SUMMARY_PREFIX)
+
+
+def is_memory(item: Any) -> bool:
+    return item_role(item) == 'system' and item_text(item).startswith(MEMORY_PREFIX)
+
+
+def summarize(previous_summary: str, items: List[Any]) -> str:
+    """Fold a batch of conversation items into the running summary with one model call."""
+    transcript = "\n".join(f"{item_role(item) or 'event'}: {item_text(item)}" for item in items)
+    with trace_stage("history_summary", model=Config.HISTORY_SUMMARY_MODEL) as span:
+        response = get_client().chat.completions.create(
+            model=Config.HISTORY_SUMMARY_MODEL,
+            messages=[
+                {"role": "system", "content": SUMMARY_PROMPT},
+                {"role": "user", "content": f"Current summary:\n{previous_summary or '(none yet)'}\n\nNew conversation turns:\n{transcript}"}
+            ],
+            temperature=0.2,
+            max_tokens=Config.HISTORY_SUMMARY_TOKENS
+        )
+        span.record_usage(response.usage)
+    return response.choices[0].message.content.strip()
+
+
+class HistoryManager:
+    """
+    Keeps a conversation history within a token budget.
+
+    Items are only cut where a user message starts, so tool calls and handoffs
+    are never separated from their outputs. Summaries for histories that are
+    re-read in full each turn (e.g. from the database) are cached by key; a
+    history that already begins with a summary item carries its own.
+    """
+
+    def __init__(self, token_budget: int, summary_tokens: int, summarizer: Callable[[str, List[Any]], str] = summarize):
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summarizer = summarizer
+        self.summaries = TTLCache(max_entries=Config.HISTORY_STORE_MAX_ENTRIES, ttl=Config.HISTORY_STORE_TTL)
+
+    @property
+    def recent_budget(self) -> int:
+        return max(self.token_budget - self.summary_tokens, 0)
+
+    def split_point(self, items: List[Any], start: int, budget: int) -> int:
+        """Index of the oldest turn that still fits the verbatim budget."""
+        split = len(items)
+        used = 0
+        for index in range(len(items) - 1, start - 1, -1):
+            used += count_tokens(item_text(items[index]))
+            if used > budget:
+                break
+            if item_role(items[index]) == 'user':
+                split = index
+        return split
+
+    def fold(self, summary: str, items: List[Any]) -> str:
+        """Summarize items in chunks that each fit the budget, extending summary."""
+        chunk, chunk_tokens = [], 0
+        for item in items:
+            tokens = count_tokens(item_text(item))
+            if chunk and chunk_tokens + tokens > self.token_budget:
+                summary = self.summarizer(summary, chunk)
+                chunk, chunk_tokens = [], 0
+            chunk.append(item)
+            chunk_tokens += tokens
+        if chunk:
+            summary = self.summarizer(summary, chunk)
+        return summary
+
+    def window(self, items: Optional[List[Any]], key: Optional[Hashable] = None) -> Optional[List[Any]]:
+        """
+        Return the history to send to the model: a summary item (when older turns
+        were folded) followed by the most recent turns verbatim.
+
+        Args:
+            items: The full history, or one previously returned by window()
+            key: Stable id for histories re-read in full every turn, used to cache the summary
+        """
+        if not items:
+            return items
+
+        summary, start = "", 0
+        if is_summary(items[0]):
+            summary, start = item_text(items[0])[len(SUMMARY_PREFIX):], 1
+        elif key is not None:
+            cached = self.summaries.get(key)
+            if cached and cached[0] <= len(items):
+                start, summary = cached
+
+        split = start
+        if self.split_point(items, start, self.recent_budget) > start:
+            # Fold down to half the budget so the next few turns fit without another summary call
+            split = self.split_point(items, start, self.recent_budget // 2)
+        if split > start:
+            try:
+                summary = self.fold(summary, items[start:split])
+                if key is not None:
+                    self.summaries.set(key, (split, summary))
+            except Exception as e:
+                # Without a fresh summary the older turns are dropped rather than sent verbatim
+                logger.error(f"Error summarizing conversation history: {e}")
+
+        window = list(items[split:])
+        if summary:
+            window.insert(0, {"role": "system", "content": SUMMARY_PREFIX + summary})
+        return window
+
+
+history_manager = HistoryManager(
+    token_budget=Config.HISTORY_TOKEN_BUDGET,
+    summary_tokens=Config.HISTORY_SUMMARY_TOKENS
+)
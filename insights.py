@@ -0,0 +1,185 @@
+"""
+Offline insight extraction for the AI Agency for Solopreneurs.
+
+Reads the messages written since the last run, groups them by conversation and
+asks the model for durable insights about each solopreneur, several
+conversations per call. New insights are stored as UserInsight rows after
+dropping ones the user already has. A high-water mark on Message.id lets a run
+resume where the previous one stopped, so the job can run from cron with
+`flask --app main extract-insights`.
+"""
+
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+from app import db
+from cache import normalize_text
+from config import Config
+from models import Conversation, JobCheckpoint, Message, UserInsight
+from openai_client import get_client
+from telemetry import trace_stage
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_NAME = "insight_extraction"
+
+# Known insights shown to the model per user, so it doesn't restate them
+KNOWN_INSIGHTS_SHOWN = 10
+
+INSIGHT_PROMPT = """
+You read coaching conversations between a solopreneur and an AI agency and record durable insights about the solopreneur:
+their values, strengths, goals, tensions between personal identity and business, and decisions they reached.
+Skip small talk, generic advice and anything already listed under "Known insights".
+Write each insight as one sentence in the second person ("You ..."), under 200 characters.
+Return a JSON object: {"conversations": [{"id": <conversation id>, "insights": ["...", ...]}]}
+with at most 3 insights per conversation and an empty list when there is nothing new.
+"""
+
+
+def get_checkpoint() -> JobCheckpoint:
+    checkpoint = db.session.get(JobCheckpoint, CHECKPOINT_NAME)
+    if checkpoint is None:
+        checkpoint = JobCheckpoint(name=CHECKPOINT_NAME, last_message_id=0)
+        db.session.add(checkpoint)
+    return checkpoint
+
+
+def load_new_messages(after_id: int, limit: int) -> "OrderedDict[int, Dict[str, Any]]":
+    """Messages with id > after_id, grouped by conversation in order of first appearance."""
+    rows = db.session.query(Message.id, Message.conversation_id, Message.is_user, Message.content, Conversation.user_id) \
+        .join(Conversation, Conversation.id == Message.conversation_id) \
+        .filter(Message.id > after_id) \
+        .order_by(Message.id) \
+        .limit(limit) \
+        .all()
+
+    conversations: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+    for message_id, conversation_id, is_user, content, user_id in rows:
+        conversation = conversations.setdefault(conversation_id, {"user_id": user_id, "message_ids": [], "lines": []})
+        conversation["message_ids"].append(message_id)
+        text = content if len(content) <= Config.INSIGHT_MESSAGE_CHARS else content[:Config.INSIGHT_MESSAGE_CHARS] + "..."
+        conversation["lines"].append(f"{'Solopreneur' if is_user else 'Agency'}: {text}")
+    return conversations
+
+
+def known_insights(user_ids) -> Dict[int, List[str]]:
+    """Each user's existing insights, newest first."""
+    known: Dict[int, List[str]] = {user_id: [] for user_id in user_ids}
+    rows = db.session.query(UserInsight.user_id, UserInsight.content) \
+        .filter(UserInsight.user_id.in_(list(user_ids))) \
+        .order_by(UserInsight.created_at.desc()) \
+        .all()
+    for user_id, content in rows:
+        known[user_id].append(content)
+    return known
+
+
+def extraction_request(batch: Dict[int, Dict[str, Any]], known: Dict[int, List[str]]) -> Dict[str, Any]:
+    """Build the chat completion arguments for one batch of conversations"""
+    sections = []
+    for conversation_id, conversation in batch.items():
+        shown = known[conversation["user_id"]][:KNOWN_INSIGHTS_SHOWN]
+        known_text = "\n".join(f"- {insight}" for insight in shown) or "(none)"
+        sections.append(
+            f"## Conversation {conversation_id}\nKnown insights:\n{known_text}\n\nNew messages:\n" + "\n".join(conversation["lines"])
+        )
+
+    return {
+        "model": Config.INSIGHT_MODEL,
+        "messages": [
+            {"role": "system", "content": INSIGHT_PROMPT},
+            {"role": "user", "content": "\n\n".join(sections)}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.2,
+    }
+
+
+def parse_extraction(content: str) -> Dict[int, List[str]]:
+    """Map conversation id to the insight strings in a model reply."""
+    extracted: Dict[int, List[str]] = {}
+    for entry in json.loads(content).get("conversations", []):
+        try:
+            conversation_id = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        extracted[conversation_id] = [
+            insight.strip() for insight in entry.get("insights", [])
+            if isinstance(insight, str) and insight.strip()
+        ][:3]
+    return extracted
+
+
+def call_model(request: Dict[str, Any]) -> str:
+    with trace_stage("insights", model=request["model"]) as span:
+        response = get_client().chat.completions.create(**request)
+        span.record_usage(response.usage)
+    return response.choices[0].message.content
+
+
+def extract_insights(limit: Optional[int] = None, dry_run: bool = False,
+                     complete: Callable[[Dict[str, Any]], str] = call_model) -> Dict[str, int]:
+    """
+    Extract insights from the messages written since the last run.
+
+    Each batch is committed together with the high-water mark, so an interrupted
+    run resumes at the first conversation it had not finished.
+
+    Args:
+        limit: Maximum number of new messages to read (default INSIGHT_SCAN_LIMIT)
+        dry_run: Log the insights instead of storing them and leave the mark unchanged
+        complete: Sends a chat completion request and returns the reply text
+
+    Returns:
+        Counts of messages read, model calls made and insights stored
+    """
+    checkpoint = get_checkpoint()
+    conversations = load_new_messages(checkpoint.last_message_id, limit or Config.INSIGHT_SCAN_LIMIT)
+    summary = {"messages": sum(len(c["message_ids"]) for c in conversations.values()), "calls": 0, "insights": 0}
+    if not conversations:
+        return summary
+
+    scan_end = max(max(c["message_ids"]) for c in conversations.values())
+    known = known_insights({c["user_id"] for c in conversations.values()})
+    seen = {user_id: {normalize_text(insight) for insight in insights} for user_id, insights in known.items()}
+
+    conversation_ids = list(conversations)
+    size = max(1, Config.INSIGHT_BATCH_CONVERSATIONS)
+    for start in range(0, len(conversation_ids), size):
+        batch = OrderedDict((cid, conversations[cid]) for cid in conversation_ids[start:start + size])
+        summary["calls"] += 1
+        try:
+            extracted = parse_extraction(complete(extraction_request(batch, known)))
+        except Exception as e:
+            # Stop here; the mark stays before this batch so the next run retries it
+            logger.error(f"Error extracting insights: {e}")
+            db.session.rollback()
+            break
+
+        for conversation_id, insights in extracted.items():
+            conversation = batch.get(conversation_id)
+            if conversation is None:
+                continue  # the model made up an id
+            user_id = conversation["user_id"]
+            for insight in insights:
+                key = normalize_text(insight)
+                if not key or key in seen[user_id]:
+                    continue
+                seen[user_id].add(key)
+                known[user_id].insert(0, insight)
+                summary["insights"] += 1
+                if dry_run:
+                    logger.info(f"Insight for user {user_id} from conversation {conversation_id}: {insight}")
+                else:
+                    db.session.add(UserInsight(user_id=user_id, content=insight, source_conversation_id=conversation_id))
+
+        if not dry_run:
+            # Messages are read in id order but batched by conversation, so later batches
+            # may hold lower ids; the mark only passes what every finished batch covers
+            remaining = [min(conversations[cid]["message_ids"]) for cid in conversation_ids[start + size:]]
+            checkpoint.last_message_id = min(remaining) - 1 if remaining else scan_end
+            db.session.commit()
+
+    return summary
@@ -1,5 +1,10 @@
 from app import app  # noqa: F401
 import routes  # noqa: F401
+import commands  # noqa: F401
 
 if __name__ == "__main__":
+    from migrations import create_schema
+
+    with app.app_context():
+        create_schema()
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,333 @@
+"""
+Long-term memory for the AI Agency for Solopreneurs.
+
+The agents see a conversation's recent turns and a rolling summary of older
+ones (history.py), but nothing from the user's other conversations. This
+module embeds every message and insight in the background and, on each turn,
+recalls the few most similar to the new message into the prompt, which gives
+the agents relevant older material for a few hundred tokens instead of
+replaying whole histories.
+
+Vectors live on local disk, one flat index per user under
+Config.MEMORY_INDEX_DIR: a float32 matrix and a parallel list of document ids,
+both append-only and memory-mapped for search. A query is one matrix-vector
+product over the user's rows: exact, about 1 ms at 10k messages and 12 ms at
+100k (benchmarks/memory_recall.py). Document ids use the encoding of
+search.py (2 * message id, or 2 * insight id + 1) and are resolved against the
+database at recall time, so deleted messages and archived conversations (see
+archive.py) drop out of the results, and rehydrated ones come back without
+re-embedding.
+
+index_new() embeds the rows written since its last run, resuming from
+high-water marks kept next to the vectors; a file lock keeps one writer at a
+time across worker processes. The index is built by
+`flask --app main index-memory`, which the deploy's build step runs after
+upgrade-db, so every instance starts from a built index. Runs scheduled on the
+background queue after each turn only continue an existing index: on an
+instance without one (a MEMORY_INDEX_DIR that is neither built at deploy nor on
+a persistent volume) they log an error instead of re-embedding every user's
+history, and recall returns nothing until index-memory has run.
+"""
+
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app import db
+from config import Config
+from history import MEMORY_PREFIX, item_text
+from models import Conversation, Message, UserInsight
+from openai_client import get_client
+from tasks import background_tasks
+from telemetry import trace_stage
+
+logger = logging.getLogger(__name__)
+
+STATE_FILE = "state.json"
+LOCK_FILE = ".lock"
+
+
+class VectorIndex:
+    """
+    One user's flat vector index: <user_id>.vectors holds float32 rows of
+    `dimensions` values and <user_id>.ids the int64 document id of each row.
+
+    Vectors are written before their ids, so after an interrupted append the
+    index is as long as the shorter file and the extra vectors are ignored.
+    """
+
+    def __init__(self, directory: str, user_id: int, dimensions: int):
+        self.dimensions = dimensions
+        self.vectors_path = os.path.join(directory, f"{user_id}.vectors")
+        self.ids_path = os.path.join(directory, f"{user_id}.ids")
+
+    def __len__(self) -> int:
+        try:
+            return min(os.path.getsize(self.ids_path) // 8, os.path.getsize(self.vectors_path) // (4 * self.dimensions))
+        except FileNotFoundError:
+            return 0
+
+    def append(self, doc_ids: List[int], vectors: np.ndarray) -> None:
+        rows = len(self)
+        # Cut off what an interrupted append may have left, then add vectors before ids
+        for path, size, data in (
+            (self.vectors_path, rows * 4 * self.dimensions, np.ascontiguousarray(vectors, dtype="<f4")),
+            (self.ids_path, rows * 8, np.asarray(doc_ids, dtype="<i8")),
+        ):
+            with open(path, "ab") as out:
+                out.truncate(size)
+                out.write(data.tobytes())
+                out.flush()
+                os.fsync(out.fileno())
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """The k rows most similar to query (cosine, rows and query normalized), best first."""
+        rows = len(self)
+        if rows == 0 or k <= 0:
+            return []
+        vectors = np.memmap(self.vectors_path, dtype="<f4", mode="r", shape=(rows, self.dimensions))
+        doc_ids = np.memmap(self.ids_path, dtype="<i8", mode="r", shape=(rows,))
+        scores = vectors @ query.astype("<f4")
+        k = min(k, rows)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(doc_ids[row]), float(scores[row])) for row in top]
+
+
+def user_index(user_id: int) -> VectorIndex:
+    return VectorIndex(Config.MEMORY_INDEX_DIR, user_id, Config.MEMORY_DIMENSIONS)
+
+
+def embed(texts: List[str]) -> np.ndarray:
+    """Embed texts with one API call; returns normalized float32 rows."""
+    with trace_stage("embed", model=Config.MEMORY_EMBEDDING_MODEL) as span:
+        response = get_client().embeddings.create(
+            model=Config.MEMORY_EMBEDDING_MODEL,
+            input=[text[:Config.MEMORY_EMBED_CHARS] for text in texts],
+            dimensions=Config.MEMORY_DIMENSIONS,
+        )
+        span.record_usage(response.usage)
+    vectors = np.array([item.embedding for item in sorted(response.data, key=lambda item: item.index)], dtype="<f4")
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+def _read_state() -> Optional[Dict[str, Any]]:
+    """The index's high-water marks, or None if no index has been built in Config.MEMORY_INDEX_DIR."""
+    try:
+        with open(os.path.join(Config.MEMORY_INDEX_DIR, STATE_FILE)) as state_file:
+            return json.load(state_file)
+    except FileNotFoundError:
+        return None
+
+
+def _write_state(state: Dict[str, Any]) -> None:
+    path = os.path.join(Config.MEMORY_INDEX_DIR, STATE_FILE)
+    with open(path + ".tmp", "w") as state_file:
+        json.dump(state, state_file)
+    os.replace(path + ".tmp", path)
+
+
+@contextmanager
+def _writer_lock(wait: bool):
+    """Hold the index's file lock; yields False (without waiting) if another writer has it and not wait."""
+    os.makedirs(Config.MEMORY_INDEX_DIR, exist_ok=True)
+    with open(os.path.join(Config.MEMORY_INDEX_DIR, LOCK_FILE), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _new_documents(kind: str, after_id: int, limit: int) -> List[Tuple[int, int, int, str]]:
+    """(row id, document id, user id, text) of the messages or insights with id > after_id."""
+    if kind == "message":
+        rows = db.session.query(Message.id, Conversation.user_id, Message.content) \
+            .join(Conversation, Conversation.id == Message.conversation_id)
+        model, offset = Message, 0
+    else:
+        rows = db.session.query(UserInsight.id, UserInsight.user_id, UserInsight.content)
+        model, offset = UserInsight, 1
+    rows = rows.filter(model.id > after_id).order_by(model.id).limit(limit).all()
+    return [(row_id, row_id * 2 + offset, user_id, content) for row_id, user_id, content in rows]
+
+
+def index_new(limit: Optional[int] = None, wait: bool = True, backfill: bool = True) -> Dict[str, int]:
+    """
+    Embed the messages and insights written since the last run.
+
+    Each batch is appended to its users' indexes before the high-water marks
+    move past it, so an interrupted run embeds at most one batch again
+    (recall drops the duplicates).
+
+    Args:
+        limit: Maximum number of rows to read (default: everything new)
+        wait: Wait for another process's run to finish instead of returning at once
+        backfill: Build a new index from the first row when none exists; when
+            False (the per-turn runs) a missing index is logged and left alone
+
+    Returns:
+        Counts of rows read and documents embedded (messages shorter than
+        Config.MEMORY_MIN_CHARS are skipped)
+    """
+    summary = {"rows": 0, "embedded": 0}
+    with _writer_lock(wait) as locked:
+        if not locked:
+            return summary
+        state = _read_state()
+        if state is None:
+            if not backfill:
+                _report_missing_index()
+                return summary
+            state = {"model": Config.MEMORY_EMBEDDING_MODEL, "dimensions": Config.MEMORY_DIMENSIONS,
+                     "message": 0, "insight": 0}
+            _write_state(state)  # an empty database still gets an index for the per-turn runs to extend
+        if (state["model"], state["dimensions"]) != (Config.MEMORY_EMBEDDING_MODEL, Config.MEMORY_DIMENSIONS):
+            raise RuntimeError(f"The memory index in {Config.MEMORY_INDEX_DIR} was built with {state['model']} "
+                               f"at {state['dimensions']} dimensions; remove it to rebuild")
+
+        for kind in ("message", "insight"):
+            while limit is None or summary["rows"] < limit:
+                batch = Config.MEMORY_BATCH_SIZE if limit is None else min(Config.MEMORY_BATCH_SIZE, limit - summary["rows"])
+                rows = _new_documents(kind, state[kind], batch)
+                if not rows:
+                    break
+                documents = [row for row in rows if len(row[3].strip()) >= Config.MEMORY_MIN_CHARS]
+                if documents:
+                    vectors = embed([text for _, _, _, text in documents])
+                    by_user: Dict[int, List[int]] = {}
+                    for position, (_, _, user_id, _) in enumerate(documents):
+                        by_user.setdefault(user_id, []).append(position)
+                    for user_id, positions in by_user.items():
+                        user_index(user_id).append([documents[p][1] for p in positions], vectors[positions])
+                state[kind] = rows[-1][0]
+                _write_state(state)
+                summary["rows"] += len(rows)
+                summary["embedded"] += len(documents)
+
+    if summary["rows"]:
+        logger.info(f"Memory index: read {summary['rows']} row(s), embedded {summary['embedded']}")
+    return summary
+
+
+# Set while an index_new() run is waiting on the background queue
+_scheduled = threading.Event()
+
+_missing_reported = False
+
+
+def _report_missing_index() -> None:
+    """Log, once per process, that the per-turn runs found no index to continue."""
+    global _missing_reported
+    if not _missing_reported:
+        _missing_reported = True
+        logger.error(f"No memory index in {Config.MEMORY_INDEX_DIR}: recall is off until "
+                     f"`flask --app main index-memory` builds it (run it at deploy or keep the directory "
+                     f"on a persistent volume)")
+
+
+def _run_scheduled() -> None:
+    _scheduled.clear()
+    index_new(wait=False, backfill=False)
+
+
+def schedule_indexing() -> None:
+    """Queue an index_new() run after a turn is stored, unless one is already waiting."""
+    if Config.MEMORY_ENABLED and not _scheduled.is_set():
+        _scheduled.set()
+        background_tasks.submit(_run_scheduled)
+
+
+def recall(user_id: int, query: str, exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+    """
+    The user's messages and insights most similar to query.
+
+    Args:
+        user_id: Whose memory to search
+        query: Usually the new user message
+        exclude: Texts already in the prompt (e.g. the recent history), not recalled again
+
+    Returns:
+        Up to Config.MEMORY_TOP_K dicts (kind, id, score, is_user, created_at,
+        content) scoring at least Config.MEMORY_MIN_SCORE, best first
+    """
+    index = user_index(user_id)
+    if not len(index):
+        return []  # nothing indexed yet: no embedding call
+    # Oversample: some hits may be deleted, archived, excluded or duplicated
+    hits = [hit for hit in index.search(embed([query])[0], Config.MEMORY_TOP_K * 4) if hit[1] >= Config.MEMORY_MIN_SCORE]
+    if not hits:
+        return []
+
+    message_ids = [doc_id // 2 for doc_id, _ in hits if doc_id % 2 == 0]
+    insight_ids = [doc_id // 2 for doc_id, _ in hits if doc_id % 2 == 1]
+    rows = {}
+    if message_ids:
+        for row in db.session.query(Message.id, Message.is_user, Message.content, Message.created_at) \
+                .join(Conversation, Conversation.id == Message.conversation_id) \
+                .filter(Message.id.in_(message_ids), Conversation.user_id == user_id):
+            rows[row.id * 2] = {"kind": "message", "id": row.id, "is_user": row.is_user,
+                                "content": row.content, "created_at": row.created_at}
+    if insight_ids:
+        for row in db.session.query(UserInsight.id, UserInsight.content, UserInsight.created_at) \
+                .filter(UserInsight.id.in_(insight_ids), UserInsight.user_id == user_id):
+            rows[row.id * 2 + 1] = {"kind": "insight", "id": row.id, "is_user": None,
+                                    "content": row.content, "created_at": row.created_at}
+
+    excluded = set(exclude)
+    memories, seen = [], set()
+    for doc_id, score in hits:
+        row = rows.get(doc_id)
+        if row is None or doc_id in seen or row["content"] in excluded:
+            continue
+        seen.add(doc_id)
+        memories.append({**row, "score": round(score, 3)})
+        if len(memories) == Config.MEMORY_TOP_K:
+            break
+    return memories
+
+
+def render(memories: List[Dict[str, Any]]) -> str:
+    """Recalled memories as a prompt section starting with MEMORY_PREFIX ("" for none)."""
+    if not memories:
+        return ""
+    lines = []
+    for memory in memories:
+        source = "Insight" if memory["kind"] == "insight" else ("They said" if memory["is_user"] else "The agency said")
+        content = " ".join(memory["content"].split())
+        if len(content) > Config.MEMORY_SNIPPET_CHARS:
+            content = content[:Config.MEMORY_SNIPPET_CHARS].rsplit(" ", 1)[0] + "…"
+        date = f"{memory['created_at']:%Y-%m-%d}, " if memory["created_at"] else ""
+        lines.append(f"- ({date}{source}) {content}")
+    return MEMORY_PREFIX + "\n".join(lines)
+
+
+def memory_context(user_id: Optional[int], query: str, history: Optional[List[Any]] = None) -> str:
+    """
+    The prompt section of the user's memories relevant to query, or "".
+
+    Never raises: a turn goes ahead without memories if recall fails.
+
+    Args:
+        user_id: The signed-in user (None for anonymous chats, which have no memory)
+        query: The new user message
+        history: The history sent with the turn; its messages are not recalled again
+    """
+    if not Config.MEMORY_ENABLED or user_id is None or not query:
+        return ""
+    try:
+        return render(recall(user_id, query, [item_text(item) for item in history or []]))
+    except Exception as e:
+        logger.error(f"Error recalling memories: {e}")
+        return ""
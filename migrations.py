@@ -0,0 +1,97 @@
+"""
+Schema upgrades for databases created before a model change.
+
+upgrade() creates the tables added since the database was made, then the
+columns and indexes added to existing tables (which creating tables never
+touches), then the full-text search index (search.py). Every step checks the
+live schema first, which makes upgrade() safe to run repeatedly as well as on
+a brand-new database.
+
+Nothing here runs when the app is imported: deploys run
+`flask --app main upgrade-db` (create_schema()) before starting workers, and
+`python main.py` does it for the development server.
+"""
+
+import logging
+from typing import List, Optional
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+
+import search
+from app import db
+
+logger = logging.getLogger(__name__)
+
+
+def missing_tables(connection) -> list:
+    """Tables declared on the models but absent from the database, in dependency order."""
+    inspector = inspect(connection)
+    return [table for table in db.metadata.sorted_tables if not inspector.has_table(table.name)]
+
+
+def missing_indexes(connection) -> list:
+    """Indexes declared on the models but absent from existing tables."""
+    inspector = inspect(connection)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue  # created with its indexes by upgrade()
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def missing_columns(connection) -> list:
+    """Columns declared on the models but absent from existing tables."""
+    inspector = inspect(connection)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        missing.extend(column for column in table.columns if column.name not in existing)
+    return missing
+
+
+def add_column(connection, column) -> None:
+    """ALTER TABLE ... ADD COLUMN for a nullable column without a server default."""
+    preparer = connection.dialect.identifier_preparer
+    column_type = column.type.compile(dialect=connection.dialect)
+    connection.execute(text(
+        f"ALTER TABLE {preparer.format_table(column.table)} ADD COLUMN {preparer.format_column(column)} {column_type}"
+    ))
+
+
+def upgrade(engine: Optional[Engine] = None) -> List[str]:
+    """
+    Bring a SQLite or Postgres database, new or existing, up to the current models.
+
+    On large Postgres tables CREATE INDEX blocks writes while it runs, so run
+    `flask --app main upgrade-db` off-peak before deploying.
+
+    Returns:
+        Descriptions of the changes applied (empty when already up to date)
+    """
+    engine = engine or db.engine
+    applied = []
+    with engine.begin() as connection:
+        for table in missing_tables(connection):
+            logger.info(f"Creating table {table.name}")
+            table.create(connection)
+            applied.append(f"table {table.name}")
+        for column in missing_columns(connection):
+            logger.info(f"Adding column {column.name} to {column.table.name}")
+            add_column(connection, column)
+            applied.append(f"column {column.name} on {column.table.name}")
+        for index in missing_indexes(connection):
+            logger.info(f"Creating index {index.name} on {index.table.name}")
+            index.create(connection)
+            applied.append(f"index {index.name} on {index.table.name}")
+        applied.extend(search.install(connection))
+    return applied
+
+
+def create_schema() -> List[str]:
+    """upgrade() the app's database; needs an application context."""
+    return upgrade()
@@ -34,29 +34,58 @@ class User(UserMixin, db.Model):
         return f'<User {self.username}>'
 
 class Conversation(db.Model):
+    # Conversation lists: a user's conversations, most recently updated first
+    __table_args__ = (
+        db.Index('ix_conversation_user_updated', 'user_id', db.desc('updated_at'), db.desc('id')),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(200), default="New Conversation")
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    archived_at = db.Column(db.DateTime)  # Set while the messages are in ConversationArchive (see archive.py)
     
     # Relationships
     messages = db.relationship('Message', backref='conversation', lazy=True, cascade="all, delete-orphan")
+    archive = db.relationship('ConversationArchive', uselist=False, lazy=True, cascade="all, delete-orphan")
     
     def __repr__(self):
         return f'<Conversation {self.id}>'
 
 class Message(db.Model):
+    # Message pages and agent history: one conversation's messages in order
+    __table_args__ = (
+        db.Index('ix_message_conversation_created', 'conversation_id', 'created_at', 'id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
     is_user = db.Column(db.Boolean, default=True)  # True if from user, False if from AI
+    agent = db.Column(db.String(64))  # Name of the agent that answered (AI messages from the agent runs)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
         return f'<Message {self.id}>'
 
+class ConversationArchive(db.Model):
+    """The messages of an archived conversation as one zstd-compressed JSON blob"""
+    conversation_id = db.Column(db.Integer, db.ForeignKey('conversation.id'), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+    message_count = db.Column(db.Integer, nullable=False)
+    raw_bytes = db.Column(db.Integer, nullable=False)  # Size of the messages' JSON before compression
+    stored_bytes = db.Column(db.Integer, nullable=False)  # Size of data
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ConversationArchive {self.conversation_id}>'
+
 class UserGoal(db.Model):
+    __table_args__ = (
+        db.Index('ix_user_goal_user', 'user_id'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     title = db.Column(db.String(200), nullable=False)
@@ -70,6 +99,11 @@ class UserGoal(db.Model):
         return f'<UserGoal {self.title}>'
 
 class UserInsight(db.Model):
+    # Dashboard and insights page: a user's latest insights first
+    __table_args__ = (
+        db.Index('ix_user_insight_user_created', 'user_id', 'created_at'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     content = db.Column(db.Text, nullable=False)
@@ -81,3 +115,25 @@ class UserInsight(db.Model):
     
     def __repr__(self):
         return f'<UserInsight {self.id}>'
+
+class JobCheckpoint(db.Model):
+    """High-water mark of an offline job over messages, so the next run resumes after it"""
+    name = db.Column(db.String(64), primary_key=True)
+    last_message_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<JobCheckpoint {self.name}: {self.last_message_id}>'
+
+class LoginNonce(db.Model):
+    """One-time MetaMask login nonce (see wallet_auth.py), deleted when redeemed"""
+    __table_args__ = (
+        db.Index('ix_login_nonce_expires', 'expires_at'),
+    )
+    
+    nonce = db.Column(db.String(32), primary_key=True)
+    address = db.Column(db.String(42), nullable=False)  # Lowercased address the nonce was issued for
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<LoginNonce {self.address}>'
@@ -0,0 +1,368 @@
+"""
+Shared OpenAI clients for the AI Agency for Solopreneurs.
+
+Every module gets its clients here instead of constructing its own, so all
+calls share one tuned, keep-alive connection pool per event loop. The HTTP
+transport retries 429/5xx responses and connection failures with jittered
+exponential backoff (honouring Retry-After), and a process-wide limiter caps
+concurrent requests so bursts wait for a free slot instead of failing.
+
+With OPENAI_STUB=1 the clients are served by an in-process stub instead, which
+answers chat completions and responses with canned text and token usage, and
+embeddings with hashed bag-of-words vectors (texts sharing words come out
+similar), for tests and for exercising the pipeline's instrumentation without
+an API key.
+"""
+
+import array
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import weakref
+from typing import TYPE_CHECKING, Optional
+
+import httpx
+
+from config import Config
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+RETRY_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.RemoteProtocolError)
+
+# Shared by the sync and async transports so the cap holds across threads and event loops
+limiter = threading.BoundedSemaphore(Config.OPENAI_MAX_CONCURRENCY)
+# Set on each event loop whose requests may be waiting for a limiter slot, when one is released
+_slot_released: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Event]" = weakref.WeakKeyDictionary()
+_slot_released_lock = threading.Lock()
+
+
+def release_slot() -> None:
+    """Release a limiter slot and wake the event loops waiting in acquire_slot()."""
+    limiter.release()
+    with _slot_released_lock:
+        waiting = list(_slot_released.items())
+    for loop, released in waiting:
+        try:
+            loop.call_soon_threadsafe(released.set)
+        except RuntimeError:
+            pass  # the loop is closed, so nothing on it is waiting
+
+
+async def acquire_slot() -> None:
+    """Wait for a limiter slot without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    with _slot_released_lock:
+        released = _slot_released.get(loop)
+        if released is None:
+            released = _slot_released[loop] = asyncio.Event()
+    while not limiter.acquire(blocking=False):
+        # release_slot() queues set() with call_soon_threadsafe(), so a slot freed since the
+        # acquire() above is still signalled after this clear()
+        released.clear()
+        await released.wait()
+
+
+def backoff_delay(attempt: int, retry_after: Optional[str] = None) -> float:
+    """Seconds to wait before retry number attempt + 1 ("full jitter" exponential backoff)."""
+    if retry_after:
+        try:
+            return min(float(retry_after), Config.OPENAI_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(Config.OPENAI_BACKOFF_MAX, Config.OPENAI_BACKOFF_BASE * 2 ** attempt))
+
+
+def should_retry(response: httpx.Response, attempt: int) -> bool:
+    return response.status_code in RETRY_STATUSES and attempt < Config.OPENAI_MAX_RETRIES
+
+
+class _SlotReleaser:
+    """Releases a limiter slot exactly once."""
+
+    def __init__(self):
+        self.released = False
+
+    def __call__(self):
+        if not self.released:
+            self.released = True
+            release_slot()
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Keeps the limiter slot until the (possibly streamed) response body is closed."""
+
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    def __iter__(self):
+        yield from self.stream
+
+    def close(self):
+        try:
+            self.stream.close()
+        finally:
+            self.release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self.stream = stream
+        self.release = release
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            self.release()
+
+
+class RetryingTransport(httpx.HTTPTransport):
+    """Pooled HTTP transport with concurrency limiting and retry/backoff."""
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        limiter.acquire()
+        release = _SlotReleaser()
+        try:
+            for attempt in range(Config.OPENAI_MAX_RETRIES + 1):
+                try:
+                    response = super().handle_request(request)
+                except RETRY_ERRORS:
+                    if attempt == Config.OPENAI_MAX_RETRIES:
+                        raise
+                    time.sleep(backoff_delay(attempt))
+                    continue
+
+                if not should_retry(response, attempt):
+                    return httpx.Response(
+                        status_code=response.status_code,
+                        headers=response.headers,
+                        stream=_ReleasingStream(response.stream, release),
+                        extensions=response.extensions,
+                    )
+                response.close()
+                time.sleep(backoff_delay(attempt, response.headers.get("retry-after")))
+        except BaseException:
+            release()
+            raise
+
+
+class AsyncRetryingTransport(httpx.AsyncHTTPTransport):
+    """Async counterpart of RetryingTransport."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await acquire_slot()
+        release = _SlotReleaser()
+        try:
+            for attempt in range(Config.OPENAI_MAX_RETRIES + 1):
+                try:
+                    response = await super().handle_async_request(request)
+                except RETRY_ERRORS:
+                    if attempt == Config.OPENAI_MAX_RETRIES:
+                        raise
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+
+                if not should_retry(response, attempt):
+                    return httpx.Response(
+                        status_code=response.status_code,
+                        headers=response.headers,
+                        stream=_AsyncReleasingStream(response.stream, release),
+                        extensions=response.extensions,
+                    )
+                await response.aclose()
+                await asyncio.sleep(backoff_delay(attempt, response.headers.get("retry-after")))
+        except BaseException:
+            release()
+            raise
+
+
+STUB_SELECTION = {"reasoning": "Stub routing.", "selected_agents": ["strategy"], "conversations": []}
+STUB_REPLY = "Strategy: This is a stub reply from the test OpenAI backend."
+
+
+def _stub_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+def _stub_response_events(response: dict) -> bytes:
+    """Server-sent events streaming a completed stub Response, one event per word."""
+    message = response["output"][0]
+    words = STUB_REPLY.split(" ")
+    events = [
+        {"type": "response.created", "response": {**response, "status": "in_progress", "output": [], "usage": None}},
+        {"type": "response.output_item.added", "output_index": 0,
+         "item": {**message, "status": "in_progress", "content": []}},
+    ]
+    events += [
+        {"type": "response.output_text.delta", "item_id": message["id"], "output_index": 0, "content_index": 0,
+         "delta": word if i == 0 else " " + word, "logprobs": []}
+        for i, word in enumerate(words)
+    ]
+    events += [
+        {"type": "response.output_item.done", "output_index": 0, "item": message},
+        {"type": "response.completed", "response": response},
+    ]
+    return "".join(
+        f"data: {json.dumps({**event, 'sequence_number': number})}\n\n" for number, event in enumerate(events)
+    ).encode()
+
+
+def _stub_embedding(text: str, dimensions: int) -> list:
+    """Normalized hashed bag-of-words vector of text."""
+    vector = [0.0] * dimensions
+    for word in re.findall(r"\w+", text.lower()):
+        digest = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+        vector[digest % dimensions] += 1.0 if digest >> 63 else -1.0
+    norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+    return [value / norm for value in vector]
+
+
+def _stub_embeddings(body: dict) -> dict:
+    texts = body.get("input", [])
+    texts = [texts] if isinstance(texts, str) else texts
+    data = []
+    for index, text in enumerate(texts):
+        embedding = _stub_embedding(text, body.get("dimensions") or 1536)
+        if body.get("encoding_format") == "base64":
+            embedding = base64.b64encode(array.array("f", embedding).tobytes()).decode()
+        data.append({"object": "embedding", "index": index, "embedding": embedding})
+    tokens = sum(_stub_tokens(text) for text in texts)
+    return {"object": "list", "data": data, "model": body.get("model"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+
+def stub_handler(request: httpx.Request) -> httpx.Response:
+    """Answer /chat/completions, /responses (which can be streamed) and /embeddings calls locally."""
+    body = json.loads(request.content or b"{}")
+    model = body.get("model", Config.DEFAULT_AGENT_MODEL)
+    prompt_tokens = _stub_tokens(json.dumps(body.get("messages", body.get("input", ""))))
+
+    if request.url.path.endswith("/embeddings"):
+        return httpx.Response(200, json=_stub_embeddings(body))
+
+    if request.url.path.endswith("/chat/completions"):
+        wants_json = (body.get("response_format") or {}).get("type") == "json_object"
+        content = json.dumps(STUB_SELECTION) if wants_json else STUB_REPLY
+        return httpx.Response(200, json={
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": _stub_tokens(content),
+                "total_tokens": prompt_tokens + _stub_tokens(content),
+                "prompt_tokens_details": {"cached_tokens": 0},
+            },
+        })
+
+    if request.url.path.endswith("/responses"):
+        response = {
+            "id": "resp-stub",
+            "object": "response",
+            "created_at": int(time.time()),
+            "model": model,
+            "status": "completed",
+            "output": [{
+                "type": "message",
+                "id": "msg-stub",
+                "status": "completed",
+                "role": "assistant",
+                "content": [{"type": "output_text", "text": STUB_REPLY, "annotations": []}],
+            }],
+            "parallel_tool_calls": False,
+            "tool_choice": "auto",
+            "tools": [],
+            "usage": {
+                "input_tokens": prompt_tokens,
+                "output_tokens": _stub_tokens(STUB_REPLY),
+                "total_tokens": prompt_tokens + _stub_tokens(STUB_REPLY),
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens_details": {"reasoning_tokens": 0},
+            },
+        }
+        if body.get("stream"):
+            return httpx.Response(200, headers={"Content-Type": "text/event-stream"},
+                                  content=_stub_response_events(response))
+        return httpx.Response(200, json=response)
+
+    return httpx.Response(404, json={"error": {"message": f"No stub for {request.url.path}"}})
+
+
+def stub_transport() -> httpx.MockTransport:
+    return httpx.MockTransport(stub_handler)
+
+
+def pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=Config.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Config.OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def request_timeout() -> httpx.Timeout:
+    return httpx.Timeout(Config.OPENAI_TIMEOUT, connect=Config.OPENAI_CONNECT_TIMEOUT)
+
+
+# The openai package is imported on the first call; it is a large part of a worker's start-up time
+_client: Optional["OpenAI"] = None
+_client_lock = threading.Lock()
+
+# Async connections belong to the event loop that opened them, so each loop gets its own client
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncOpenAI]" = weakref.WeakKeyDictionary()
+
+
+def get_client() -> "OpenAI":
+    """Return the process-wide sync OpenAI client."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            from openai import OpenAI, DefaultHttpxClient
+            _client = OpenAI(
+                api_key=Config.OPENAI_API_KEY or ("sk-stub" if Config.OPENAI_STUB else ""),
+                timeout=request_timeout(),
+                max_retries=0,  # retries are handled by the transport
+                http_client=DefaultHttpxClient(
+                    transport=stub_transport() if Config.OPENAI_STUB else RetryingTransport(limits=pool_limits()),
+                    timeout=request_timeout(),
+                ),
+            )
+        return _client
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """Return the async OpenAI client for the running event loop."""
+    loop = asyncio.get_running_loop()
+    async_client = _async_clients.get(loop)
+    if async_client is None:
+        from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+        async_client = AsyncOpenAI(
+            api_key=Config.OPENAI_API_KEY or ("sk-stub" if Config.OPENAI_STUB else ""),
+            timeout=request_timeout(),
+            max_retries=0,  # retries are handled by the transport
+            http_client=DefaultAsyncHttpxClient(
+                transport=stub_transport() if Config.OPENAI_STUB else AsyncRetryingTransport(limits=pool_limits()),
+                timeout=request_timeout(),
+            ),
+        )
+        _async_clients[loop] = async_client
+    return async_client
@@ -0,0 +1,72 @@
+"""
+Keyset (cursor) pagination for the conversation and message lists.
+
+Pages are walked newest first along a (timestamp, id) key instead of with
+OFFSET, so each page costs the same however deep the client scrolls and rows
+inserted meanwhile don't shift later pages. The cursor handed to clients is
+an opaque token encoding the key of the last row they received.
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from config import Config
+
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor from encode_cursor(); raises ValueError if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, row_id = json.loads(raw)
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+def page_limit(value: Optional[str]) -> int:
+    """Parse a limit query parameter, falling back to the default and capping at the maximum."""
+    try:
+        limit = int(value) if value else Config.PAGE_SIZE_DEFAULT
+    except ValueError:
+        limit = Config.PAGE_SIZE_DEFAULT
+    return max(1, min(limit, Config.PAGE_SIZE_MAX))
+
+
+def keyset_page(query, timestamp_column, id_column, cursor: Optional[str], limit: int) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of query, newest first.
+
+    Args:
+        query: A filtered SQLAlchemy query without ordering
+        timestamp_column: Column ordering the rows (e.g. Message.created_at)
+        id_column: Primary key column breaking ties between equal timestamps
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Maximum number of rows to return
+
+    Returns:
+        The rows of the page and the cursor of the next page (None on the last page)
+    """
+    if cursor:
+        timestamp, row_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            timestamp_column < timestamp,
+            and_(timestamp_column == timestamp, id_column < row_id)
+        ))
+
+    # One extra row tells whether another page follows
+    rows = query.order_by(timestamp_column.desc(), id_column.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(getattr(last, timestamp_column.key), getattr(last, id_column.key))
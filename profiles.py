@@ -0,0 +1,67 @@
+"""
+Cached user profiles for the AI Agency for Solopreneurs.
+
+Flask-Login loads the user on every authenticated request, and every chat
+turn sends the user's profile to the agents. Both are served from a per-user
+snapshot holding the profile fields, the user_info dict and the context block
+rendered once by agent_service.create_context(). A snapshot is dropped when
+the profile is saved; the TTL bounds how long other workers, which keep their
+own copies, can serve an outdated one.
+"""
+
+from typing import Any, Dict, Optional
+
+from flask_login import UserMixin
+
+from agent_service import create_context
+from app import db
+from cache import TTLCache
+from config import Config
+from models import User
+
+# Columns copied into a snapshot; templates and routes read these from current_user
+PROFILE_FIELDS = (
+    'id', 'username', 'email', 'ethereum_address', 'auth_type', 'created_at',
+    'first_name', 'last_name', 'bio', 'business_name', 'business_description',
+)
+
+# Profile fields sent to the agents
+USER_INFO_FIELDS = ('username', 'first_name', 'last_name', 'bio', 'business_name', 'business_description')
+
+
+class UserSnapshot(UserMixin):
+    """
+    Read-only copy of a User row, used as current_user.
+
+    It is not attached to the database session: to change the user, load the
+    User row, commit, then call invalidate().
+    """
+
+    def __init__(self, user: User):
+        for field in PROFILE_FIELDS:
+            setattr(self, field, getattr(user, field))
+        self.user_info: Dict[str, Any] = {field: getattr(user, field) for field in USER_INFO_FIELDS}
+        self.context: str = create_context(self.user_info)
+
+    def __repr__(self):
+        return f'<UserSnapshot {self.username}>'
+
+
+profile_cache = TTLCache(max_entries=Config.PROFILE_CACHE_MAX_ENTRIES, ttl=Config.PROFILE_CACHE_TTL)
+
+
+def get_profile(user_id: int) -> Optional[UserSnapshot]:
+    """The user's snapshot, loading it from the database on a cache miss."""
+    snapshot = profile_cache.get(user_id)
+    if snapshot is None:
+        user = db.session.get(User, user_id)
+        if user is None:
+            return None
+        snapshot = UserSnapshot(user)
+        profile_cache.set(user_id, snapshot)
+    return snapshot
+
+
+def invalidate(user_id: int) -> None:
+    """Drop the user's snapshot after their row changed."""
+    profile_cache.pop(user_id)
@@ -1,15 +1,32 @@
 import logging
-from flask import render_template, redirect, url_for, request, flash, jsonify, session
+from flask import render_template, redirect, url_for, request, flash, jsonify, session, Response, stream_with_context, abort, make_response
 from flask_login import login_user, logout_user, login_required, current_user
 import os
+import uuid
+from datetime import datetime
 from app import app, db
 from models import User, Conversation, Message, UserGoal, UserInsight
 # Import the new agent SDK for handoff capabilities
-from agents_sdk import get_agent_response, get_greeting
+from agents_sdk import get_agent_response, get_greeting, stream_agent_response, response_cache
+# Multi-agent routing service used for the authenticated conversation chat
+import agent_service
+from werkzeug.exceptions import HTTPException
+from sqlalchemy.exc import IntegrityError
+from cache import TTLCache
+from config import Config
+from pagination import keyset_page, page_limit
+from tasks import background_tasks
+import wallet_auth
+from profiles import get_profile, invalidate as invalidate_profile, profile_cache
+from telemetry import render_metrics
+from history import history_manager
+from transfer import export_lines, gzip_chunks
+from archive import cached_archive_stats, rehydrate
+import search
+from memory import memory_context, schedule_indexing
 from werkzeug.security import generate_password_hash
+import hmac
 import json
-from web3 import Web3
-from eth_account.messages import encode_defunct
 
 @app.route('/')
 def index():
@@ -46,54 +63,69 @@ def metamask_login_page():
         return redirect(url_for('dashboard'))
     return render_template('metamask_login.html')
 
+@app.route('/metamask/nonce', methods=['GET'])
+def metamask_nonce():
+    """Issue a one-time nonce and the message the wallet must sign with it"""
+    address = request.args.get('address', '')
+    if not wallet_auth.is_address(address):
+        return jsonify({'error': 'Invalid address'}), 400
+    
+    nonce = wallet_auth.issue_nonce(address)
+    return jsonify({'nonce': nonce, 'message': wallet_auth.login_message(nonce)})
+
 @app.route('/metamask/login', methods=['POST'])
 def metamask_login():
     try:
         data = request.json
-        if not data or 'address' not in data or 'signature' not in data or 'message' not in data:
+        if not data or 'address' not in data or 'signature' not in data or 'nonce' not in data:
             return jsonify({'error': 'Missing required parameters'}), 400
         
         address = data['address']
         signature = data['signature']
-        message = data['message']
+        nonce = data['nonce']
+        if not wallet_auth.is_address(address):
+            return jsonify({'error': 'Invalid address'}), 400
         
-        # Verify the signature
-        w3 = Web3()
-        message_encoded = encode_defunct(text=message)
-        recovered_address = w3.eth.account.recover_message(message_encoded, signature=signature)
+        # The nonce is single use, so a captured signature can't be replayed
+        if not wallet_auth.consume_nonce(nonce, address):
+            return jsonify({'error': 'Login request expired, please try again'}), 401
         
-        if recovered_address.lower() != address.lower():
+        # Verify the signature over the message built for this nonce
+        if not wallet_auth.verifier.verify(wallet_auth.login_message(nonce), signature, address):
             return jsonify({'error': 'Invalid signature'}), 401
         
         # Check if user exists
-        user = User.query.filter_by(ethereum_address=address.lower()).first()
+        user = wallet_auth.find_wallet_user(address)
         
         if user:
             # User exists, log them in
             login_user(user, remember=True)
             return jsonify({'success': True}), 200
-        else:
-            # Create new user
-            username = f"user_{address.lower()[:8]}"
-            base_username = username
-            counter = 1
-            
-            # Make sure username is unique
-            while User.query.filter_by(username=username).first():
-                username = f"{base_username}_{counter}"
-                counter += 1
-            
+        
+        # Create new user with the first free username, retrying if a concurrent sign-up takes it
+        base_username = f"user_{address.lower()[:8]}"
+        for attempt in range(3):
             new_user = User(
-                username=username,
+                username=wallet_auth.allocate_username(base_username),
                 ethereum_address=address.lower(),
                 auth_type='metamask'
             )
-            
             db.session.add(new_user)
-            db.session.commit()
-            
-            login_user(new_user, remember=True)
-            return jsonify({'success': True, 'new_user': True}), 200
+            try:
+                db.session.commit()
+                break
+            except IntegrityError:
+                db.session.rollback()
+                # The same wallet may have just signed up in another request
+                user = wallet_auth.find_wallet_user(address)
+                if user:
+                    login_user(user, remember=True)
+                    return jsonify({'success': True}), 200
+        else:
+            return jsonify({'error': 'Authentication failed'}), 500
+        
+        login_user(new_user, remember=True)
+        return jsonify({'success': True, 'new_user': True}), 200
             
     except Exception as e:
         logging.error(f"Error during MetaMask login: {e}")
@@ -124,26 +156,59 @@ def dashboard():
 @login_required
 def chat():
     conversation_id = request.args.get('id')
+    messages, messages_cursor = [], None
     if conversation_id:
         conversation = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).first_or_404()
-        messages = Message.query.filter_by(conversation_id=conversation.id).order_by(Message.created_at).all()
+        rehydrate(conversation)  # no-op unless archived
+        # Only the latest page is rendered; chat.js loads older messages as the user scrolls up
+        messages, messages_cursor = _message_page(conversation, None, page_limit(None))
     else:
         conversation = None
-        messages = []
     
-    all_conversations = Conversation.query.filter_by(user_id=current_user.id).order_by(Conversation.updated_at.desc()).all()
-    return render_template('chat.html', conversation=conversation, messages=messages, all_conversations=all_conversations)
+    all_conversations, conversations_cursor = _conversation_page(None, page_limit(None))
+    return render_template('chat.html', conversation=conversation, messages=messages, messages_cursor=messages_cursor,
+                           all_conversations=all_conversations, conversations_cursor=conversations_cursor)
 
-@app.route('/api/conversations', methods=['GET'])
-@login_required
-def get_conversations():
-    conversations = Conversation.query.filter_by(user_id=current_user.id).order_by(Conversation.updated_at.desc()).all()
-    return jsonify([{
+def _conversation_json(conv):
+    return {
         'id': conv.id,
         'title': conv.title,
         'created_at': conv.created_at.isoformat(),
         'updated_at': conv.updated_at.isoformat()
-    } for conv in conversations])
+    }
+
+def _message_json(msg):
+    return {
+        'id': msg.id,
+        'content': msg.content,
+        'is_user': msg.is_user,
+        'agent': msg.agent,
+        'created_at': msg.created_at.isoformat()
+    }
+
+def _conversation_page(cursor, limit):
+    """The current user's conversations, most recently updated first"""
+    query = Conversation.query.filter_by(user_id=current_user.id)
+    return keyset_page(query, Conversation.updated_at, Conversation.id, cursor, limit)
+
+def _message_page(conversation, cursor, limit):
+    """A page of messages ending before cursor, in chronological order"""
+    query = Message.query.filter_by(conversation_id=conversation.id)
+    messages, next_cursor = keyset_page(query, Message.created_at, Message.id, cursor, limit)
+    return messages[::-1], next_cursor
+
+@app.route('/api/conversations', methods=['GET'])
+@login_required
+def get_conversations():
+    try:
+        conversations, next_cursor = _conversation_page(request.args.get('cursor'), page_limit(request.args.get('limit')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'conversations': [_conversation_json(conv) for conv in conversations],
+        'next_cursor': next_cursor
+    })
 
 @app.route('/api/conversations', methods=['POST'])
 @login_required
@@ -153,12 +218,7 @@ def create_conversation():
     db.session.add(conversation)
     db.session.commit()
     
-    return jsonify({
-        'id': conversation.id,
-        'title': conversation.title,
-        'created_at': conversation.created_at.isoformat(),
-        'updated_at': conversation.updated_at.isoformat()
-    }), 201
+    return jsonify(_conversation_json(conversation)), 201
 
 @app.route('/api/conversations/<int:conversation_id>', methods=['DELETE'])
 @login_required
@@ -171,34 +231,62 @@ def delete_conversation(conversation_id):
 @app.route('/api/conversations/<int:conversation_id>/messages', methods=['GET'])
 @login_required
 def get_messages(conversation_id):
+    """
+    Page backwards through a conversation: the latest messages first, then older
+    ones by passing the returned next_cursor as ?cursor=. Each page is in
+    chronological order.
+    """
     conversation = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).first_or_404()
-    messages = Message.query.filter_by(conversation_id=conversation.id).order_by(Message.created_at).all()
-    return jsonify([{
-        'id': msg.id,
-        'content': msg.content,
-        'is_user': msg.is_user,
-        'created_at': msg.created_at.isoformat()
-    } for msg in messages])
+    rehydrate(conversation)  # no-op unless archived
+    try:
+        messages, next_cursor = _message_page(conversation, request.args.get('cursor'), page_limit(request.args.get('limit')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'messages': [_message_json(msg) for msg in messages],
+        'next_cursor': next_cursor
+    })
 
-@app.route('/api/conversations/<int:conversation_id>/messages', methods=['POST'])
-@login_required
-def send_message(conversation_id):
+# Chat history per conversation, extended as each turn is written so a turn doesn't
+# re-read the whole conversation. Entries are stamped with the conversation's
+# updated_at and ignored once anything else (e.g. another worker) has written to it.
+conversation_histories = TTLCache(max_entries=Config.HISTORY_STORE_MAX_ENTRIES, ttl=Config.HISTORY_STORE_TTL)
+
+def _conversation_history(conversation):
+    """The conversation's messages as chat history, from the cache when it is current"""
+    cached = conversation_histories.get(conversation.id)
+    if cached and cached[0] == conversation.updated_at:
+        return list(cached[1])
+    
+    rows = db.session.query(Message.is_user, Message.content).filter_by(conversation_id=conversation.id) \
+        .order_by(Message.created_at, Message.id).all()
+    return [{'role': 'user' if is_user else 'assistant', 'content': content} for is_user, content in rows]
+
+def _begin_send_message(conversation_id, data):
+    """Store the user's message and gather what the agents need to answer it"""
     conversation = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).first_or_404()
-    data = request.json
     
     if not data or 'content' not in data:
-        return jsonify({'error': 'Message content is required'}), 400
+        abort(make_response(jsonify({'error': 'Message content is required'}), 400))
     
-    # Save user message
-    user_message = Message(
+    rehydrate(conversation)  # no-op unless archived
+    
+    # History before this message; the agents receive the new message separately
+    message_history = _conversation_history(conversation)
+    user_id = current_user.id
+    # Profile and its rendered agent context, cached per user (see profiles.py)
+    profile = get_profile(user_id)
+    
+    # Save user message, with the conversation's timestamp and title, in one commit
+    now = datetime.utcnow()
+    db.session.add(Message(
         conversation_id=conversation.id,
         content=data['content'],
-        is_user=True
-    )
-    db.session.add(user_message)
-    
-    # Update conversation timestamp
-    conversation.updated_at = user_message.created_at
+        is_user=True,
+        created_at=now
+    ))
+    conversation.updated_at = now
     
     # Update conversation title if it's the first message
     if conversation.title == "New Conversation" and len(data['content']) > 0:
@@ -206,76 +294,156 @@ def send_message(conversation_id):
         title_preview = data['content'][:30] + ('...' if len(data['content']) > 30 else '')
         conversation.title = title_preview
     
+    conversation_id = conversation.id
+    db.session.commit()
+    
+    user_turn = {'role': 'user', 'content': data['content']}
+    conversation_histories.set(conversation_id, (now, message_history + [user_turn]))
+    
+    return {
+        'conversation_id': conversation_id,
+        'user_id': user_id,
+        'user_message': data['content'],
+        'message_history': message_history,
+        'user_info': profile.user_info,
+        'context': profile.context,
+        # Older material from any of the user's conversations, recalled for this message (see memory.py)
+        'memories': memory_context(user_id, data['content'], message_history)
+    }
+
+def _finish_send_message(turn, result):
+    """Store the AI reply, from agent_service.get_agent_response(), in one commit and build the JSON response"""
+    now = datetime.utcnow()
+    ai_response = result['reply']
+    ai_message = Message(
+        conversation_id=turn['conversation_id'],
+        content=ai_response,
+        is_user=False,
+        agent=result['agent'],
+        created_at=now
+    )
+    db.session.add(ai_message)
+    Conversation.query.filter_by(id=turn['conversation_id']).update({'updated_at': now})
+    
+    # Serialize before committing, which would expire the message and cost a re-select
+    db.session.flush()
+    response = _message_json(ai_message)
     db.session.commit()
     
+    conversation_histories.set(turn['conversation_id'], (now, turn['message_history'] + [
+        {'role': 'user', 'content': turn['user_message']},
+        {'role': 'assistant', 'content': ai_response}
+    ]))
+    schedule_indexing()
+    return jsonify(response)
+
+def _send_message_failed(error):
+    logging.error(f"Error getting AI response: {error}")
+    return jsonify({'error': 'Failed to get AI response. Please try again.'}), 500
+
+@app.route('/api/conversations/<int:conversation_id>/messages', methods=['POST'])
+@login_required
+def send_message(conversation_id):
+    turn = _begin_send_message(conversation_id, request.json)
+    
     # Get AI response
     try:
-        # Get user profile information for context
-        user_info = {
-            'username': current_user.username,
-            'first_name': current_user.first_name,
-            'last_name': current_user.last_name,
-            'bio': current_user.bio,
-            'business_name': current_user.business_name,
-            'business_description': current_user.business_description
-        }
-        
-        # Get previous messages for context
-        previous_messages = Message.query.filter_by(conversation_id=conversation.id).order_by(Message.created_at).all()
-        message_history = [{'role': 'user' if msg.is_user else 'assistant', 'content': msg.content} for msg in previous_messages]
-        
-        # Get AI response
-        ai_response = get_agent_response(data['content'], message_history, user_info)
-        
-        # Save AI response
-        ai_message = Message(
-            conversation_id=conversation.id,
-            content=ai_response,
-            is_user=False
+        result = agent_service.get_agent_response(
+            turn['user_message'], turn['message_history'], turn['user_info'], f"conversation:{turn['conversation_id']}",
+            turn['context'], turn['memories']
         )
-        db.session.add(ai_message)
-        db.session.commit()
-        
-        # Extract insights if appropriate
-        if len(ai_response) > 100 and any(keyword in ai_response.lower() for keyword in ['insight', 'discover', 'realize', 'clarity']):
-            # Create a new insight
-            insight = UserInsight(
-                user_id=current_user.id,
-                content=ai_response[:200] + ("..." if len(ai_response) > 200 else ""),
-                source_conversation_id=conversation.id
-            )
-            db.session.add(insight)
-            db.session.commit()
-        
-        return jsonify({
-            'id': ai_message.id,
-            'content': ai_message.content,
-            'is_user': ai_message.is_user,
-            'created_at': ai_message.created_at.isoformat()
-        })
+        return _finish_send_message(turn, result)
     
     except Exception as e:
-        logging.error(f"Error getting AI response: {e}")
-        return jsonify({'error': 'Failed to get AI response. Please try again.'}), 500
+        return _send_message_failed(e)
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_history():
+    """
+    Search the current user's messages and insights, best match first. Pass
+    the returned next_cursor as ?cursor= for the next page.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Search query (q) is required'}), 400
+    try:
+        results, next_cursor = search.search(current_user.id, query, request.args.get('cursor'),
+                                             page_limit(request.args.get('limit')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except NotImplementedError as e:
+        # The database has no full-text index (only SQLite and Postgres get one)
+        return jsonify({'error': str(e)}), 501
+    
+    return jsonify({
+        'results': results,
+        'next_cursor': next_cursor
+    })
+
+@app.route('/api/export', methods=['GET'])
+@login_required
+def export_my_data():
+    """Download the current user's conversations, messages, insights and goals as gzipped JSON lines"""
+    filename = f"solopreneur-export-{datetime.utcnow():%Y%m%d}.jsonl.gz"
+    return Response(
+        stream_with_context(gzip_chunks(export_lines(current_user.id))),
+        mimetype='application/gzip',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+def _require_metrics_token():
+    """404 unless METRICS_TOKEN is set, 401 unless the request carries it as a bearer token"""
+    if not Config.METRICS_TOKEN:
+        abort(404)
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ')
+    if not hmac.compare_digest(supplied.encode(), Config.METRICS_TOKEN.encode()):
+        abort(401)
+
+@app.route('/api/metrics/tasks', methods=['GET'])
+def task_metrics():
+    """Depth, throughput and latency of the background task queue"""
+    _require_metrics_token()
+    return jsonify(background_tasks.stats())
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Per-stage latency and token metrics plus queue and cache gauges, in Prometheus text format"""
+    _require_metrics_token()
+    body = render_metrics({
+        "background_queue": ("Background task queue stats.", background_tasks.stats()),
+        "conversation_history_cache": ("Conversation history cache stats.", conversation_histories.stats()),
+        "history_summary_cache": ("Rolling history summary cache stats.", history_manager.summaries.stats()),
+        "response_cache": ("First-turn reply cache stats.", response_cache.stats()),
+        "profile_cache": ("User profile snapshot cache stats.", profile_cache.stats()),
+        "message_archive": ("Archived conversations and the bytes their compression reclaimed.", cached_archive_stats()),
+    })
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     if request.method == 'POST':
-        # Update user profile information
-        current_user.first_name = request.form.get('first_name', '')
-        current_user.last_name = request.form.get('last_name', '')
-        current_user.bio = request.form.get('bio', '')
-        current_user.business_name = request.form.get('business_name', '')
-        current_user.business_description = request.form.get('business_description', '')
+        # Update user profile information (current_user is a cached snapshot, so load the row)
+        user = db.session.get(User, current_user.id)
+        user.first_name = request.form.get('first_name', '')
+        user.last_name = request.form.get('last_name', '')
+        user.bio = request.form.get('bio', '')
+        user.business_name = request.form.get('business_name', '')
+        user.business_description = request.form.get('business_description', '')
         
         try:
             db.session.commit()
+            # The next request loads a fresh snapshot
+            invalidate_profile(user.id)
             flash('Profile updated successfully', 'success')
         except Exception as e:
             db.session.rollback()
             logging.error(f"Error updating profile: {e}")
             flash('An error occurred while updating profile', 'danger')
+        
+        # Redirect so the page is rendered from the updated snapshot
+        return redirect(url_for('profile'))
             
     return render_template('profile.html')
 
@@ -315,6 +483,177 @@ def insights():
     insights = UserInsight.query.filter_by(user_id=current_user.id).order_by(UserInsight.created_at.desc()).all()
     return render_template('insights.html', insights=insights)
 
+# Agent run histories for the narrative chat, keyed by a per-browser id kept in the
+# session, so the cookie never carries (or outgrows) the conversation itself.
+agent_histories = TTLCache(max_entries=Config.HISTORY_STORE_MAX_ENTRIES, ttl=Config.HISTORY_STORE_TTL)
+
+def _chat_id():
+    """Return the id of this browser's narrative chat, assigning one if needed"""
+    if 'chat_id' not in session:
+        session['chat_id'] = uuid.uuid4().hex
+    return session['chat_id']
+
+def _public_conversation_id(user_message, now):
+    """Return the current user's narrative chat conversation, touched (or created) for this turn"""
+    conversation_id = session.get('current_conversation_id')
+    if conversation_id:
+        # Checks ownership and bumps the timestamp in one statement
+        touched = Conversation.query.filter_by(id=conversation_id, user_id=current_user.id).update({'updated_at': now})
+        if touched:
+            return conversation_id
+    
+    # Create a new conversation, titled after its first message
+    conversation = Conversation(
+        user_id=current_user.id,
+        title=user_message[:30] + ('...' if len(user_message) > 30 else ''),
+        created_at=now,
+        updated_at=now
+    )
+    db.session.add(conversation)
+    db.session.flush()
+    session['current_conversation_id'] = conversation.id
+    return conversation.id
+
+def _store_public_reply(conversation_id, reply, agent, created_at):
+    """Background task: persist an AI reply to a narrative chat conversation"""
+    db.session.add(Message(
+        conversation_id=conversation_id,
+        content=reply,
+        is_user=False,
+        agent=agent,
+        created_at=created_at
+    ))
+    db.session.commit()
+
+def _save_public_reply(turn, result):
+    """Queue the AI reply for the user's narrative chat conversation, if the turn has one"""
+    if turn['conversation_id']:
+        # Timestamped now, so it sorts before the next message even if written after it
+        background_tasks.submit(_store_public_reply, turn['conversation_id'], result['reply'], result['agent'], datetime.utcnow())
+        schedule_indexing()
+
+def _start_public_chat():
+    """Initialize or reset the chat session and return the greeting"""
+    agent_histories.pop(_chat_id(), None)  # No history for the first turn
+    greeting = get_greeting()
+    
+    return jsonify({
+        'reply': greeting['reply'],
+        'agent': greeting['agent']
+    })
+
+def _begin_public_chat(data):
+    """Validate a narrative chat turn, apply the free-message limit and store the user's message"""
+    if not data:
+        abort(make_response(jsonify({'error': 'No data provided'}), 400))
+        
+    user_message = data.get('user_message')
+    if not user_message:
+        abort(make_response(jsonify({'error': 'Message content is required'}), 400))
+    
+    address = data.get('address')
+    stream = bool(data.get('stream'))
+    
+    # Retrieve conversation history from the server-side store
+    session.pop('conversation_history', None)  # left in the cookie by older versions
+    chat_id = _chat_id()
+    conversation_history = agent_histories.get(chat_id)
+    
+    # Check for free usage count or MetaMask authentication
+    free_message_count = session.get('free_message_count', 0)
+    
+    # If we have an ethereum address, try to find the user for personalization
+    if address and not current_user.is_authenticated:
+        user = User.query.filter_by(ethereum_address=address.lower()).first()
+        if user:
+            # Use authenticated user with MetaMask
+            login_user(user, remember=True)
+            # Reset free message count if user is authenticated
+            free_message_count = 0
+    else:
+        # If no address and not authenticated, increment free message count
+        if not current_user.is_authenticated:
+            free_message_count += 1
+            session['free_message_count'] = free_message_count
+            
+            # If over limit, require MetaMask login
+            if free_message_count > 10:  # Allow 10 free messages
+                abort(make_response(jsonify({
+                    'error': 'Free message limit reached. Please connect with MetaMask to continue.',
+                    'require_metamask': True
+                }), 403))
+    
+    # Store message in database if user is authenticated, in one commit with its conversation
+    conversation_id = None
+    if current_user.is_authenticated:
+        now = datetime.utcnow()
+        conversation_id = _public_conversation_id(user_message, now)
+        db.session.add(Message(
+            conversation_id=conversation_id,
+            content=user_message,
+            is_user=True,
+            created_at=now
+        ))
+        db.session.commit()
+    
+    return {
+        'user_message': user_message,
+        'conversation_id': conversation_id,
+        'conversation_history': conversation_history,
+        # Anonymous chats have no memory
+        'memories': memory_context(current_user.id if current_user.is_authenticated else None, user_message,
+                                   conversation_history),
+        'stream': stream,
+        'chat_id': chat_id,
+        'free_messages_remaining': 10 - free_message_count if not current_user.is_authenticated else None
+    }
+
+def _finish_public_chat(turn, result):
+    """Store the agent history and reply for a completed turn and build the JSON response"""
+    # Store the updated conversation history for next turn
+    agent_histories.set(turn['chat_id'], result.get('conversation_history'))
+    
+    # If user is logged in, save the AI response to the database
+    _save_public_reply(turn, result)
+    
+    return jsonify({
+        'reply': result['reply'],
+        'agent': result['agent'],
+        'handoffs': result.get('handoffs', []),
+        'free_messages_remaining': turn['free_messages_remaining']
+    })
+
+def _finish_streamed_public_chat(turn, event):
+    """Store the agent history and reply carried by a streamed "done" event"""
+    agent_histories.set(turn['chat_id'], event.pop('conversation_history'))
+    _save_public_reply(turn, event)
+    event['free_messages_remaining'] = turn['free_messages_remaining']
+
+def _event_stream(events):
+    """Wrap an iterable of already formatted events in a Server-Sent Events response"""
+    return Response(
+        events,
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _format_event(event):
+    return f"data: {json.dumps(event)}\n\n"
+
+def _stream_public_chat(turn):
+    """Build a Server-Sent Events response that relays agent events as they arrive"""
+    def generate():
+        for event in stream_agent_response(turn['user_message'], turn['conversation_history'], turn['memories']):
+            if event['type'] == 'done':
+                _finish_streamed_public_chat(turn, event)
+            yield _format_event(event)
+    
+    return _event_stream(stream_with_context(generate()))
+
+def _public_chat_failed(error):
+    logging.error(f"Error in narrative chat API: {error}")
+    return jsonify({'error': f'Failed to get AI response. Error: {str(error)}'}), 500
+
 # Enhanced API endpoint for narrative-style chat with agent handoff
 @app.route('/api/chat', methods=['POST'])
 def public_chat():
@@ -324,110 +663,21 @@ def public_chat():
         
         # Check if this is a start conversation request
         if data.get('start'):
-            # Initialize or reset the chat session
-            session['conversation_history'] = None  # Set to None for first turn
-            greeting = get_greeting()
-            
-            return jsonify({
-                'reply': greeting['reply'],
-                'agent': greeting['agent']
-            })
+            return _start_public_chat()
         
         # Otherwise, handle a user message
-        if not data:
-            return jsonify({'error': 'No data provided'}), 400
-            
-        user_message = data.get('user_message')
-        if not user_message:
-            return jsonify({'error': 'Message content is required'}), 400
-        
-        address = data.get('address')
+        turn = _begin_public_chat(data)
         
-        # Retrieve conversation history from session
-        conversation_history = session.get('conversation_history')
-        
-        # Check for free usage count or MetaMask authentication
-        free_message_count = session.get('free_message_count', 0)
-        
-        # If we have an ethereum address, try to find the user for personalization
-        if address and not current_user.is_authenticated:
-            user = User.query.filter_by(ethereum_address=address.lower()).first()
-            if user:
-                # Use authenticated user with MetaMask
-                login_user(user, remember=True)
-                # Reset free message count if user is authenticated
-                free_message_count = 0
-        else:
-            # If no address and not authenticated, increment free message count
-            if not current_user.is_authenticated:
-                free_message_count += 1
-                session['free_message_count'] = free_message_count
-                
-                # If over limit, require MetaMask login
-                if free_message_count > 10:  # Allow 10 free messages
-                    return jsonify({
-                        'error': 'Free message limit reached. Please connect with MetaMask to continue.',
-                        'require_metamask': True
-                    }), 403
-        
-        # Store message in database if user is authenticated
-        if current_user.is_authenticated:
-            # Create or update conversation record for this chat session
-            conversation_id = session.get('current_conversation_id')
-            if not conversation_id:
-                # Create a new conversation
-                conversation = Conversation(user_id=current_user.id)
-                db.session.add(conversation)
-                db.session.commit()
-                session['current_conversation_id'] = conversation.id
-            else:
-                # Use existing conversation
-                conversation = Conversation.query.get(conversation_id)
-                if not conversation or conversation.user_id != current_user.id:
-                    # Create a new conversation if ID is invalid
-                    conversation = Conversation(user_id=current_user.id)
-                    db.session.add(conversation)
-                    db.session.commit()
-                    session['current_conversation_id'] = conversation.id
-            
-            # Add user message to DB
-            user_msg = Message(
-                conversation_id=conversation.id,
-                content=user_message,
-                is_user=True
-            )
-            db.session.add(user_msg)
-            db.session.commit()
+        # Stream handoffs and partial tokens back as Server-Sent Events if requested
+        if turn['stream']:
+            return _stream_public_chat(turn)
         
         # Get response from orchestrated AI agents with handoff capabilities using SDK 0.0.12
-        result = get_agent_response(user_message, conversation_history)
-        
-        # Store the updated conversation history for next turn
-        session['conversation_history'] = result.get('conversation_history')
-        
-        # If user is logged in, save the AI response to the database
-        if current_user.is_authenticated and session.get('current_conversation_id'):
-            conversation_id = session.get('current_conversation_id')
-            ai_message = Message(
-                conversation_id=conversation_id,
-                content=result['reply'],
-                is_user=False
-            )
-            db.session.add(ai_message)
-            db.session.commit()
-            
-            # Update conversation title if it's new
-            conversation = Conversation.query.get(conversation_id)
-            if conversation and conversation.title == "New Conversation":
-                conversation.title = user_message[:30] + ('...' if len(user_message) > 30 else '')
-                db.session.commit()
+        result = get_agent_response(turn['user_message'], turn['conversation_history'], turn['memories'])
         
-        return jsonify({
-            'reply': result['reply'],
-            'agent': result['agent'],
-            'free_messages_remaining': 10 - free_message_count if not current_user.is_authenticated else None
-        })
+        return _finish_public_chat(turn, result)
     
+    except HTTPException:
+        raise
     except Exception as e:
-        logging.error(f"Error in narrative chat API: {e}")
-        return jsonify({'error': f'Failed to get AI response. Error: {str(e)}'}), 500
+        return _public_chat_failed(e)
@@ -0,0 +1,276 @@
+"""
+Full-text search over a user's messages and insights.
+
+The index is kept by the database itself: triggers on message and
+user_insight add a document on every insert and drop it on delete, so it is
+current as soon as a write commits (archived conversations, see archive.py,
+leave the index until they are rehydrated). Each document carries its owner
+as a separate token, and a query always includes the owner's token, so the
+index intersects the user's documents with the search terms instead of
+filtering every user's matches afterwards. Ranking is the expensive part, so
+only the Config.SEARCH_RANK_WINDOW most recent matches are ranked: queries with
+fewer matches are ranked in full, and a word found in most of a long history
+costs a bounded amount.
+
+- SQLite: an FTS5 table search_index(owner, content), ranked with bm25() and
+  excerpted with snippet()
+- Postgres: search_document(doc_id, tsv) with a GIN index, the owner token in
+  weight A, ranked with ts_rank() and excerpted with ts_headline()
+
+Document ids encode the source row: 2 * message.id for a message and
+2 * user_insight.id + 1 for an insight. install() creates the index and fills
+it from existing rows; it runs as part of migrations.upgrade().
+"""
+
+import base64
+import html
+import json
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app import db
+from config import Config
+from models import Conversation, Message, UserInsight
+
+logger = logging.getLogger(__name__)
+
+# Highlight markers passed to snippet()/ts_headline(); replaced by <mark> after escaping
+START, STOP = "\x02", "\x03"
+
+TERM = re.compile(r"\w+", re.UNICODE)
+
+SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+    "owner, content, tokenize = 'porter unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS search_message_insert AFTER INSERT ON message BEGIN "
+    "INSERT INTO search_index (rowid, owner, content) "
+    "SELECT new.id * 2, 'u' || conversation.user_id, new.content FROM conversation WHERE conversation.id = new.conversation_id; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS search_message_delete AFTER DELETE ON message BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2; "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS search_insight_insert AFTER INSERT ON user_insight BEGIN "
+    "INSERT INTO search_index (rowid, owner, content) VALUES (new.id * 2 + 1, 'u' || new.user_id, new.content); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS search_insight_delete AFTER DELETE ON user_insight BEGIN "
+    "DELETE FROM search_index WHERE rowid = old.id * 2 + 1; "
+    "END",
+]
+
+SQLITE_BACKFILL = [
+    "INSERT INTO search_index (rowid, owner, content) "
+    "SELECT message.id * 2, 'u' || conversation.user_id, message.content "
+    "FROM message JOIN conversation ON conversation.id = message.conversation_id",
+    "INSERT INTO search_index (rowid, owner, content) SELECT id * 2 + 1, 'u' || user_id, content FROM user_insight",
+]
+
+# The owner token is weight A, words are D; queries match the owner with :A
+POSTGRES_DOCUMENT = "setweight(to_tsvector('simple', 'u' || {owner}), 'A') || to_tsvector('english', {content})"
+
+POSTGRES_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS search_document (doc_id bigint PRIMARY KEY, tsv tsvector NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS ix_search_document_tsv ON search_document USING gin (tsv)",
+    "CREATE OR REPLACE FUNCTION search_message_insert() RETURNS trigger AS $$ BEGIN "
+    "INSERT INTO search_document (doc_id, tsv) SELECT NEW.id * 2, "
+    + POSTGRES_DOCUMENT.format(owner="conversation.user_id", content="NEW.content")
+    + " FROM conversation WHERE conversation.id = NEW.conversation_id; RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION search_message_delete() RETURNS trigger AS $$ BEGIN "
+    "DELETE FROM search_document WHERE doc_id = OLD.id * 2; RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION search_insight_insert() RETURNS trigger AS $$ BEGIN "
+    "INSERT INTO search_document (doc_id, tsv) VALUES (NEW.id * 2 + 1, "
+    + POSTGRES_DOCUMENT.format(owner="NEW.user_id", content="NEW.content")
+    + "); RETURN NULL; END $$ LANGUAGE plpgsql",
+    "CREATE OR REPLACE FUNCTION search_insight_delete() RETURNS trigger AS $$ BEGIN "
+    "DELETE FROM search_document WHERE doc_id = OLD.id * 2 + 1; RETURN NULL; END $$ LANGUAGE plpgsql",
+]
+
+POSTGRES_TRIGGERS = [
+    ("search_message_insert", "AFTER INSERT ON message"),
+    ("search_message_delete", "AFTER DELETE ON message"),
+    ("search_insight_insert", "AFTER INSERT ON user_insight"),
+    ("search_insight_delete", "AFTER DELETE ON user_insight"),
+]
+
+POSTGRES_BACKFILL = [
+    "INSERT INTO search_document (doc_id, tsv) SELECT message.id * 2, "
+    + POSTGRES_DOCUMENT.format(owner="conversation.user_id", content="message.content")
+    + " FROM message JOIN conversation ON conversation.id = message.conversation_id ON CONFLICT DO NOTHING",
+    "INSERT INTO search_document (doc_id, tsv) SELECT id * 2 + 1, "
+    + POSTGRES_DOCUMENT.format(owner="user_id", content="content")
+    + " FROM user_insight ON CONFLICT DO NOTHING",
+]
+
+
+def install(connection) -> List[str]:
+    """
+    Create the search index, its triggers and its initial contents if missing.
+
+    Returns:
+        Descriptions of the changes applied (empty when already installed)
+    """
+    dialect = connection.dialect.name
+    if dialect == "sqlite":
+        exists = connection.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'search_index'")).first()
+        statements, backfill = SQLITE_SCHEMA, SQLITE_BACKFILL
+    elif dialect == "postgresql":
+        exists = connection.execute(text("SELECT to_regclass('search_document')")).scalar()
+        statements, backfill = POSTGRES_SCHEMA, POSTGRES_BACKFILL
+    else:
+        logger.warning(f"Full-text search is not available on {dialect}")
+        return []
+    if exists:
+        return []
+
+    logger.info("Creating the full-text search index")
+    for statement in statements:
+        connection.execute(text(statement))
+    if dialect == "postgresql":
+        for name, event in POSTGRES_TRIGGERS:
+            connection.execute(text(f"DROP TRIGGER IF EXISTS {name} ON {event.split()[-1]}"))
+            connection.execute(text(f"CREATE TRIGGER {name} {event} FOR EACH ROW EXECUTE PROCEDURE {name}()"))
+    for statement in backfill:
+        connection.execute(text(statement))
+    return ["full-text search index"]
+
+
+def encode_offset(offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([offset]).encode()).decode().rstrip("=")
+
+
+def decode_offset(cursor: Optional[str]) -> int:
+    """Decode a search cursor; raises ValueError if it is malformed."""
+    if not cursor:
+        return 0
+    try:
+        (offset,) = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        offset = int(offset)
+    except (TypeError, ValueError) as e:
+        raise ValueError("Invalid cursor") from e
+    if offset < 0:
+        raise ValueError("Invalid cursor")
+    return offset
+
+
+def query_terms(query: str) -> List[str]:
+    """The words of a search query; punctuation and operators are ignored."""
+    return TERM.findall(query)[:Config.SEARCH_MAX_TERMS]
+
+
+def highlight(snippet: str) -> str:
+    """HTML-escape a snippet and turn its match markers into <mark> tags."""
+    return html.escape(snippet).replace(START, "<mark>").replace(STOP, "</mark>")
+
+
+def _sqlite_matches(user_id: int, terms: List[str], limit: int, offset: int) -> List[Tuple[int, str]]:
+    # Every term must match; the last one also as a prefix, for search-as-you-type
+    phrases = " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+    # bm25() is lower for better matches
+    rows = db.session.execute(text(
+        "SELECT rowid, excerpt FROM (SELECT rowid, bm25(search_index, 0.0, 1.0) AS score, "
+        "snippet(search_index, 1, :start, :stop, '…', :words) AS excerpt FROM search_index "
+        "WHERE search_index MATCH :match ORDER BY rowid DESC LIMIT :window) "
+        "ORDER BY score, rowid DESC LIMIT :limit OFFSET :offset"
+    ), {
+        "match": f"owner : u{user_id} AND content : ({phrases})",
+        "start": START, "stop": STOP, "words": Config.SEARCH_SNIPPET_WORDS,
+        "window": Config.SEARCH_RANK_WINDOW, "limit": limit, "offset": offset,
+    })
+    return [(doc_id, snippet) for doc_id, snippet in rows]
+
+
+def _postgres_matches(user_id: int, terms: List[str], limit: int, offset: int) -> List[Tuple[int, str]]:
+    # Rank and page first, then excerpt only the rows of the page
+    rows = db.session.execute(text(
+        "WITH query AS (SELECT to_tsquery('simple', :owner) && to_tsquery('english', :terms) AS q), "
+        "recent AS (SELECT doc_id, tsv FROM search_document, query WHERE tsv @@ query.q "
+        "ORDER BY doc_id DESC LIMIT :window), "
+        "page AS (SELECT doc_id, ts_rank(tsv, query.q) AS rank FROM recent, query "
+        "ORDER BY rank DESC, doc_id DESC LIMIT :limit OFFSET :offset) "
+        "SELECT page.doc_id, ts_headline('english', COALESCE(message.content, user_insight.content), "
+        "to_tsquery('english', :terms), :options) "
+        "FROM page LEFT JOIN message ON page.doc_id % 2 = 0 AND message.id = page.doc_id / 2 "
+        "LEFT JOIN user_insight ON page.doc_id % 2 = 1 AND user_insight.id = page.doc_id / 2 "
+        "ORDER BY page.rank DESC, page.doc_id DESC"
+    ), {
+        "owner": f"u{user_id}:A",
+        # Every term must match; the last one also as a prefix, for search-as-you-type
+        "terms": " & ".join(terms[:-1] + [f"{terms[-1]}:*"]),
+        "options": f"StartSel={START}, StopSel={STOP}, MaxWords={Config.SEARCH_SNIPPET_WORDS}, "
+                   f"MinWords={max(1, Config.SEARCH_SNIPPET_WORDS // 3)}",
+        "window": Config.SEARCH_RANK_WINDOW, "limit": limit, "offset": offset,
+    })
+    return [(doc_id, snippet) for doc_id, snippet in rows]
+
+
+def search(user_id: int, query: str, cursor: Optional[str], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of the user's messages and insights matching query, best match first.
+
+    Args:
+        user_id: Whose messages and insights to search
+        query: Words to find; all must match, the last one also as a prefix
+        cursor: Cursor returned with the previous page, or None for the first page
+        limit: Maximum number of results to return
+
+    Returns:
+        The results (kind, id, HTML-safe snippet and where it comes from) and
+        the cursor of the next page (None on the last page)
+
+    Raises:
+        ValueError: The cursor is malformed
+        NotImplementedError: The database is neither SQLite nor Postgres
+    """
+    offset = decode_offset(cursor)
+    terms = query_terms(query)
+    limit = min(limit, Config.SEARCH_MAX_RESULTS - offset)
+    if not terms or limit <= 0:
+        return [], None
+
+    dialect = db.engine.dialect.name
+    if dialect == "sqlite":
+        matches = _sqlite_matches(user_id, terms, limit + 1, offset)
+    elif dialect == "postgresql":
+        matches = _postgres_matches(user_id, terms, limit + 1, offset)
+    else:
+        raise NotImplementedError(f"Full-text search is not available on {dialect}")
+
+    next_cursor = encode_offset(offset + limit) if len(matches) > limit else None
+    matches = matches[:limit]
+
+    message_ids = [doc_id // 2 for doc_id, _ in matches if doc_id % 2 == 0]
+    insight_ids = [doc_id // 2 for doc_id, _ in matches if doc_id % 2 == 1]
+    messages = {
+        row.id: row for row in db.session.query(
+            Message.id, Message.conversation_id, Message.is_user, Message.agent, Message.created_at, Conversation.title
+        ).join(Conversation, Conversation.id == Message.conversation_id).filter(Message.id.in_(message_ids))
+    } if message_ids else {}
+    insights = {
+        row.id: row for row in db.session.query(UserInsight.id, UserInsight.created_at).filter(UserInsight.id.in_(insight_ids))
+    } if insight_ids else {}
+
+    results = []
+    for doc_id, snippet in matches:
+        if doc_id % 2 == 0 and doc_id // 2 in messages:
+            row = messages[doc_id // 2]
+            results.append({
+                'kind': 'message',
+                'id': row.id,
+                'conversation_id': row.conversation_id,
+                'conversation_title': row.title,
+                'is_user': row.is_user,
+                'agent': row.agent,
+                'created_at': row.created_at.isoformat(),
+                'snippet': highlight(snippet),
+            })
+        elif doc_id % 2 == 1 and doc_id // 2 in insights:
+            row = insights[doc_id // 2]
+            results.append({
+                'kind': 'insight',
+                'id': row.id,
+                'created_at': row.created_at.isoformat(),
+                'snippet': highlight(snippet),
+            })
+    return results, next_cursor
@@ -8,12 +8,17 @@ document.addEventListener('DOMContentLoaded', function() {
     const newConversationMobileBtn = document.getElementById('newConversationMobile');
     const startNewConversationBtn = document.getElementById('startNewConversation');
     const chatSidebar = document.querySelector('.chat-sidebar');
-    const conversationListItems = document.querySelectorAll('.conversation-list-item');
-    const deleteConversationBtns = document.querySelectorAll('.delete-conversation');
+    const conversationList = document.getElementById('conversationList');
     
     // Current conversation ID
     let currentConversationId = null;
     
+    // Cursors of the next (older) pages; empty once everything is loaded
+    let messagesCursor = chatMessages ? chatMessages.dataset.nextCursor : '';
+    let conversationsCursor = conversationList ? conversationList.dataset.nextCursor : '';
+    let loadingMessages = false;
+    let loadingConversations = false;
+    
     // Get conversation ID from URL if available
     const urlParams = new URLSearchParams(window.location.search);
     if (urlParams.has('id')) {
@@ -36,6 +41,23 @@ document.addEventListener('DOMContentLoaded', function() {
         // Scroll chat to bottom
         if (chatMessages) {
             scrollToBottom(chatMessages);
+            
+            // Load older messages when the user scrolls near the top
+            chatMessages.addEventListener('scroll', function() {
+                if (this.scrollTop < 100) {
+                    loadOlderMessages();
+                }
+            });
+            fillMessages();
+        }
+        
+        // Load more conversations when the sidebar is scrolled near the bottom
+        if (chatSidebar) {
+            chatSidebar.addEventListener('scroll', function() {
+                if (this.scrollTop + this.clientHeight > this.scrollHeight - 100) {
+                    loadMoreConversations();
+                }
+            });
         }
         
         // Mobile sidebar toggle
@@ -66,24 +88,122 @@ document.addEventListener('DOMContentLoaded', function() {
             });
         }
         
-        // Conversation list item click
-        conversationListItems.forEach(item => {
-            item.addEventListener('click', function() {
-                const conversationId = this.getAttribute('data-id');
-                window.location.href = `/chat?id=${conversationId}`;
+        // Conversation list clicks, delegated so lazily loaded items are covered too
+        if (conversationList) {
+            conversationList.addEventListener('click', function(e) {
+                const deleteBtn = e.target.closest('.delete-conversation');
+                if (deleteBtn) {
+                    e.stopPropagation();
+                    deleteConversation(deleteBtn.getAttribute('data-id'));
+                    return;
+                }
+                
+                const item = e.target.closest('.conversation-list-item');
+                if (item) {
+                    window.location.href = `/chat?id=${item.getAttribute('data-id')}`;
+                }
+            });
+        }
+    }
+    
+    // Load the previous page of messages above the current ones
+    function loadOlderMessages() {
+        if (!messagesCursor || loadingMessages) return;
+        loadingMessages = true;
+        
+        fetch(`/api/conversations/${currentConversationId}/messages?cursor=${encodeURIComponent(messagesCursor)}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Failed to load messages');
+            }
+            return response.json();
+        })
+        .then(data => {
+            // Keep the messages the user is reading in place while older ones are prepended
+            const previousHeight = chatMessages.scrollHeight;
+            const fragment = document.createDocumentFragment();
+            data.messages.forEach(msg => {
+                fragment.appendChild(createMessageElement(msg.content, msg.is_user, new Date(msg.created_at)));
             });
+            chatMessages.insertBefore(fragment, chatMessages.firstChild);
+            chatMessages.scrollTop += chatMessages.scrollHeight - previousHeight;
+            
+            messagesCursor = data.next_cursor || '';
+            loadingMessages = false;
+            fillMessages();
+        })
+        .catch(error => {
+            console.error('Error loading messages:', error);
+            loadingMessages = false;
         });
+    }
+    
+    // Keep loading until the messages overflow the panel, so scrolling up can fetch the rest
+    function fillMessages() {
+        if (chatMessages.scrollHeight <= chatMessages.clientHeight) {
+            loadOlderMessages();
+        }
+    }
+    
+    // Append the next page of conversations to the sidebar
+    function loadMoreConversations() {
+        if (!conversationsCursor || loadingConversations) return;
+        loadingConversations = true;
         
-        // Delete conversation button click
-        deleteConversationBtns.forEach(btn => {
-            btn.addEventListener('click', function(e) {
-                e.stopPropagation();
-                const conversationId = this.getAttribute('data-id');
-                deleteConversation(conversationId);
+        fetch(`/api/conversations?cursor=${encodeURIComponent(conversationsCursor)}`)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error('Failed to load conversations');
+            }
+            return response.json();
+        })
+        .then(data => {
+            data.conversations.forEach(conv => {
+                conversationList.appendChild(createConversationElement(conv));
             });
+            conversationsCursor = data.next_cursor || '';
+            loadingConversations = false;
+        })
+        .catch(error => {
+            console.error('Error loading conversations:', error);
+            loadingConversations = false;
         });
     }
     
+    // Build a sidebar entry matching the server-rendered ones
+    function createConversationElement(conv) {
+        const item = document.createElement('div');
+        item.className = 'conversation-list-item p-2 mb-2';
+        if (String(conv.id) === currentConversationId) {
+            item.classList.add('active');
+        }
+        item.setAttribute('data-id', conv.id);
+        
+        const row = document.createElement('div');
+        row.className = 'd-flex justify-content-between align-items-start';
+        
+        const details = document.createElement('div');
+        const title = document.createElement('h6');
+        title.className = 'mb-1 text-truncate';
+        title.style.maxWidth = '180px';
+        title.textContent = conv.title;
+        const updated = document.createElement('p');
+        updated.className = 'text-muted small mb-0';
+        updated.textContent = new Date(conv.updated_at).toLocaleDateString([], { month: 'short', day: '2-digit', year: 'numeric' });
+        details.appendChild(title);
+        details.appendChild(updated);
+        
+        const deleteBtn = document.createElement('button');
+        deleteBtn.className = 'btn btn-sm text-danger delete-conversation';
+        deleteBtn.setAttribute('data-id', conv.id);
+        deleteBtn.innerHTML = '<i class="fas fa-trash"></i>';
+        
+        row.appendChild(details);
+        row.appendChild(deleteBtn);
+        item.appendChild(row);
+        return item;
+    }
+    
     // Create new conversation
     function createNewConversation() {
         fetch('/api/conversations', {
@@ -195,6 +315,12 @@ document.addEventListener('DOMContentLoaded', function() {
     
     // Add message to UI
     function addMessage(content, isUser) {
+        chatMessages.appendChild(createMessageElement(content, isUser, new Date()));
+        scrollToBottom(chatMessages);
+    }
+    
+    // Build a message element
+    function createMessageElement(content, isUser, time) {
         const message = document.createElement('div');
         message.className = `message ${isUser ? 'message-user' : 'message-ai'}`;
         
@@ -204,13 +330,11 @@ document.addEventListener('DOMContentLoaded', function() {
         
         const messageTime = document.createElement('div');
         messageTime.className = 'message-time';
-        messageTime.textContent = new Date().toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
+        messageTime.textContent = time.toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' });
         
         message.appendChild(messageContent);
         message.appendChild(messageTime);
-        
-        chatMessages.appendChild(message);
-        scrollToBottom(chatMessages);
+        return message;
     }
     
     // Add error message to UI
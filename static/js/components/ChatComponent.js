@@ -16,7 +16,7 @@ export default {
           </div>
           <div class="message-text" v-html="formatMessage(msg.text)"></div>
         </div>
-        <div v-if="isTyping" class="message agent typing-indicator">
+        <div v-if="isTyping && !streamingMessage" class="message agent typing-indicator">
           <div class="dots"><span>.</span><span>.</span><span>.</span></div>
         </div>
       </div>
@@ -71,6 +71,7 @@ export default {
       messages: [],
       userInput: '',
       isTyping: false,
+      streamingMessage: null,
       freeMessagesRemaining: null,
       requireMetaMask: false,
       isAuthenticated: false,
@@ -160,25 +161,14 @@ export default {
           headers: { 'Content-Type': 'application/json' },
           body: JSON.stringify({
             user_message: userMessage,
-            address: this.userAddress
+            address: this.userAddress,
+            stream: true
           })
         });
         
         if (response.ok) {
-          const data = await response.json();
-          console.log("Received response:", data);
-          
-          // Update free messages remaining (for non-authenticated users)
-          if (data.free_messages_remaining !== undefined && data.free_messages_remaining !== null) {
-            this.freeMessagesRemaining = data.free_messages_remaining;
-          }
-          
-          this.addMessage({
-            id: Date.now(),
-            role: 'agent',
-            agent: data.agent || 'OrchestratorAgent',
-            text: data.reply
-          });
+          // Render handoffs and partial tokens as the server streams them
+          await this.readEventStream(response);
         } else if (response.status === 403 && response.statusText.includes("MetaMask")) {
           // Handle case where server requires MetaMask auth
           const errorData = await response.json();
@@ -205,6 +195,7 @@ export default {
         });
       } finally {
         this.isTyping = false;
+        this.streamingMessage = null;
         // Focus the input field for next message
         this.$nextTick(() => {
           this.$refs.inputField.focus();
@@ -212,6 +203,77 @@ export default {
       }
     },
     
+    async readEventStream(response) {
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      
+      while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        
+        buffer += decoder.decode(value, { stream: true });
+        
+        // Server-Sent Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+          const frame = buffer.slice(0, boundary);
+          buffer = buffer.slice(boundary + 2);
+          
+          const data = frame
+            .split('\n')
+            .filter(line => line.startsWith('data:'))
+            .map(line => line.slice(5).trim())
+            .join('');
+          if (data) {
+            this.applyStreamEvent(JSON.parse(data));
+          }
+        }
+      }
+    },
+    
+    applyStreamEvent(event) {
+      // Open the reply bubble as soon as the first event arrives
+      if (!this.streamingMessage) {
+        this.addMessage({
+          id: Date.now(),
+          role: 'agent',
+          agent: 'OrchestratorAgent',
+          text: ''
+        });
+        this.streamingMessage = this.messages[this.messages.length - 1];
+      }
+      
+      const message = this.streamingMessage;
+      
+      switch (event.type) {
+        case 'agent':
+          // A handoff moved the conversation to another agent, whose reply starts here
+          if (message.agent !== event.agent) {
+            message.text = '';
+          }
+          message.agent = event.agent;
+          break;
+        case 'token':
+          message.text += event.delta;
+          break;
+        case 'done':
+          // The final reply is condensed server-side, so replace the streamed draft
+          message.agent = event.agent || 'OrchestratorAgent';
+          message.text = event.reply;
+          if (event.free_messages_remaining !== undefined && event.free_messages_remaining !== null) {
+            this.freeMessagesRemaining = event.free_messages_remaining;
+          }
+          break;
+      }
+      
+      this.$nextTick(() => {
+        if (this.$refs.messagesContainer) {
+          this.$refs.messagesContainer.scrollTop = this.$refs.messagesContainer.scrollHeight;
+        }
+      });
+    },
+    
     connectMetaMask() {
       // If MetaMask is available, request account access
       if (window.ethereum) {
@@ -0,0 +1,159 @@
+"""
+In-process background queue for work that can finish after the reply is sent.
+
+Post-reply tasks (such as storing narrative chat replies) are
+handed to a small pool of worker threads, so a turn returns as soon as the
+model has answered. The queue is bounded: when it is full the task runs
+inline, slowing that one request down instead of dropping the write. Pending
+tasks are drained on interpreter shutdown.
+
+Tasks run in an application context but outside the request, so they must
+take plain values (ids, text) rather than current_user or the session.
+"""
+
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict
+
+from app import app
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# Tells a worker thread to exit
+_STOP = object()
+
+
+def _percentile(values, fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] if ordered else 0.0
+
+
+class BackgroundQueue:
+    """
+    Bounded task queue served by worker threads, with counters and recent
+    latencies for monitoring. With workers=0 every task runs inline.
+    """
+
+    def __init__(self, flask_app, workers: int, max_size: int, drain_timeout: float):
+        self.app = flask_app
+        self.workers = workers
+        self.drain_timeout = drain_timeout
+        self.tasks: "queue.Queue" = queue.Queue(maxsize=max_size)
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.ran_inline = 0
+        self.wait_times: deque = deque(maxlen=1000)  # seconds between submit and start
+        self.run_times: deque = deque(maxlen=1000)  # seconds each task ran
+        self._threads = []
+        self._stopping = False
+        self._lock = threading.Lock()
+
+    def _ensure_started(self) -> None:
+        # Threads are started on first use, so nothing runs in a process that only imports the app
+        with self._lock:
+            if self._threads or self._stopping:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f"background-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, func: Callable[..., Any], *args, **kwargs) -> None:
+        """Queue func(*args, **kwargs), or run it now if the queue is full or shutting down."""
+        with self._lock:
+            self.submitted += 1
+
+        task = (func, args, kwargs, time.monotonic())
+        if self.workers > 0 and not self._stopping:
+            self._ensure_started()
+            try:
+                self.tasks.put_nowait(task)
+                return
+            except queue.Full:
+                logger.warning(f"Background queue full, running {func.__name__} inline")
+
+        with self._lock:
+            self.ran_inline += 1
+        self._run(*task)
+
+    def _run(self, func, args, kwargs, queued_at) -> None:
+        started = time.monotonic()
+        try:
+            with self.app.app_context():
+                func(*args, **kwargs)
+        except Exception as e:
+            logger.error(f"Background task {func.__name__} failed: {e}")
+            outcome = "failed"
+        else:
+            outcome = "completed"
+
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            self.wait_times.append(started - queued_at)
+            self.run_times.append(time.monotonic() - started)
+
+    def _work(self) -> None:
+        while True:
+            task = self.tasks.get()
+            try:
+                if task is _STOP:
+                    return
+                self._run(*task)
+            finally:
+                self.tasks.task_done()
+
+    def join(self) -> None:
+        """Block until every queued task has finished."""
+        self.tasks.join()
+
+    def shutdown(self) -> None:
+        """Stop accepting tasks and wait up to drain_timeout for the queued ones to finish."""
+        with self._lock:
+            self._stopping = True
+            threads = list(self._threads)
+
+        deadline = time.monotonic() + self.drain_timeout
+        try:
+            for _ in threads:
+                # Queued behind the pending tasks
+                self.tasks.put(_STOP, timeout=max(0.0, deadline - time.monotonic()))
+        except queue.Full:
+            pass
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+
+        pending = self.tasks.qsize()
+        if pending:
+            logger.warning(f"Background queue shut down with {pending} task(s) unfinished")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            wait_times, run_times = list(self.wait_times), list(self.run_times)
+            return {
+                "workers": self.workers,
+                "depth": self.tasks.qsize(),
+                "max_size": self.tasks.maxsize,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "ran_inline": self.ran_inline,
+                "wait_seconds_p50": _percentile(wait_times, 0.5),
+                "wait_seconds_p95": _percentile(wait_times, 0.95),
+                "run_seconds_p50": _percentile(run_times, 0.5),
+                "run_seconds_p95": _percentile(run_times, 0.95),
+            }
+
+
+background_tasks = BackgroundQueue(
+    app,
+    workers=Config.BACKGROUND_WORKERS,
+    max_size=Config.BACKGROUND_QUEUE_SIZE,
+    drain_timeout=Config.BACKGROUND_DRAIN_TIMEOUT
+)
+atexit.register(background_tasks.shutdown)
@@ -0,0 +1,232 @@
+"""
+Tracing and metrics for the agent pipeline.
+
+Every model-facing stage (routing, each specialist, combining, the Agents SDK
+run, history summaries, insight extraction) runs inside trace_stage(), which
+records its wall time, model, agent and token usage. Stages feed:
+
+- process-wide Prometheus metrics, rendered by render_metrics() for /metrics
+- the trace of the surrounding request_trace(), logged as one JSON line on the
+  "agent_trace" logger when the turn finishes
+
+The active trace lives in a context variable, so it follows the turn into
+asyncio tasks and into threads started with contextvars.copy_context().run.
+"""
+
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+trace_logger = logging.getLogger("agent_trace")
+
+# Upper bounds (seconds) of the stage duration histogram buckets
+DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Span:
+    """One timed stage of a turn."""
+
+    def __init__(self, stage: str, model: Optional[str] = None, agent: Optional[str] = None):
+        self.stage = stage
+        self.model = model
+        self.agent = agent
+        self.prompt_tokens = 0
+        self.cached_tokens = 0  # prompt tokens served from the provider's prompt cache
+        self.completion_tokens = 0
+        self.error: Optional[str] = None
+        self.seconds = 0.0
+
+    def record_usage(self, usage: Any) -> None:
+        """Add token counts from a chat completion usage or an Agents SDK Usage."""
+        if usage is None:
+            return
+        self.prompt_tokens += getattr(usage, 'prompt_tokens', None) or getattr(usage, 'input_tokens', 0) or 0
+        self.completion_tokens += getattr(usage, 'completion_tokens', None) or getattr(usage, 'output_tokens', 0) or 0
+        details = getattr(usage, 'prompt_tokens_details', None) or getattr(usage, 'input_tokens_details', None)
+        self.cached_tokens += getattr(details, 'cached_tokens', 0) or 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        span = {
+            "stage": self.stage,
+            "ms": round(self.seconds * 1000, 1),
+            "model": self.model,
+            "agent": self.agent,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "completion_tokens": self.completion_tokens,
+        }
+        if self.error:
+            span["error"] = self.error
+        return span
+
+
+class Trace:
+    """The spans of one request, logged together when it finishes."""
+
+    def __init__(self, name: str, fields: Dict[str, Any]):
+        self.id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.fields = fields
+        self.spans: List[Span] = []
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, span: Span) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def as_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [span.as_dict() for span in self.spans]
+        return {
+            "trace_id": self.id,
+            "name": self.name,
+            **self.fields,
+            "ms": round((time.perf_counter() - self.started) * 1000, 1),
+            "prompt_tokens": sum(span["prompt_tokens"] for span in spans),
+            "cached_tokens": sum(span["cached_tokens"] for span in spans),
+            "completion_tokens": sum(span["completion_tokens"] for span in spans),
+            "stages": spans,
+        }
+
+
+class Metrics:
+    """Prometheus counters and histograms for stages, kept in process memory."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.durations: Dict[Tuple[str, str, str], List[float]] = {}  # bucket counts + [sum, count]
+        self.tokens: Counter = Counter()
+        self.errors: Counter = Counter()
+
+    def observe(self, span: Span) -> None:
+        labels = (span.stage, span.model or "", span.agent or "")
+        with self._lock:
+            series = self.durations.setdefault(labels, [0.0] * (len(DURATION_BUCKETS) + 2))
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if span.seconds <= bound:
+                    series[i] += 1
+            series[-2] += span.seconds
+            series[-1] += 1
+            self.tokens[(span.stage, span.model or "", "prompt")] += span.prompt_tokens
+            self.tokens[(span.stage, span.model or "", "cached")] += span.cached_tokens
+            self.tokens[(span.stage, span.model or "", "completion")] += span.completion_tokens
+            if span.error:
+                self.errors[(span.stage, span.model or "", span.error)] += 1
+
+    def render(self) -> List[str]:
+        lines = [
+            "# HELP agent_stage_duration_seconds Wall time of agent pipeline stages.",
+            "# TYPE agent_stage_duration_seconds histogram",
+        ]
+        with self._lock:
+            for (stage, model, agent), series in sorted(self.durations.items()):
+                labels = _labels(stage=stage, model=model, agent=agent)
+                for bound, count in zip(DURATION_BUCKETS, series):
+                    lines.append(f'agent_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {count:g}')
+                lines.append(f'agent_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {series[-1]:g}')
+                lines.append(f"agent_stage_duration_seconds_sum{{{labels}}} {series[-2]}")
+                lines.append(f"agent_stage_duration_seconds_count{{{labels}}} {series[-1]:g}")
+
+            lines += ["# HELP agent_stage_tokens_total Tokens used by agent pipeline stages (cached is the part of prompt served from the prompt cache).",
+                      "# TYPE agent_stage_tokens_total counter"]
+            for (stage, model, kind), count in sorted(self.tokens.items()):
+                lines.append(f"agent_stage_tokens_total{{{_labels(stage=stage, model=model, type=kind)}}} {count}")
+
+            lines += ["# HELP agent_stage_errors_total Agent pipeline stages that raised.",
+                      "# TYPE agent_stage_errors_total counter"]
+            for (stage, model, error), count in sorted(self.errors.items()):
+                lines.append(f"agent_stage_errors_total{{{_labels(stage=stage, model=model, error=error)}}} {count}")
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self.durations.clear()
+            self.tokens.clear()
+            self.errors.clear()
+
+
+def _labels(**labels: str) -> str:
+    escaped = (f'{name}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34)).replace(chr(10), " ")}"'
+               for name, value in labels.items())
+    return ",".join(escaped)
+
+
+metrics = Metrics()
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("agent_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+@contextmanager
+def request_trace(name: str, **fields: Any) -> Iterator[Trace]:
+    """
+    Collect the stages of one turn and log them as a JSON line when it ends.
+
+    Nested calls join the trace already in progress instead of starting another.
+    """
+    active = _current_trace.get()
+    if active is not None:
+        yield active
+        return
+
+    trace = Trace(name, fields)
+    token = _current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        try:
+            _current_trace.reset(token)
+        except ValueError:
+            pass  # an abandoned async generator is closed from another context
+        trace_logger.info(json.dumps(trace.as_dict(), default=str))
+
+
+@contextmanager
+def trace_stage(stage: str, model: Optional[str] = None, agent: Optional[str] = None) -> Iterator[Span]:
+    """Time a pipeline stage; set span.agent or call span.record_usage() inside the block."""
+    span = Span(stage, model, agent)
+    started = time.perf_counter()
+    try:
+        yield span
+    except BaseException as e:
+        span.error = type(e).__name__
+        raise
+    finally:
+        span.seconds = time.perf_counter() - started
+        metrics.observe(span)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(span)
+
+
+def gauge_lines(name: str, help_text: str, values: Dict[str, Any]) -> List[str]:
+    """Render numeric stats (e.g. a cache's stats()) as one gauge family labelled by key."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for key, value in sorted(values.items()):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            lines.append(f"{name}{{{_labels(stat=key)}}} {value}")
+    return lines
+
+
+def render_metrics(gauges: Optional[Dict[str, Tuple[str, Dict[str, Any]]]] = None) -> str:
+    """
+    Prometheus text exposition of the stage metrics plus extra gauge families.
+
+    Args:
+        gauges: Metric name -> (help text, stats dict) for other components
+    """
+    lines = metrics.render()
+    for name, (help_text, values) in (gauges or {}).items():
+        lines += gauge_lines(name, help_text, values)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,149 @@
+"""
+Checks for the reply condenser (condenser.py) and its use in agents_sdk.
+
+Run with: python -m pytest test_condenser.py
+"""
+
+import asyncio
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from condenser import ELLIPSIS, REPLY_WORD_LIMIT, ReplyCondenser, condense
+
+WORDS = ("pottery", "classes", "price", "Kraków", "customers", "offer", "week", "**test**", "idea", "budget", "-")
+
+
+def make_reply(rng: random.Random, words: int) -> str:
+    """Markdown-ish text: sentences of 3-30 words, some bullet lines."""
+    out, count = [], 0
+    while count < words:
+        length = min(rng.randint(3, 30), words - count)
+        sentence = " ".join(rng.choice(WORDS) for _ in range(length))
+        out.append(sentence + rng.choice((". ", "! ", "? ", ".\n", "\n\n", ", ")))
+        count += length
+    return "".join(out).rstrip()
+
+
+def random_pieces(rng: random.Random, text: str):
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 12)
+        yield text[position:position + size]
+        position += size
+
+
+def stream(condenser: ReplyCondenser, pieces) -> str:
+    out = []
+    for piece in pieces:
+        out.append(condenser.feed(piece))
+        if condenser.done:
+            break
+    out.append(condenser.finish())
+    return "".join(out)
+
+
+@pytest.mark.parametrize("case", range(500))
+def test_generated_reply(case):
+    rng = random.Random(case)
+    limit = rng.choice((1, 5, 20, REPLY_WORD_LIMIT))
+    text = make_reply(rng, rng.randint(1, limit * 3))
+    whole = condense(text, limit)
+    grace = ReplyCondenser(limit).grace
+
+    # Streaming in arbitrary pieces gives exactly the text of condensing the whole reply
+    assert stream(ReplyCondenser(limit), random_pieces(rng, text)) == whole
+    if len(text.split()) <= limit:
+        assert whole == text
+        return
+    kept = whole[:-len(ELLIPSIS)] if whole.endswith(ELLIPSIS) else whole
+    assert text.startswith(kept)
+    assert len(kept) == len(text) or text[len(kept)].isspace(), "cut mid-word"
+    assert len(kept.split()) <= limit + grace
+    assert whole.endswith(ELLIPSIS) or len(kept.split()) >= limit or whole == text, "stopped early without a marker"
+
+
+def test_stops_at_sentence_end():
+    assert condense("One two three. Four five six.", 3) == "One two three."
+
+
+def test_cuts_at_budget_when_sentence_runs_on():
+    assert condense("One two three four five six.", 3) == "One two three…"
+
+
+def test_line_break_ends_sentence():
+    assert condense("- one\n- two\n- three", 4) == "- one\n- two"
+
+
+class FakeStreamedRun:
+    """Stands in for the agents SDK's streamed result: replays events, records cancel()."""
+
+    def __init__(self, events):
+        self._events = events
+        self.cancelled = False
+
+    async def stream_events(self):
+        for event in self._events:
+            if self.cancelled:
+                return
+            yield event
+
+    def cancel(self):
+        self.cancelled = True
+
+
+def agent_updated(name):
+    return SimpleNamespace(type="agent_updated_stream_event", new_agent=SimpleNamespace(name=name))
+
+
+def text_delta(delta):
+    from openai.types.responses import ResponseTextDeltaEvent
+
+    return SimpleNamespace(type="raw_response_event", data=ResponseTextDeltaEvent.model_construct(delta=delta))
+
+
+def orchestrator_run(events):
+    from agents_sdk import OrchestratorRun
+
+    run = OrchestratorRun.__new__(OrchestratorRun)
+    run.condenser = ReplyCondenser()
+    run.result = FakeStreamedRun(events)
+    run.agent_name = "OrchestratorAgent"
+    run.cancelled = False
+    run.usage = []
+    return run
+
+
+def collect(run):
+    async def consume():
+        return [event async for event in run.events()]
+    return asyncio.run(consume())
+
+
+def test_reply_is_the_last_agents_text():
+    preamble = " ".join(["routing"] * (REPLY_WORD_LIMIT + 10)) + " "
+    answer = "Price the class at 120 zł and ask three customers this week."
+    run = orchestrator_run([
+        agent_updated("OrchestratorAgent"),
+        text_delta(preamble),
+        agent_updated("StrategyAgent"),
+        *(text_delta(piece) for piece in random_pieces(random.Random(1), answer)),
+    ])
+    events = collect(run)
+
+    # The orchestrator's long preamble neither ends the run nor reaches the reply
+    assert not run.result.cancelled
+    assert run.reply == answer
+    assert run.agent_name == "StrategyAgent"
+    after_handoff = events[events.index({"type": "agent", "agent": "StrategyAgent"}) + 1:]
+    assert "".join(event["delta"] for event in after_handoff) == answer
+
+
+def test_run_is_cancelled_at_the_answering_agents_budget():
+    answer = " ".join(["word"] * (REPLY_WORD_LIMIT * 3))
+    run = orchestrator_run([agent_updated("CreativeAgent"), text_delta(answer), text_delta(" more")])
+    collect(run)
+
+    assert run.result.cancelled
+    assert run.reply == condense(answer)
@@ -0,0 +1,38 @@
+"""
+Checks that the paginated conversation and message queries walk an index.
+
+Run with: python -m pytest test_query_plans.py
+"""
+
+import os
+import sys
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks"))
+
+import query_plans  # noqa: E402
+from migrations import create_schema  # noqa: E402
+from models import Conversation  # noqa: E402
+
+KEYSET_QUERIES = ("conversation page", "conversation page after cursor", "message page", "message page after cursor",
+                  "message history")
+
+
+@pytest.fixture(scope="module")
+def plans():
+    with query_plans.plan_app().app_context():
+        create_schema()
+        query_plans.seed()
+        conversation = Conversation.query.first()
+        queries = query_plans.hot_queries(conversation.user_id, conversation.id)
+        yield {name: (plan, bad) for name, plan, bad in query_plans.check_plans(queries)}
+
+
+@pytest.mark.parametrize("name", KEYSET_QUERIES)
+def test_no_table_scan(plans, name):
+    plan, bad = plans[name]
+    # EXPLAIN QUERY PLAN says "SCAN <table>" for a full scan, "SEARCH <table> USING INDEX" otherwise
+    assert not any(line.startswith("SCAN ") for line in plan), plan
+    assert not bad, plan
@@ -0,0 +1,72 @@
+"""
+Checks that agent runs report their token usage to the trace spans and metrics.
+
+Run with: python -m pytest test_telemetry.py
+"""
+
+import os
+from types import SimpleNamespace
+
+os.environ.setdefault("OPENAI_AGENTS_DISABLE_TRACING", "1")
+
+from config import Config  # noqa: E402
+from telemetry import Span, metrics  # noqa: E402
+
+
+def agents_run_tokens():
+    model = Config.DEFAULT_AGENT_MODEL
+    return {kind: metrics.tokens[("agents_run", model, kind)] for kind in ("prompt", "cached", "completion")}
+
+
+def test_stubbed_run_counts_tokens(monkeypatch):
+    import agents_sdk
+
+    monkeypatch.setattr(Config, "OPENAI_STUB", True)
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", False)
+    before = agents_run_tokens()
+    reply = agents_sdk.get_agent_response("How should I price my pottery classes?")
+    after = agents_run_tokens()
+
+    assert not reply["reply"].startswith(agents_sdk.ERROR_REPLY), reply["reply"]
+    assert after["prompt"] > before["prompt"]
+    assert after["completion"] > before["completion"]
+
+
+class ReplayedRun:
+    """Stands in for the agents SDK's streamed result by replaying events."""
+
+    def __init__(self, events):
+        self.events = events
+
+    async def stream_events(self):
+        for event in self.events:
+            yield event
+
+
+def test_run_usage_includes_cached_tokens():
+    import asyncio
+
+    from openai.types.responses import ResponseCompletedEvent
+
+    from agents_sdk import OrchestratorRun, record_run
+    from condenser import ReplyCondenser
+
+    usage = SimpleNamespace(input_tokens=1500, output_tokens=80,
+                            input_tokens_details=SimpleNamespace(cached_tokens=1280))
+    completed = SimpleNamespace(type="raw_response_event",
+                                data=ResponseCompletedEvent.model_construct(response=SimpleNamespace(usage=usage)))
+    handoff = SimpleNamespace(type="agent_updated_stream_event", new_agent=SimpleNamespace(name="StrategyAgent"))
+    run = OrchestratorRun.__new__(OrchestratorRun)
+    run.condenser = ReplyCondenser()
+    run.result = ReplayedRun([completed, handoff, completed])
+    run.agent_name = "OrchestratorAgent"
+    run.cancelled = False
+    run.usage = []
+    asyncio.run(run.complete())
+
+    span = Span("agents_run", model=Config.DEFAULT_AGENT_MODEL)
+    record_run(span, run)
+
+    # Both model responses count, the orchestrator's and the specialist's
+    assert (span.agent, span.prompt_tokens, span.cached_tokens, span.completion_tokens) == \
+        ("StrategyAgent", 3000, 2560, 160)
@@ -0,0 +1,197 @@
+"""
+Bulk export and import of conversation data for the AI Agency for Solopreneurs.
+
+An export is gzip-compressed JSON Lines: a header, then one record per user,
+conversation, message, insight and goal, each group in id order (messages of
+archived conversations follow the others, see archive.py). Rows are
+read through a server-side cursor in batches and written by a generator, so
+memory stays flat however long the history is; the download endpoint streams
+the same chunks as the `flask --app main export-data` command writes.
+
+Import (`flask --app main import-data`) inserts the records as new rows in
+batches, in one transaction. Ids are reassigned: users are matched by
+username (or everything goes to one given user), and conversation ids are
+translated for the messages and insights that refer to them, which keeps one
+id pair per conversation in memory.
+"""
+
+import json
+import zlib
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from sqlalchemy import insert, select
+
+from app import db
+from archive import archived_messages
+from config import Config
+from models import Conversation, ConversationArchive, Message, User, UserGoal, UserInsight
+
+FORMAT_VERSION = 1
+
+# Record type -> (model, exported columns); exported and imported in this order
+RECORDS = {
+    "conversation": (Conversation, ("id", "user_id", "title", "created_at", "updated_at")),
+    "message": (Message, ("id", "conversation_id", "content", "is_user", "agent", "created_at")),
+    "insight": (UserInsight, ("id", "user_id", "content", "source_conversation_id", "created_at")),
+    "goal": (UserGoal, ("id", "user_id", "title", "description", "completed", "created_at")),
+}
+
+DATETIME_FIELDS = ("created_at", "updated_at")
+
+
+def _record(record_type: str, fields) -> bytes:
+    record = {"type": record_type}
+    for key, value in fields.items():
+        record[key] = value.isoformat() if isinstance(value, datetime) else value
+    return (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+
+
+def _stream(statement, record_type: str) -> Iterator[bytes]:
+    """Rows of statement as JSON lines, fetched through a server-side cursor in batches."""
+    for row in db.session.execute(statement.execution_options(yield_per=Config.TRANSFER_BATCH_SIZE)):
+        yield _record(record_type, row._mapping)
+
+
+def export_lines(user_id: Optional[int] = None) -> Iterator[bytes]:
+    """
+    The export as JSON lines.
+
+    Args:
+        user_id: Export this user's data only (default: every user's)
+    """
+    yield _record("export", {"version": FORMAT_VERSION, "exported_at": datetime.utcnow(), "user_id": user_id})
+
+    users = select(User.id, User.username).order_by(User.id)
+    yield from _stream(users if user_id is None else users.filter(User.id == user_id), "user")
+
+    for record_type, (model, columns) in RECORDS.items():
+        statement = select(*(getattr(model, column) for column in columns)).order_by(model.id)
+        if user_id is not None:
+            if model is Message:
+                statement = statement.join(Conversation, Conversation.id == Message.conversation_id) \
+                    .filter(Conversation.user_id == user_id)
+            else:
+                statement = statement.filter(model.user_id == user_id)
+        yield from _stream(statement, record_type)
+        if model is Message:
+            yield from _archived_messages(user_id)
+
+
+def _archived_messages(user_id: Optional[int]) -> Iterator[bytes]:
+    """Messages of archived conversations, one conversation's archive in memory at a time."""
+    statement = select(ConversationArchive).order_by(ConversationArchive.conversation_id)
+    if user_id is not None:
+        statement = statement.join(Conversation, Conversation.id == ConversationArchive.conversation_id) \
+            .filter(Conversation.user_id == user_id)
+    for archive in db.session.execute(statement.execution_options(yield_per=1)).scalars():
+        for message in archived_messages(archive):
+            yield _record("message", {**message, "conversation_id": archive.conversation_id})
+        db.session.expunge(archive)
+
+
+def gzip_chunks(lines: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Compress lines into gzip chunks as they are produced."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip container
+    for line in lines:
+        chunk = compressor.compress(line)
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+class _Importer:
+    """Turns export records into batched inserts, translating user and conversation ids."""
+
+    def __init__(self, user_id: Optional[int]):
+        self.user_id = user_id
+        self.users: Dict[int, Optional[int]] = {}  # exported user id -> local user id (None: not found)
+        self.conversations: Dict[int, int] = {}  # exported conversation id -> new id
+        self.counts = {record_type: 0 for record_type in RECORDS}
+        self.counts["skipped"] = 0
+        self._batch: List[Dict[str, Any]] = []
+        self._batch_type: Optional[str] = None
+
+    def add(self, record: Dict[str, Any]) -> None:
+        record_type = record.pop("type", None)
+        if record_type == "export":
+            if record.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported export version: {record.get('version')}")
+            return
+        if record_type == "user":
+            self.users[record["id"]] = self.user_id or db.session.execute(
+                select(User.id).filter(User.username == record["username"])
+            ).scalar()
+            return
+        if record_type not in RECORDS:
+            raise ValueError(f"Unknown record type: {record_type}")
+
+        if record_type != self._batch_type:
+            self.flush()  # conversations are inserted before the messages that refer to them
+            self._batch_type = record_type
+        row = self._translate(record_type, record)
+        if row is None:
+            self.counts["skipped"] += 1
+            return
+        self._batch.append(row)
+        if len(self._batch) >= Config.TRANSFER_BATCH_SIZE:
+            self.flush()
+
+    def _translate(self, record_type: str, record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The record as column values for a new row, or None if what it belongs to wasn't imported."""
+        for field in DATETIME_FIELDS:
+            if record.get(field):
+                record[field] = datetime.fromisoformat(record[field])
+        if "user_id" in record:
+            record["user_id"] = self.users.get(record["user_id"]) or self.user_id
+            if record["user_id"] is None:
+                return None
+        if record_type == "message":
+            record["conversation_id"] = self.conversations.get(record["conversation_id"])
+            if record["conversation_id"] is None:
+                return None
+        elif record_type == "insight" and record.get("source_conversation_id") is not None:
+            record["source_conversation_id"] = self.conversations.get(record["source_conversation_id"])
+        if record_type != "conversation":
+            record.pop("id", None)
+        return record
+
+    def flush(self) -> None:
+        if not self._batch:
+            return
+        model, _ = RECORDS[self._batch_type]
+        if self._batch_type == "conversation":
+            old_ids = [row.pop("id") for row in self._batch]
+            new_ids = db.session.execute(
+                insert(Conversation).returning(Conversation.id, sort_by_parameter_order=True), self._batch
+            ).scalars().all()
+            self.conversations.update(zip(old_ids, new_ids))
+        else:
+            db.session.execute(insert(model), self._batch)
+        self.counts[self._batch_type] += len(self._batch)
+        self._batch = []
+
+
+def import_lines(lines: Iterable[bytes], user_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Import an export's JSON lines, committing once at the end.
+
+    Args:
+        lines: The decompressed export, one record per line
+        user_id: Import everything for this user instead of matching users by username
+
+    Returns:
+        Rows inserted per record type, and records skipped because their user
+        or conversation isn't in this database
+    """
+    importer = _Importer(user_id)
+    try:
+        for line in lines:
+            if line.strip():
+                importer.add(json.loads(line))
+        importer.flush()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return importer.counts
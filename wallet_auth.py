@@ -0,0 +1,126 @@
+"""
+MetaMask (Ethereum wallet) sign-in for the AI Agency for Solopreneurs.
+
+A login is two requests: the page asks for a one-time nonce, the wallet signs
+the login message carrying it, and the signed message is verified here. Nonces
+are rows in the login_nonce table, so any instance can redeem a nonce another
+issued, and redeeming one deletes it with a single conditional DELETE, so a
+captured signature can't be replayed even by concurrent requests.
+"""
+
+import logging
+import re
+import secrets
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import or_
+
+from app import db
+from config import Config
+from models import LoginNonce, User
+
+logger = logging.getLogger(__name__)
+
+LOGIN_MESSAGE = "Please sign this message to authenticate with Unified AI Agency for Solopreneurs.\n\nNonce: {nonce}"
+
+ADDRESS_PATTERN = re.compile(r"^0x[0-9a-fA-F]{40}$")
+
+def is_address(address: str) -> bool:
+    return isinstance(address, str) and bool(ADDRESS_PATTERN.match(address))
+
+
+def login_message(nonce: str) -> str:
+    return LOGIN_MESSAGE.format(nonce=nonce)
+
+
+def issue_nonce(address: str) -> str:
+    """Create a one-time nonce for address, valid for Config.LOGIN_NONCE_TTL seconds."""
+    now = datetime.utcnow()
+    nonce = secrets.token_hex(16)
+    # Expired nonces were never redeemed; clear them out as new ones are issued
+    LoginNonce.query.filter(LoginNonce.expires_at <= now).delete(synchronize_session=False)
+    db.session.add(LoginNonce(nonce=nonce, address=address.lower(),
+                              expires_at=now + timedelta(seconds=Config.LOGIN_NONCE_TTL)))
+    db.session.commit()
+    return nonce
+
+
+def consume_nonce(nonce: str, address: str) -> bool:
+    """True if nonce was issued for address and not used or expired; it can't be used again."""
+    if not isinstance(nonce, str):
+        return False
+    redeemed = LoginNonce.query.filter(
+        LoginNonce.nonce == nonce,
+        LoginNonce.address == address.lower(),
+        LoginNonce.expires_at > datetime.utcnow(),
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return redeemed == 1
+
+
+class SignatureVerifier:
+    """
+    Recovers the signer of personal_sign messages.
+
+    eth_account is imported and set up once, on the first login, and the
+    verifier is shared by all requests; recovery itself is stateless. With
+    coincurve installed eth_keys recovers in C, about 40x faster than its
+    pure-Python fallback.
+    """
+
+    def __init__(self):
+        self._recover = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._recover is None:
+                from eth_account import Account
+                from eth_account.messages import encode_defunct
+
+                self._recover = lambda message, signature: Account.recover_message(
+                    encode_defunct(text=message), signature=signature
+                )
+        return self._recover
+
+    def recover(self, message: str, signature: str) -> str:
+        """Address (checksummed) that signed message."""
+        return (self._recover or self._load())(message, signature)
+
+    def verify(self, message: str, signature: str, address: str) -> bool:
+        try:
+            return self.recover(message, signature).lower() == address.lower()
+        except Exception as e:
+            logger.info(f"Rejected MetaMask signature: {e}")
+            return False
+
+
+verifier = SignatureVerifier()
+
+
+def allocate_username(base: str) -> str:
+    """
+    First free name among base, base_1, base_2, ... found with a single query.
+
+    The unique constraint on User.username still decides races between
+    concurrent sign-ups; callers retry on IntegrityError.
+    """
+    escaped = base.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    taken = {
+        username for (username,) in db.session.query(User.username)
+        .filter(or_(User.username == base, User.username.like(f"{escaped}\\_%", escape="\\")))
+    }
+    if base not in taken:
+        return base
+
+    suffixes = {int(name[len(base) + 1:]) for name in taken if name[len(base) + 1:].isdigit()}
+    counter = 1
+    while counter in suffixes:
+        counter += 1
+    return f"{base}_{counter}"
+
+
+def find_wallet_user(address: str) -> Optional[User]:
+    return User.query.filter_by(ethereum_address=address.lower()).first()